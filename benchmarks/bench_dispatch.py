@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка очереди отправки алертов на заглушке FakeBot.
+
+Имитирует пересечение популярного уровня: ALERTS алертов в CHATS чатов одновременно.
+
+    python benchmarks/bench_dispatch.py [ALERTS] [CHATS]
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "tests")]
+
+from dispatch import MessageDispatcher, PRIORITY_ALERT  # noqa: E402
+from fakes import FakeBot  # noqa: E402
+
+async def main() -> None:
+    alerts = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    chats = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+
+    bot = FakeBot(latency=0.05)
+    dispatcher = MessageDispatcher(bot)
+    dispatcher.start()
+    failed = []
+
+    started = time.perf_counter()
+    for i in range(alerts):
+        dispatcher.submit(i % chats, f"alert {i}", PRIORITY_ALERT, on_failed=failed.append)
+    await dispatcher.drain()
+    elapsed = time.perf_counter() - started
+    await dispatcher.stop()
+
+    stats = dispatcher.stats()
+    print(f"Алертов: {alerts}, чатов: {chats}, время: {elapsed:.2f} с")
+    print(f"Доставлено: {len(bot.sent)}, не доставлено: {len(failed)}, отказов RetryAfter: {bot.rejected}")
+    print(f"Задержка доставки p50: {stats['latency_p50']:.2f} с, p95: {stats['latency_p95']:.2f} с")
+    print(f"Темп: {len(bot.sent) / elapsed:.1f} сообщений/с")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Хеджированные запросы цен на двух локальных заглушках Binance REST.
+
+Основная заглушка отвечает за LATENCY, но с вероятностью SPIKE_PROBABILITY зависает
+на SPIKE_LATENCY (частичный сбой). Сравниваются задержки запросов только к основному
+провайдеру и с хеджированием на запасной.
+
+    python benchmarks/bench_hedging.py [REQUESTS]
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "tests")]
+
+from fakes import FakeBinanceRestServer  # noqa: E402
+from providers import BinanceProvider, HedgedPriceSource  # noqa: E402
+from utils import close_http_session  # noqa: E402
+
+PRIMARY_PORT = 18081
+SECONDARY_PORT = 18082
+LATENCY = 0.02
+SPIKE_LATENCY = 1.0
+SPIKE_PROBABILITY = 0.1
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+async def measure(source: HedgedPriceSource, requests: int):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        prices = await source.book_tickers(["BTCUSDT", "ETHUSDT"])
+        assert prices and len(prices) == 2
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+async def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    primary = FakeBinanceRestServer(latency=LATENCY, spike_latency=SPIKE_LATENCY, spike_probability=SPIKE_PROBABILITY)
+    secondary = FakeBinanceRestServer(latency=LATENCY * 1.5)
+    await primary.start(port=PRIMARY_PORT)
+    await secondary.start(port=SECONDARY_PORT)
+    try:
+        single = HedgedPriceSource([BinanceProvider("primary", f"http://127.0.0.1:{PRIMARY_PORT}")])
+        hedged = HedgedPriceSource([
+            BinanceProvider("primary", f"http://127.0.0.1:{PRIMARY_PORT}"),
+            BinanceProvider("secondary", f"http://127.0.0.1:{SECONDARY_PORT}"),
+        ])
+        for name, source in (("Без хеджирования", single), ("С хеджированием", hedged)):
+            latencies = await measure(source, requests)
+            print(f"{name}: p50 {percentile(latencies, 0.5) * 1000:.0f} мс, "
+                  f"p95 {percentile(latencies, 0.95) * 1000:.0f} мс, "
+                  f"p99 {percentile(latencies, 0.99) * 1000:.0f} мс, max {max(latencies) * 1000:.0f} мс")
+        stats = hedged.stats()
+        print(f"Хеджей: {stats['hedges']}, ответов запасного: {stats['hedge_wins']}, "
+              f"запросов к запасному: {secondary.requests}")
+    finally:
+        await close_http_session()
+        await primary.stop()
+        await secondary.stop()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк группировки запросов цен в get_crypto_price_optimized.
+
+Сетевой запрос заменяется задержкой ROUND_TRIP, поэтому результат не зависит от Binance.
+Сравнивается прежняя схема (глобальная блокировка на время запроса) с текущей.
+
+    python benchmarks/bench_price_requests.py [N]
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import monitoring  # noqa: E402
+
+ROUND_TRIP = 0.05  # секунд
+network_calls = 0
+
+async def fake_fetch(base: str, quote: str) -> float:
+    global network_calls
+    network_calls += 1
+    await asyncio.sleep(ROUND_TRIP)
+    return 1.0
+
+_legacy_lock = asyncio.Lock()
+
+async def legacy_get_price(base: str, quote: str) -> float:
+    """Прежняя схема: блокировка удерживается на все время сетевого запроса."""
+    async with _legacy_lock:
+        return await fake_fetch(base, quote)
+
+async def measure(label: str, fetch, symbols) -> None:
+    global network_calls
+    network_calls = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(base, "USDT") for base in symbols))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<45} {elapsed:7.3f} с  ({elapsed / ROUND_TRIP:5.1f} RTT, запросов: {network_calls})")
+
+async def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    monitoring.get_crypto_price_batched = fake_fetch
+    distinct = [f"COIN{i}" for i in range(n)]
+    same = ["BTC"] * n
+
+    print(f"N = {n}, RTT = {ROUND_TRIP * 1000:.0f} мс")
+    await measure("прежняя схема, разные символы", legacy_get_price, distinct)
+    await measure("single-flight, разные символы", monitoring.get_crypto_price_optimized, distinct)
+    await measure("прежняя схема, один символ", legacy_get_price, same)
+    await measure("single-flight, один символ", monitoring.get_crypto_price_optimized, same)
+
+if __name__ == "__main__":
+    asyncio.run(main())
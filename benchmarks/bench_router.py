@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Стоимость выбора обработчика для текстового сообщения.
+
+Сравнивается прежняя цепочка if/elif из simple_handler с проверкой чисел через
+text.replace(...).isdigit() и таблицы UpdateRouter. Обработчики не вызываются,
+измеряется только выбор маршрута.
+
+    python benchmarks/bench_router.py [N]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from models import UserState, user_states  # noqa: E402
+from router import UpdateRouter  # noqa: E402
+
+MENU = ["📊 Добавить пару", "📊 Установить пару криптовалют", "📈 Текущий курс", "👁️ Мои пары", "❓ Помощь"]
+# Смесь сообщений: кнопки меню, команды, ввод цены, выбор монеты
+MESSAGES = ["👁️ Мои пары", "/start", "65000.5", "BTC", "📈 Текущий курс", "-", "USDT", "/price", "0.00012", "Отмена"]
+
+def legacy_resolve(text: str) -> str:
+    if text == "/start":
+        return "start"
+    elif text == "/help":
+        return "help"
+    elif text == "/addpair":
+        return "add_pair"
+    elif text == "/mypairs":
+        return "my_pairs"
+    elif text == "/price":
+        return "price"
+    elif text in MENU:
+        return "price_check"
+    elif text.replace(".", "").replace("-", "").isdigit() or text == "-" or text == "Отмена":
+        return "range_setting"
+    else:
+        return "coin_selection"
+
+async def _noop(update, context) -> None:
+    pass
+
+def build_router() -> UpdateRouter:
+    router = UpdateRouter()
+    router.text(["/start"], _noop, "start")
+    router.text(["/help", "❓ Помощь"], _noop, "help")
+    router.text(["/addpair", "📊 Добавить пару", "📊 Установить пару криптовалют"], _noop, "add_pair")
+    router.text(["/mypairs", "👁️ Мои пары"], _noop, "my_pairs")
+    router.text(["/price", "📈 Текущий курс"], _noop, "price")
+    router.state(["selecting_base", "selecting_quote"], _noop, "coin_selection")
+    router.state(["setting_range"], _noop, "range_setting")
+    router.default(_noop, "unknown")
+    return router
+
+def measure(label: str, resolve, n: int) -> None:
+    messages = (MESSAGES * (n // len(MESSAGES) + 1))[:n]
+    started = time.perf_counter()
+    for text in messages:
+        resolve(text)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<25} {elapsed / n * 1e9:7.0f} нс на сообщение")
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    chat_id = 1
+    user_states[chat_id] = UserState(current_action="setting_range")
+    router = build_router()
+    print(f"Сообщений: {n}")
+    measure("цепочка if/elif", legacy_resolve, n)
+    measure("UpdateRouter", lambda text: router.resolve(chat_id, text), n)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Память под подписки: прежняя раскладка против реестра subscriptions.
+
+Прежняя раскладка - четыре словаря с ключами-кортежами (chat_id, symbol) и свежей строкой
+символа в каждом ключе (websocket_connections, alert_tracking со словарем флагов на подписку,
+symbol_subscribers, symbol_pairs, last_check_time) и пары-dataclass без __slots__.
+Новая - SubscriptionRegistry со __slots__ записями и пары CryptoPair(slots=True).
+Память считается tracemalloc после построения структур.
+
+    python benchmarks/bench_subscriptions.py [SUBSCRIPTIONS]
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from models import CryptoPair  # noqa: E402
+from subscriptions import SubscriptionRegistry  # noqa: E402
+
+PAIRS_PER_CHAT = 5
+SYMBOLS = 500
+
+@dataclass
+class LegacyCryptoPair:
+    """CryptoPair до перехода на __slots__."""
+    base: str
+    quote: str
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    created_at: datetime = None
+    move_pct: Optional[float] = None
+    move_window: Optional[int] = None
+
+def pairs_plan(subscriptions: int):
+    """(chat_id, base, quote) подписок: PAIRS_PER_CHAT пар на чат из SYMBOLS монет."""
+    for i in range(subscriptions):
+        chat_id = 100_000_000 + i // PAIRS_PER_CHAT
+        yield chat_id, f"COIN{(i * 7919) % SYMBOLS}", "USDT"
+
+def build_legacy(plan):
+    scheduler_task = object()
+    user_settings, websocket_connections, alert_tracking = {}, {}, {}
+    symbol_subscribers, symbol_pairs, last_check_time = {}, {}, {}
+    created = datetime.now()
+    for chat_id, base, quote in plan:
+        user_settings.setdefault(chat_id, []).append(LegacyCryptoPair(base, quote, created_at=created))
+        symbol = f"{base}{quote}".upper()
+        tracking_key = (chat_id, symbol)
+        alert_tracking[tracking_key] = {"alerted": False}
+        symbol_subscribers.setdefault(symbol, set()).add(chat_id)
+        symbol_pairs[symbol] = (base, quote)
+        last_check_time[symbol] = time.time()
+        websocket_connections[tracking_key] = scheduler_task
+    return user_settings, websocket_connections, alert_tracking, symbol_subscribers, symbol_pairs, last_check_time
+
+def build_registry(plan):
+    user_settings = {}
+    registry = SubscriptionRegistry()
+    created = datetime.now()
+    for chat_id, base, quote in plan:
+        user_settings.setdefault(chat_id, []).append(CryptoPair(base, quote, created_at=created))
+        registry.add(chat_id, base, quote)
+    return user_settings, registry
+
+def measure(label: str, build, plan) -> None:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build(plan)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<30} {current / 1024 / 1024:8.1f} МБ  ({current / len(plan):6.0f} байт на подписку), "
+          f"построение {elapsed:.2f} с")
+    del result
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    plan = list(pairs_plan(n))
+    print(f"Подписок: {n}, чатов: {n // PAIRS_PER_CHAT}, символов: {SYMBOLS}")
+    measure("прежняя раскладка", build_legacy, plan)
+    measure("реестр subscriptions", build_registry, plan)
+
+if __name__ == "__main__":
+    main()
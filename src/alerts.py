@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Индекс ценовых алертов по символу.
+"""
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+ALERT_MIN = "min"
+ALERT_MAX = "max"
+ALERT_RISE = "rise"  # рост от минимума окна
+ALERT_FALL = "fall"  # падение от максимума окна
+
+class AlertIndex:
+    """
+    Пороги алертов одного символа в отсортированных массивах.
+
+    Минимумы и максимумы хранятся раздельно (значения и id подписок в параллельных списках),
+    поэтому сработавшие при новой цене алерты находятся бинарным поиском
+    за O(log n + k), где k - число сработавших. Сработавший алерт удаляется из индекса
+    до следующего изменения диапазона.
+    """
+
+    def __init__(self):
+        self._min_values: List[float] = []
+        self._min_ids: List[int] = []
+        self._max_values: List[float] = []
+        self._max_ids: List[int] = []
+        self.ranges: Dict[int, Tuple[Optional[float], Optional[float]]] = {}  # id -> (min, max)
+
+    def __len__(self) -> int:
+        return len(self.ranges)
+
+    def __contains__(self, sub_id: int) -> bool:
+        return sub_id in self.ranges
+
+    @staticmethod
+    def _insert(values: List[float], ids: List[int], value: float, sub_id: int) -> None:
+        position = bisect_right(values, value)
+        values.insert(position, value)
+        ids.insert(position, sub_id)
+
+    @staticmethod
+    def _delete(values: List[float], ids: List[int], value: float, sub_id: int) -> None:
+        position = bisect_left(values, value)
+        while position < len(values) and values[position] == value:
+            if ids[position] == sub_id:
+                del values[position]
+                del ids[position]
+                return
+            position += 1
+
+    def set(self, sub_id: int, min_price: Optional[float], max_price: Optional[float]) -> None:
+        """Добавляет или заменяет пороги подписки."""
+        self.remove(sub_id)
+        if min_price is None and max_price is None:
+            return
+        if min_price is not None:
+            self._insert(self._min_values, self._min_ids, min_price, sub_id)
+        if max_price is not None:
+            self._insert(self._max_values, self._max_ids, max_price, sub_id)
+        self.ranges[sub_id] = (min_price, max_price)
+
+    def remove(self, sub_id: int) -> Optional[Tuple[Optional[float], Optional[float]]]:
+        """Удаляет пороги подписки и возвращает их."""
+        thresholds = self.ranges.pop(sub_id, None)
+        if thresholds is None:
+            return None
+        min_price, max_price = thresholds
+        if min_price is not None:
+            self._delete(self._min_values, self._min_ids, min_price, sub_id)
+        if max_price is not None:
+            self._delete(self._max_values, self._max_ids, max_price, sub_id)
+        return thresholds
+
+    def triggered(self, price: float) -> List[Tuple[int, str]]:
+        """
+        Подписки, чья цена вышла за диапазон: price <= min или price >= max.
+        Если сработали обе границы (min >= max не допускается, но на всякий случай), побеждает минимум.
+        """
+        result: List[Tuple[int, str]] = []
+        seen = set()
+        start = bisect_left(self._min_values, price)
+        for sub_id in self._min_ids[start:]:
+            seen.add(sub_id)
+            result.append((sub_id, ALERT_MIN))
+        end = bisect_right(self._max_values, price)
+        for sub_id in self._max_ids[:end]:
+            if sub_id not in seen:
+                result.append((sub_id, ALERT_MAX))
+        return result
+
+    def nearest(self, price: float) -> Tuple[Optional[float], Optional[float]]:
+        """Ближайшие к цене несработавшие пороги: (минимум ниже цены, максимум выше цены)."""
+        below = bisect_left(self._min_values, price)
+        above = bisect_right(self._max_values, price)
+        nearest_min = self._min_values[below - 1] if below > 0 else None
+        nearest_max = self._max_values[above] if above < len(self._max_values) else None
+        return nearest_min, nearest_max
+
+class MoveAlertIndex:
+    """
+    Алерты движения цены одного символа: "цена сдвинулась на pct% за window секунд".
+
+    Подписки сгруппированы по окну, внутри окна пороги отсортированы. Движение цены за окно
+    считается один раз для всех подписок окна, а сработавшие подписки - это префикс
+    отсортированных порогов (pct <= движения), который находится бинарным поиском.
+    После срабатывания подписка молчит до cooldown_until, чтобы одно движение
+    не давало алерт на каждой проверке.
+    """
+
+    def __init__(self):
+        self._windows: Dict[int, Tuple[List[float], List[int]]] = {}  # окно -> (пороги, id подписок)
+        self.rules: Dict[int, Tuple[float, int]] = {}  # id -> (pct, окно в секундах)
+        self.cooldown_until: Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def __contains__(self, sub_id: int) -> bool:
+        return sub_id in self.rules
+
+    def windows(self) -> List[int]:
+        return list(self._windows)
+
+    def set(self, sub_id: int, pct: Optional[float], window: Optional[int]) -> None:
+        """Добавляет или заменяет правило подписки (None - правило удаляется)."""
+        self.remove(sub_id)
+        if pct is None or not window:
+            return
+        values, ids = self._windows.setdefault(window, ([], []))
+        AlertIndex._insert(values, ids, pct, sub_id)
+        self.rules[sub_id] = (pct, window)
+
+    def remove(self, sub_id: int) -> Optional[Tuple[float, int]]:
+        """Удаляет правило подписки и возвращает его."""
+        rule = self.rules.pop(sub_id, None)
+        self.cooldown_until.pop(sub_id, None)
+        if rule is None:
+            return None
+        pct, window = rule
+        values, ids = self._windows[window]
+        AlertIndex._delete(values, ids, pct, sub_id)
+        if not values:
+            del self._windows[window]
+        return rule
+
+    def triggered(self, window: int, move_pct: float, now: float) -> List[Tuple[int, float]]:
+        """
+        Подписки окна, для которых движение move_pct достигло порога и которые не молчат.
+        Возвращает (id, pct) и включает для них молчание на длину окна.
+        """
+        values, ids = self._windows.get(window, ((), ()))
+        result: List[Tuple[int, float]] = []
+        for position in range(bisect_right(values, move_pct)):
+            sub_id = ids[position]
+            if self.cooldown_until.get(sub_id, 0.0) > now:
+                continue
+            self.cooldown_until[sub_id] = now + window
+            result.append((sub_id, values[position]))
+        return result
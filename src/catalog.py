@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Каталог символов биржи (exchangeInfo) и выбор маршрута получения цены пары.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+from config import EXCHANGE_INFO_FILE, CATALOG_REFRESH_INTERVAL, CATALOG_RETRY_DELAY
+from utils import binance_get, WEIGHT_EXCHANGE_INFO
+
+logger = logging.getLogger(__name__)
+
+# Маршруты получения цены пары
+ROUTE_DIRECT = "direct"        # пара торгуется на Binance
+ROUTE_INVERSE = "inverse"      # торгуется обратная пара quote/base, цена = 1 / цена
+ROUTE_SYNTHETIC = "synthetic"  # пары нет - цена через кросс-курсы
+
+class SymbolCatalog:
+    """Торгуемые символы Binance: symbol -> (baseAsset, quoteAsset)."""
+
+    def __init__(self, path: str = EXCHANGE_INFO_FILE):
+        self.path = path
+        self.symbols: Dict[str, Tuple[str, str]] = {}
+        self.loaded_at = 0.0
+        self._routes: Dict[Tuple[str, str], Tuple[str, Optional[str]]] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.symbols)
+
+    def route(self, base: str, quote: str) -> Tuple[str, Optional[str]]:
+        """
+        Возвращает (маршрут, символ запроса) для пары.
+        Пока каталог не загружен, все пары считаются прямыми.
+        """
+        base = base.upper()
+        quote = quote.upper()
+        if not self.symbols:
+            return ROUTE_DIRECT, f"{base}{quote}"
+
+        key = (base, quote)
+        route = self._routes.get(key)
+        if route is None:
+            if f"{base}{quote}" in self.symbols:
+                route = (ROUTE_DIRECT, f"{base}{quote}")
+            elif f"{quote}{base}" in self.symbols:
+                route = (ROUTE_INVERSE, f"{quote}{base}")
+            else:
+                route = (ROUTE_SYNTHETIC, None)
+            self._routes[key] = route
+        return route
+
+    def _set_symbols(self, symbols: Dict[str, Tuple[str, str]], loaded_at: float) -> None:
+        self.symbols = symbols
+        self.loaded_at = loaded_at
+        self._routes.clear()
+
+    def load_from_disk(self) -> bool:
+        """Загружает каталог, сохраненный при прошлом запуске."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            symbols = {symbol: tuple(assets) for symbol, assets in data["symbols"].items()}
+            self._set_symbols(symbols, data.get("saved_at", 0.0))
+            logger.info(f"Каталог символов загружен из {self.path}: {len(symbols)} символов")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке каталога символов: {e}")
+            return False
+
+    def save_to_disk(self) -> None:
+        try:
+            data = {"saved_at": self.loaded_at, "symbols": self.symbols}
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            logger.debug(f"Каталог символов сохранен в {self.path}")
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении каталога символов: {e}")
+
+    async def refresh(self) -> bool:
+        """Загружает exchangeInfo с биржи и сохраняет каталог на диск."""
+        status, data = await binance_get("/api/v3/exchangeInfo", {"symbolStatus": "TRADING"}, WEIGHT_EXCHANGE_INFO)
+        if status != 200:
+            logger.warning(f"Ошибка Binance API при загрузке exchangeInfo: {status}")
+            return False
+
+        symbols = {
+            item["symbol"]: (item["baseAsset"], item["quoteAsset"])
+            for item in data.get("symbols", [])
+            if item.get("status", "TRADING") == "TRADING"
+        }
+        if not symbols:
+            logger.warning("exchangeInfo не содержит торгуемых символов, каталог не обновлен")
+            return False
+
+        self._set_symbols(symbols, time.time())
+        logger.info(f"Каталог символов обновлен: {len(symbols)} символов")
+        await asyncio.to_thread(self.save_to_disk)
+        return True
+
+    async def load(self) -> None:
+        """Загрузка при старте: сначала копия с диска, затем свежий exchangeInfo."""
+        await asyncio.to_thread(self.load_from_disk)
+        await self.refresh()
+
+    async def run_refresh_loop(self) -> None:
+        """
+        Периодически обновляет каталог. Пока каталога нет ни с биржи, ни с диска,
+        повторяет загрузку с удваивающейся паузой от CATALOG_RETRY_DELAY,
+        а не ждет полный CATALOG_REFRESH_INTERVAL.
+        """
+        retry_delay = CATALOG_RETRY_DELAY
+        while True:
+            if self.loaded:
+                await asyncio.sleep(CATALOG_REFRESH_INTERVAL)
+            else:
+                logger.info(f"Каталог символов не загружен, повтор через {retry_delay:.0f}с")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, CATALOG_REFRESH_INTERVAL)
+            if await self.refresh():
+                retry_delay = CATALOG_RETRY_DELAY
+
+symbol_catalog = SymbolCatalog()
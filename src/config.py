@@ -39,7 +39,88 @@ QUOTE_COINS = [
     "USDT", "BTC", "ETH", "BNB", "USDC", "BUSD", "DAI", "TUSD", "USDP", "SOL"
 ]
 
+# Фоновые задачи мониторинга
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', '8'))  # одновременных запросов цен к бирже
+SUPERVISOR_REPORT_INTERVAL = int(os.getenv('SUPERVISOR_REPORT_INTERVAL', '300'))  # секунд между отчетами в лог
+SCHEDULER_SLOTS = int(os.getenv('SCHEDULER_SLOTS', '60'))  # слотов колеса таймеров на интервал проверки
+
+# Адаптивный интервал проверки: чем ближе цена к порогу алерта и выше волатильность, тем чаще проверка
+REFRESH_MIN_INTERVAL = float(os.getenv('REFRESH_MIN_INTERVAL', '5'))  # секунд, нижняя граница
+REFRESH_MAX_INTERVAL = float(os.getenv('REFRESH_MAX_INTERVAL', str(UPDATE_INTERVAL)))  # секунд, верхняя граница
+REFRESH_IDLE_INTERVAL = float(os.getenv('REFRESH_IDLE_INTERVAL', str(UPDATE_INTERVAL * 5)))  # секунд, символы без порогов
+REFRESH_SIGMAS = float(os.getenv('REFRESH_SIGMAS', '3'))  # за интервал цена не должна дойти до порога с запасом в N сигм
+
+# Лимиты отправки сообщений Telegram
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '25'))  # сообщений в секунду для бота (лимит Telegram ~30)
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))  # сообщений в секунду в один чат
+DISPATCH_WORKERS = int(os.getenv('DISPATCH_WORKERS', '16'))
+DISPATCH_MAX_RETRIES = int(os.getenv('DISPATCH_MAX_RETRIES', '3'))
+
 # Настройки API
+BINANCE_API_URL = os.getenv('BINANCE_API_URL', 'https://api.binance.com')
+# Запасные хосты для хеджированных запросов цен (через запятую, пусто - без хеджирования)
+BINANCE_MIRROR_URLS = [url.strip().rstrip('/') for url in os.getenv('BINANCE_MIRROR_URLS', 'https://api1.binance.com').split(',') if url.strip()]
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', '0.5'))  # секунд, пока нет статистики задержек
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '0.05'))  # секунд
 API_TIMEOUT = 5  # секунд
 MAX_RETRIES = 2
-RETRY_DELAY = 0.5  # секунд
+RETRY_DELAY = 0.5  # секунд, удваивается с каждой попыткой
+
+# Бюджет веса запросов Binance (лимит биржи - 6000 в минуту на IP) и выключатель при 429/418/5xx
+BINANCE_WEIGHT_BUDGET = int(os.getenv('BINANCE_WEIGHT_BUDGET', '3000'))  # веса в минуту
+BREAKER_BASE_DELAY = float(os.getenv('BREAKER_BASE_DELAY', '5'))  # секунд, удваивается при повторных срабатываниях
+BREAKER_MAX_DELAY = float(os.getenv('BREAKER_MAX_DELAY', '300'))  # секунд
+
+# Пакетные запросы цен: символы, запрошенные в пределах окна, получаются одним запросом
+BATCH_WINDOW = float(os.getenv('BATCH_WINDOW', '0.05'))  # секунд
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', '100'))  # символов в одном запросе
+
+# Кэш результатов запросов цен (0 - отключен): повторный запрос символа в пределах TTL не идет в сеть
+PRICE_RESULT_TTL = float(os.getenv('PRICE_RESULT_TTL', '0'))  # секунд
+
+# Общий кэш цен по символам
+# Цена без порогов обновляется раз в REFRESH_IDLE_INTERVAL, поэтому предельный возраст вдвое больше:
+# запас на неудачный запрос и разброс колеса таймеров
+PRICE_MAX_AGE = int(os.getenv('PRICE_MAX_AGE', str(int(REFRESH_IDLE_INTERVAL * 2))))  # старше - цена не показывается
+PRICE_EVICT_AFTER = int(os.getenv('PRICE_EVICT_AFTER', '3600'))  # удаление цен символов без подписчиков
+
+# Хранилище пар пользователей: 'sqlite' (по умолчанию, точечные записи) или 'json' (файл целиком)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite').lower()
+STORAGE_DB = os.getenv('STORAGE_DB', '')  # путь к базе; по умолчанию user_data.db рядом с user_data.json
+STORAGE_SAVE_DELAY = float(os.getenv('STORAGE_SAVE_DELAY', '1.0'))  # секунд: изменения за это время пишутся одной записью
+# Загрузка пользователей (только SQLite): 'lazy' - при старте загружаются пользователи с алертами,
+# остальные - при первом обращении к боту и выгружаются после USER_IDLE_TTL секунд бездействия; 'all' - все сразу
+STORAGE_LOAD_MODE = os.getenv('STORAGE_LOAD_MODE', 'lazy').lower()
+USER_IDLE_TTL = int(os.getenv('USER_IDLE_TTL', '3600'))  # секунд
+# JSON-хранилище: изменения дописываются в журнал, снимок перезаписывается, когда журнал больше порога
+STORAGE_JOURNAL_MAX_BYTES = int(os.getenv('STORAGE_JOURNAL_MAX_BYTES', str(4 * 1024 * 1024)))
+
+# История цен: одна точка на HISTORY_RESOLUTION секунд, хранится HISTORY_RETENTION секунд
+# (12 байт на точку, при настройках по умолчанию ~17 КБ на символ)
+HISTORY_RESOLUTION = int(os.getenv('HISTORY_RESOLUTION', '60'))  # секунд
+HISTORY_RETENTION = int(os.getenv('HISTORY_RETENTION', str(24 * 3600)))  # секунд
+# Файлы истории для быстрого перезапуска (по одному на символ)
+HISTORY_DIR = os.getenv(
+    'HISTORY_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "history")
+)
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '30'))  # секунд между записями на диск
+
+# Каталог символов биржи (exchangeInfo): кэшируется на диске для холодного старта
+EXCHANGE_INFO_FILE = os.getenv(
+    'EXCHANGE_INFO_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "exchange_info.json")
+)
+CATALOG_REFRESH_INTERVAL = int(os.getenv('CATALOG_REFRESH_INTERVAL', str(6 * 3600)))  # секунд
+# Пока каталог не загружен ни разу: первая пауза перед повтором, дальше удваивается
+CATALOG_RETRY_DELAY = float(os.getenv('CATALOG_RETRY_DELAY', '10'))  # секунд
+
+# Кросс-курсы: вектор цен монет в USDT обновляется не чаще раза в CROSS_RATE_TTL
+CROSS_RATE_TTL = float(os.getenv('CROSS_RATE_TTL', '5'))  # секунд
+
+# Источник цен: 'poll' - REST опрос, 'stream' - Binance combined streams (<symbol>@bookTicker)
+PRICE_SOURCE = os.getenv('PRICE_SOURCE', 'poll').lower()
+BINANCE_WS_URL = os.getenv('BINANCE_WS_URL', 'wss://stream.binance.com:9443')
+STREAMS_PER_CONNECTION = int(os.getenv('STREAMS_PER_CONNECTION', '200'))
+STREAM_MIN_INTERVAL = float(os.getenv('STREAM_MIN_INTERVAL', '1.0'))  # секунд между проверками алертов символа
+STREAM_RECONNECT_MAX_DELAY = 30  # секунд
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Движок кросс-курсов: цены всех монет в USDT одним вектором, любая пара - деление.
+"""
+import asyncio
+import logging
+import math
+import time
+from array import array
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional
+from config import BASE_COINS, QUOTE_COINS, CROSS_RATE_TTL
+from catalog import symbol_catalog
+from utils import fetch_book_tickers
+
+logger = logging.getLogger(__name__)
+
+ANCHOR = "USDT"
+# Монеты-посредники для двухшагового пересчета, если у монеты нет пары к USDT
+BRIDGE_COINS = ["BTC", "ETH", "BNB"]
+# После неудачного обновления следующая попытка - через TTL, удваивается до этого предела
+RETRY_MAX_DELAY = 300.0  # секунд
+
+class CrossRateEngine:
+    """
+    Хранит вектор цен монет в USDT (array('d'), NaN - цена неизвестна).
+    Вектор обновляется одним запросом всех цен bookTicker; цена монеты берется
+    напрямую (XUSDT), через обратную пару (USDTX) или через посредника (XBTC * BTCUSDT).
+    Монеты из конструктора остаются в векторе всегда, монеты подписок - пока у их пар
+    есть подписчики (retain/release).
+    """
+
+    def __init__(self, coins: Iterable[str], ttl: float = CROSS_RATE_TTL):
+        self.ttl = ttl
+        self.coins: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.usd = array("d")
+        self.updated_at = 0.0
+        self.refreshes = 0
+        self.failures = 0     # неудачных обновлений подряд
+        self.retry_at = 0.0   # до этого времени вектор не обновляется после неудачи
+        self._refreshing: Optional[asyncio.Future] = None
+        self.refs: Dict[str, int] = {}  # монета подписок -> число символов с подписчиками, где она есть
+        for coin in [ANCHOR, *BRIDGE_COINS, *coins]:
+            self.add_coin(coin)
+        self.pinned = frozenset(self.coins)
+
+    def add_coin(self, coin: str) -> int:
+        """Добавляет монету в вектор (цена появится после следующего обновления)."""
+        coin = coin.upper()
+        if coin not in self.index:
+            self.index[coin] = len(self.coins)
+            self.coins.append(coin)
+            self.usd.append(1.0 if coin == ANCHOR else math.nan)
+            self.updated_at = 0.0  # новой монете нужна цена - следующий запрос обновит вектор
+        return self.index[coin]
+
+    def remove_coin(self, coin: str) -> None:
+        """Удаляет монету из вектора (цены остальных монет сохраняются)."""
+        i = self.index.pop(coin, None)
+        if i is None:
+            return
+        del self.coins[i]
+        del self.usd[i]
+        for j in range(i, len(self.coins)):
+            self.index[self.coins[j]] = j
+
+    @staticmethod
+    def known(coin: str) -> bool:
+        """Есть ли по каталогу у монеты пара к USDT или к монете-посреднику."""
+        if not symbol_catalog.loaded:
+            return True  # без каталога проверить нельзя - цену покажет обновление вектора
+        symbols = symbol_catalog.symbols
+        return any(f"{coin}{quote}" in symbols or f"{quote}{coin}" in symbols
+                   for quote in (ANCHOR, *BRIDGE_COINS))
+
+    def retain(self, base: str, quote: str) -> None:
+        """У символа пары появились подписчики: его монеты нужны в векторе."""
+        for coin in {base.upper(), quote.upper()}:
+            if coin in self.pinned:
+                continue
+            if coin not in self.refs and not self.known(coin):
+                logger.debug(f"Монета {coin} не торгуется к {ANCHOR}, в кросс-курсы не добавлена")
+                continue
+            self.refs[coin] = self.refs.get(coin, 0) + 1
+            self.add_coin(coin)
+
+    def release(self, base: str, quote: str) -> None:
+        """У символа пары не осталось подписчиков: его монеты больше не нужны в векторе."""
+        for coin in {base.upper(), quote.upper()}:
+            refs = self.refs.get(coin)
+            if refs is None:
+                continue
+            if refs > 1:
+                self.refs[coin] = refs - 1
+            else:
+                del self.refs[coin]
+                self.remove_coin(coin)
+
+    def update(self, tickers: Dict[str, float]) -> None:
+        """Пересчитывает вектор цен в USDT из словаря symbol -> цена за один проход."""
+        usd = array("d", repeat(math.nan, len(self.coins)))
+        usd[self.index[ANCHOR]] = 1.0
+
+        # Прямые и обратные пары к USDT
+        for i, coin in enumerate(self.coins):
+            if coin == ANCHOR:
+                continue
+            direct = tickers.get(f"{coin}{ANCHOR}")
+            if direct:
+                usd[i] = direct
+                continue
+            inverse = tickers.get(f"{ANCHOR}{coin}")
+            if inverse:
+                usd[i] = 1.0 / inverse
+
+        # Двухшаговый пересчет через монету-посредника
+        for i, coin in enumerate(self.coins):
+            if not math.isnan(usd[i]):
+                continue
+            for bridge in BRIDGE_COINS:
+                bridge_usd = usd[self.index[bridge]]
+                if math.isnan(bridge_usd) or bridge == coin:
+                    continue
+                direct = tickers.get(f"{coin}{bridge}")
+                if direct:
+                    usd[i] = direct * bridge_usd
+                    break
+                inverse = tickers.get(f"{bridge}{coin}")
+                if inverse:
+                    usd[i] = bridge_usd / inverse
+                    break
+
+        missing = [coin for coin, value in zip(self.coins, usd) if math.isnan(value)]
+        if missing:
+            logger.debug(f"Нет цены в USDT для монет: {', '.join(missing)}")
+        self.usd = usd
+        self.updated_at = time.time()
+
+    async def refresh(self) -> None:
+        """Обновляет вектор одним запросом; параллельные вызовы ждут один и тот же запрос."""
+        if self._refreshing is not None:
+            await asyncio.shield(self._refreshing)
+            return
+        self._refreshing = asyncio.get_running_loop().create_future()
+        try:
+            tickers = await fetch_book_tickers()
+            if tickers:
+                self.update(tickers)
+                self.refreshes += 1
+                self.failures = 0
+                self.retry_at = 0.0
+                logger.debug(f"Кросс-курсы обновлены: {len(self.coins)} монет")
+            else:
+                # Запрос всех цен тяжелый: не повторяем его на каждой проверке, пока биржа не отвечает
+                self.failures += 1
+                delay = min(RETRY_MAX_DELAY, self.ttl * 2 ** (self.failures - 1))
+                self.retry_at = time.time() + delay
+                logger.warning(f"Не удалось обновить кросс-курсы, следующая попытка через {delay:.0f} с")
+        finally:
+            self._refreshing.set_result(None)
+            self._refreshing = None
+
+    async def ensure_fresh(self) -> None:
+        """Обновляет вектор, если он старше TTL и не идет пауза после неудачного обновления."""
+        now = time.time()
+        if now - self.updated_at >= self.ttl and now >= self.retry_at:
+            await self.refresh()
+
+    def price(self, base: str, quote: str) -> Optional[float]:
+        """Цена base/quote из текущего вектора или None, если одна из цен неизвестна."""
+        base_index = self.index.get(base.upper())
+        quote_index = self.index.get(quote.upper())
+        if base_index is None or quote_index is None:
+            return None
+        base_usd = self.usd[base_index]
+        quote_usd = self.usd[quote_index]
+        if math.isnan(base_usd) or math.isnan(quote_usd) or quote_usd <= 0:
+            return None
+        return base_usd / quote_usd
+
+    async def get_price(self, base: str, quote: str) -> Optional[float]:
+        """Цена пары с обновлением вектора, если он старше TTL (монеты пары - в векторе, см. retain)."""
+        if base.upper() not in self.index or quote.upper() not in self.index:
+            return None
+        await self.ensure_fresh()
+        return self.price(base, quote)
+
+cross_rates = CrossRateEngine(BASE_COINS + QUOTE_COINS)
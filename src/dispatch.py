@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Очередь отправки сообщений в Telegram с учетом лимитов API.
+
+Telegram допускает около 30 сообщений в секунду для бота в целом и около 1 сообщения
+в секунду в один чат. Все отправки берут токен из общего ведра (алерты раньше ответов
+меню), алерты дополнительно разносятся по времени внутри каждого чата.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+from config import TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, DISPATCH_WORKERS, DISPATCH_MAX_RETRIES
+from supervisor import supervisor
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты (меньше - важнее)
+PRIORITY_ALERT = 0
+PRIORITY_REPLY = 10
+
+# rate_limit_args для запросов, уже прошедших через очередь отправки
+DISPATCHED = "dispatched"
+
+class PriorityTokenBucket:
+    """Ведро токенов, ожидающие которого обслуживаются в порядке приоритета."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _refill(self, now: float) -> None:
+        if now < self._paused_until:
+            self._updated = now
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: int = PRIORITY_REPLY) -> None:
+        """Ждет токен; при нехватке токенов первыми их получают ожидающие с меньшим priority."""
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and now >= self._paused_until and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self._schedule()
+        await future
+
+    def pause(self, seconds: float) -> None:
+        """Останавливает выдачу токенов (ответ RetryAfter от Telegram)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._waiters:
+            return
+        now = time.monotonic()
+        delay = max(self._paused_until - now, (1 - self.tokens) / self.rate, 0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._serve)
+
+    def _serve(self) -> None:
+        self._timer = None
+        self._refill(time.monotonic())
+        while self._waiters and self.tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.tokens -= 1
+            future.set_result(None)
+        self._schedule()
+
+@dataclass(order=True)
+class OutgoingMessage:
+    """Сообщение в очереди отправки."""
+    priority: int
+    sequence: int
+    chat_id: int = field(compare=False)
+    text: str = field(compare=False)
+    kwargs: Dict[str, Any] = field(compare=False, default_factory=dict)
+    on_sent: Optional[Callable[[], None]] = field(compare=False, default=None)
+    on_failed: Optional[Callable[[bool], None]] = field(compare=False, default=None)
+    enqueued_at: float = field(compare=False, default_factory=time.monotonic)
+    attempts: int = field(compare=False, default=0)
+
+class MessageDispatcher:
+    """
+    Очередь с приоритетами и пулом отправителей.
+    Учитывает общий лимит (ведро токенов), темп отправки в один чат и RetryAfter,
+    повторяет временные ошибки не более max_retries раз.
+    """
+
+    def __init__(self, bot, bucket: Optional[PriorityTokenBucket] = None,
+                 chat_rate: float = TELEGRAM_CHAT_RATE, workers: int = DISPATCH_WORKERS,
+                 max_retries: int = DISPATCH_MAX_RETRIES, mark_dispatched: bool = False):
+        self.bot = bot
+        self.bucket = bucket or PriorityTokenBucket(TELEGRAM_GLOBAL_RATE)
+        # Небольшой запас к интервалу, чтобы разброс задержки API не давал двух сообщений в секунду
+        self.chat_interval = 1.1 / chat_rate
+        self.workers = workers
+        self.max_retries = max_retries
+        self.mark_dispatched = mark_dispatched
+        self.queue: "asyncio.PriorityQueue[OutgoingMessage]" = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._chat_next_send: Dict[int, float] = {}
+        self._deferred = 0
+        self._tasks: List[asyncio.Task] = []
+        # Метрики
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.retry_after_hits = 0
+        self.latencies: Deque[float] = deque(maxlen=1000)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [
+                supervisor.spawn("dispatch", lambda i=i: self._worker(i), name=f"dispatch:{i}", restart=True)
+                for i in range(self.workers)
+            ]
+
+    async def drain(self) -> None:
+        """Ждет, пока очередь и отложенные сообщения не опустеют."""
+        while True:
+            await self.queue.join()
+            if not self._deferred:
+                return
+            await asyncio.sleep(0.05)
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        """Дожидается отправки очереди (не дольше drain_timeout) и останавливает отправителей."""
+        try:
+            await asyncio.wait_for(self.drain(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Очередь отправки не опустела за {drain_timeout} с: "
+                           f"осталось {self.queue.qsize() + self._deferred}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, chat_id: int, text: str, priority: int = PRIORITY_ALERT,
+               on_sent: Optional[Callable[[], None]] = None,
+               on_failed: Optional[Callable[[bool], None]] = None, **kwargs) -> None:
+        """
+        Ставит сообщение в очередь. on_failed(permanent) вызывается, если сообщение
+        не удалось отправить: permanent=True - повторять бессмысленно (бот заблокирован и т.п.).
+        """
+        self.queue.put_nowait(OutgoingMessage(
+            priority, next(self._sequence), chat_id, text, kwargs, on_sent, on_failed
+        ))
+
+    def stats(self) -> Dict[str, float]:
+        """Глубина очереди, счетчики и задержка доставки (от постановки до отправки)."""
+        latencies = sorted(self.latencies)
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+        return {
+            "queue_depth": self.queue.qsize(),
+            "deferred": self._deferred,
+            "waiting_tokens": self.bucket.waiting,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "retry_after": self.retry_after_hits,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95),
+        }
+
+    def _chat_delay(self, chat_id: int) -> float:
+        """Сколько ждать до окна отправки в чат; если окно открыто - резервирует его."""
+        now = time.monotonic()
+        next_send = self._chat_next_send.get(chat_id, 0.0)
+        if next_send > now:
+            return next_send - now
+        self._chat_next_send[chat_id] = now + self.chat_interval
+        if len(self._chat_next_send) > 10000:
+            self._chat_next_send = {c: t for c, t in self._chat_next_send.items() if t > now}
+        return 0.0
+
+    def _defer(self, message: OutgoingMessage, delay: float) -> None:
+        """Возвращает сообщение в очередь через delay секунд, не занимая отправителя."""
+        self._deferred += 1
+        asyncio.get_running_loop().call_later(delay, self._requeue, message)
+
+    def _requeue(self, message: OutgoingMessage) -> None:
+        self._deferred -= 1
+        self.queue.put_nowait(message)
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            message = await self.queue.get()
+            try:
+                delay = self._chat_delay(message.chat_id)
+                if delay > 0:
+                    self._defer(message, delay)
+                else:
+                    await self._deliver(message)
+            except Exception as e:
+                logger.error(f"Ошибка отправителя #{index}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, message: OutgoingMessage) -> None:
+        await self.bucket.acquire(message.priority)
+        message.attempts += 1
+        kwargs = dict(message.kwargs)
+        if self.mark_dispatched:
+            kwargs["rate_limit_args"] = DISPATCHED
+        try:
+            await self.bot.send_message(chat_id=message.chat_id, text=message.text, **kwargs)
+        except RetryAfter as e:
+            self.retry_after_hits += 1
+            self.bucket.pause(float(e.retry_after))
+            logger.warning(f"Telegram RetryAfter {e.retry_after} с (чат {message.chat_id})")
+            self._retry_or_fail(message, float(e.retry_after))
+        except (Forbidden, BadRequest) as e:
+            logger.warning(f"Сообщение в чат {message.chat_id} не доставлено: {e}")
+            self._fail(message, permanent=True)
+        except (TelegramError, asyncio.TimeoutError, OSError) as e:
+            logger.warning(f"Ошибка отправки в чат {message.chat_id} (попытка {message.attempts}): {e}")
+            self._retry_or_fail(message, 0.5 * 2 ** message.attempts)
+        else:
+            self.sent += 1
+            self.latencies.append(time.monotonic() - message.enqueued_at)
+            if message.on_sent:
+                message.on_sent()
+
+    def _retry_or_fail(self, message: OutgoingMessage, delay: float) -> None:
+        if message.attempts <= self.max_retries:
+            self.retried += 1
+            self._defer(message, delay)
+        else:
+            self._fail(message, permanent=False)
+
+    def _fail(self, message: OutgoingMessage, permanent: bool) -> None:
+        self.failed += 1
+        if message.on_failed:
+            message.on_failed(permanent)
+
+class DispatchRateLimiter(BaseRateLimiter):
+    """
+    Ограничитель запросов PTB: ответы бота берут токены из того же ведра,
+    что и очередь отправки, но с меньшим приоритетом.
+    """
+
+    def __init__(self, bucket: PriorityTokenBucket, max_retries: int = DISPATCH_MAX_RETRIES):
+        self.bucket = bucket
+        self.max_retries = max_retries
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        for attempt in range(self.max_retries + 1):
+            # Запросы из очереди отправки уже получили токен
+            if rate_limit_args != DISPATCHED:
+                await self.bucket.acquire(PRIORITY_REPLY)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.bucket.pause(float(e.retry_after))
+                if rate_limit_args == DISPATCHED or attempt == self.max_retries:
+                    raise
+                logger.warning(f"Telegram RetryAfter {e.retry_after} с для {endpoint}, повтор")
+                await asyncio.sleep(float(e.retry_after))
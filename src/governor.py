@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Бюджет веса запросов к Binance и автоматический выключатель (circuit breaker).
+
+Binance ограничивает суммарный вес запросов с одного IP за минуту и сообщает
+израсходованный вес в заголовке X-MBX-USED-WEIGHT-1M. При превышении лимита
+API отвечает 429, а при повторных нарушениях - 418 и банит IP на время
+от 2 минут до 3 дней. Все запросы к бирже проходят через один RequestGovernor.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Mapping, Optional
+from config import BINANCE_WEIGHT_BUDGET, BREAKER_BASE_DELAY, BREAKER_MAX_DELAY
+
+logger = logging.getLogger(__name__)
+
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+
+# Состояния выключателя
+BREAKER_CLOSED = "closed"        # запросы идут
+BREAKER_OPEN = "open"            # запросы отклоняются до open_until
+BREAKER_HALF_OPEN = "half_open"  # пропускается один пробный запрос
+
+class CircuitOpenError(Exception):
+    """Выключатель разомкнут - запрос к бирже не отправляется."""
+
+class RequestGovernor:
+    """
+    Учитывает вес запросов в текущей минуте и не выпускает запрос, если он превысит бюджет
+    (ждет начала следующей минуты). На ответы 429/418/5xx размыкает выключатель
+    с экспоненциально растущей задержкой и джиттером; после задержки пропускает
+    один пробный запрос и замыкается при его успехе.
+    """
+
+    def __init__(self, budget: int = BINANCE_WEIGHT_BUDGET, base_delay: float = BREAKER_BASE_DELAY,
+                 max_delay: float = BREAKER_MAX_DELAY):
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.used_weight = 0
+        self._window = self._current_window()
+        self.state = BREAKER_CLOSED
+        self.open_until = 0.0
+        self.failures = 0  # подряд, для роста задержки
+        self._probe_in_flight = False
+        # Метрики
+        self.trips = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.last_status: Optional[int] = None
+
+    @staticmethod
+    def _current_window() -> int:
+        return int(time.time() // 60)
+
+    def _roll_window(self) -> None:
+        window = self._current_window()
+        if window != self._window:
+            self._window = window
+            self.used_weight = 0
+
+    def _check_breaker(self) -> None:
+        if self.state == BREAKER_CLOSED:
+            return
+        now = time.time()
+        if self.state == BREAKER_OPEN and now >= self.open_until:
+            self.state = BREAKER_HALF_OPEN
+            logger.info("Выключатель Binance: пробный запрос")
+        if self.state == BREAKER_HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(f"выключатель Binance разомкнут еще {max(0.0, self.open_until - now):.0f} с")
+
+    async def acquire(self, weight: int) -> None:
+        """
+        Резервирует вес запроса. Ждет следующей минуты, если бюджет исчерпан;
+        бросает CircuitOpenError, если выключатель разомкнут.
+        """
+        while True:
+            self._check_breaker()
+            self._roll_window()
+            if self.used_weight + weight <= self.budget:
+                self.used_weight += weight
+                return
+            self.throttled += 1
+            if self.state == BREAKER_HALF_OPEN:
+                self._probe_in_flight = False
+            delay = 60 - time.time() % 60 + random.uniform(0, 1)
+            logger.warning(f"Бюджет веса Binance исчерпан ({self.used_weight}/{self.budget}), "
+                           f"ожидание {delay:.1f} с")
+            await asyncio.sleep(delay)
+
+    def record(self, status: int, headers: Mapping[str, str]) -> None:
+        """Учитывает ответ биржи: израсходованный вес и состояние выключателя."""
+        self.last_status = status
+        self._roll_window()
+        used = headers.get(USED_WEIGHT_HEADER)
+        if used is not None:
+            try:
+                self.used_weight = max(self.used_weight, int(used))
+            except ValueError:
+                pass
+
+        if status in (418, 429) or status >= 500:
+            retry_after = headers.get("Retry-After")
+            try:
+                delay = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                delay = None
+            self._trip(status, delay)
+        else:
+            self._close()
+
+    def record_error(self) -> None:
+        """Сетевая ошибка или таймаут: пробный запрос не удался, иначе выключатель не трогаем."""
+        if self.state == BREAKER_HALF_OPEN:
+            self._trip(None, None)
+
+    def record_cancel(self) -> None:
+        """
+        Запрос отменен до ответа (например, проигравший хеджированный запрос): это не ошибка
+        биржи, выключатель не трогаем, но освобождаем место пробного запроса.
+        """
+        if self.state == BREAKER_HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _trip(self, status: Optional[int], retry_after: Optional[float]) -> None:
+        self.failures += 1
+        backoff = min(self.max_delay, self.base_delay * 2 ** (self.failures - 1))
+        delay = backoff * random.uniform(0.5, 1.5)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self.state = BREAKER_OPEN
+        self.open_until = time.time() + delay
+        self._probe_in_flight = False
+        self.trips += 1
+        logger.error(f"🚫 Выключатель Binance разомкнут на {delay:.0f} с (ответ {status})")
+
+    def _close(self) -> None:
+        if self.state != BREAKER_CLOSED:
+            logger.info("✅ Выключатель Binance замкнут")
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, object]:
+        """Состояние для отчета: выключатель, израсходованный вес и счетчики."""
+        self._roll_window()
+        return {
+            "state": self.state,
+            "open_for": round(max(0.0, self.open_until - time.time()), 1) if self.state != BREAKER_CLOSED else 0.0,
+            "used_weight": self.used_weight,
+            "budget": self.budget,
+            "trips": self.trips,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
+
+governor = RequestGovernor()
@@ -4,19 +4,35 @@
 """
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
-from models import CryptoPair, UserState, user_settings, user_states
+from models import CryptoPair, UserPairs, UserState, user_settings, user_states
 import logging
-import asyncio
+import math
+from typing import Optional
 from keyboards import (
     get_main_keyboard, get_base_coin_keyboard, get_quote_coin_keyboard,
     get_cancel_inline_keyboard, 
     get_pairs_list_keyboard, get_pair_actions_keyboard
 )
-from monitoring import start_price_monitoring, stop_price_monitoring
-from utils import validate_price
+from monitoring import (
+    start_price_monitoring, stop_price_monitoring, get_cached_price, update_alert_range,
+    update_move_alert
+)
+from utils import validate_price, format_age
 from decorators import rate_limit
-from storage import save_user_data
-from config import RATE_LIMIT
+from storage import save_pair, delete_pair
+from config import RATE_LIMIT, HISTORY_RESOLUTION, HISTORY_RETENTION, REFRESH_MIN_INTERVAL, REFRESH_IDLE_INTERVAL
+
+# Минимальное окно алерта движения: в истории одна точка на HISTORY_RESOLUTION секунд,
+# и только окно от двух интервалов гарантированно содержит две точки для сравнения
+MIN_MOVE_WINDOW = max(1, math.ceil(2 * HISTORY_RESOLUTION / 60))  # минут
+# Максимальное окно алерта движения - вся хранимая история цен
+MAX_MOVE_WINDOW = max(MIN_MOVE_WINDOW, HISTORY_RETENTION // 60)  # минут
+
+# Подсказка о частоте обновления цен: интервал адаптивный (monitoring.refresh_interval)
+UPDATE_HINT = (
+    f"Цены обновляются от раза в {format_age(REFRESH_MIN_INTERVAL)} до раза в {format_age(REFRESH_IDLE_INTERVAL)}, "
+    f"чем ближе цена к порогу, тем чаще"
+)
 
 # Ограничения для команд (вызовов/период в секундах)
 COMMAND_LIMITS = {
@@ -25,13 +41,19 @@ COMMAND_LIMITS = {
     'normal': (RATE_LIMIT, 60),  # Настраиваемое количество вызовов в минуту
 }
 
+def _find_user_pair(chat_id: int, pair_id: str) -> Optional[CryptoPair]:
+    """Пара пользователя по идентификатору из callback data."""
+    pairs = user_settings.get(chat_id)
+    return pairs.by_id(pair_id) if pairs is not None else None
+
 @rate_limit(calls=COMMAND_LIMITS['quick'][0], period=COMMAND_LIMITS['quick'][1])
 async def cmd_help(update: Update, context: CallbackContext) -> None:
     """Показывает справку по использованию бота."""
     help_text = (
         "🤖 *Crypto Price Alert Bot*\n\n"
-        "📊 *Мониторинг:* Цены обновляются каждую минуту\n"
-        "🔔 *Уведомления:* При выходе за установленные диапазоны\n\n"
+        f"📊 *Мониторинг:* {UPDATE_HINT}\n"
+        "🔔 *Уведомления:* При выходе за установленные диапазоны\n"
+        "⚡ *Движение:* При росте или падении на заданный % за N минут\n\n"
         "Основные функции:\n"
         "🚀 Начать работу - Начать работу с ботом\n"
         "❓ Помощь - Показать это сообщение\n"
@@ -41,7 +63,7 @@ async def cmd_help(update: Update, context: CallbackContext) -> None:
         "📈 *Как использовать бот:*\n"
         "1. Нажмите '📊 Добавить пару' для добавления новой пары\n"
         "2. Выберите базовую и котируемую валюты\n"
-        "3. Установите диапазон цен для уведомлений\n"
+        "3. Установите диапазон цен и, при желании, порог движения (% за N минут)\n"
         "4. Бот будет отправлять уведомления при достижении указанных цен\n\n"
         "⚙️ *Дополнительно:*\n"
         "- Используйте '👁️ Мои пары' для управления парами\n"
@@ -67,7 +89,7 @@ async def cmd_start(update: Update, context: CallbackContext) -> None:
     
     # Инициализация пользователя
     if chat_id not in user_settings:
-        user_settings[chat_id] = []
+        user_settings[chat_id] = UserPairs()
         logger.info(f"Создан новый пользователь {chat_id}")
     if chat_id not in user_states:
         user_states[chat_id] = UserState()
@@ -75,7 +97,7 @@ async def cmd_start(update: Update, context: CallbackContext) -> None:
     
     welcome_text = (
         "👋 Привет! Я помогу отслеживать цены криптовалют.\n\n"
-        "📊 *Мониторинг:* Цены обновляются каждую минуту\n"
+        f"📊 *Мониторинг:* {UPDATE_HINT}\n"
         "🔔 *Уведомления:* При выходе за установленные диапазоны\n\n"
         "Выберите действие:"
     )
@@ -161,16 +183,14 @@ async def handle_coin_selection(update: Update, context: CallbackContext) -> Non
         state.selected_quote = selected_coin
         
         # Проверяем, не существует ли уже такая пара
-        if chat_id in user_settings:
-            for existing_pair in user_settings[chat_id]:
-                if (existing_pair.base == state.selected_base and 
-                    existing_pair.quote == selected_coin):
-                    await update.message.reply_text(
-                        f"❌ Пара {state.selected_base}/{selected_coin} уже существует!\n\nВыберите действие:",
-                        reply_markup=get_main_keyboard()
-                    )
-                    user_states[chat_id] = UserState()
-                    return
+        pairs = user_settings.get(chat_id)
+        if pairs is not None and pairs.get(state.selected_base, selected_coin) is not None:
+            await update.message.reply_text(
+                f"❌ Пара {state.selected_base}/{selected_coin} уже существует!\n\nВыберите действие:",
+                reply_markup=get_main_keyboard()
+            )
+            user_states[chat_id] = UserState()
+            return
         
         # Создаем новую пару без диапазона
         new_pair = CryptoPair(
@@ -182,8 +202,8 @@ async def handle_coin_selection(update: Update, context: CallbackContext) -> Non
         
         # Добавляем пару в настройки пользователя
         if chat_id not in user_settings:
-            user_settings[chat_id] = []
-        user_settings[chat_id].append(new_pair)
+            user_settings[chat_id] = UserPairs()
+        user_settings[chat_id].add(new_pair)
         
         # Запускаем мониторинг
         await start_price_monitoring(chat_id, new_pair.base, new_pair.quote, context.bot)
@@ -191,7 +211,7 @@ async def handle_coin_selection(update: Update, context: CallbackContext) -> Non
         # Отправляем подтверждение
         await update.message.reply_text(
             f"✅ Пара {new_pair.base}/{new_pair.quote} добавлена!\n\n"
-            f"💡 Цена будет обновляться каждую минуту\n"
+            f"💡 {UPDATE_HINT}\n"
             f"💡 Для установки диапазона цен используйте 'Мои пары'\n\n"
             f"Выберите действие:",
             reply_markup=get_main_keyboard()
@@ -200,8 +220,8 @@ async def handle_coin_selection(update: Update, context: CallbackContext) -> Non
         # Сбрасываем состояние
         user_states[chat_id] = UserState()
         
-        # Сохраняем данные асинхронно
-        asyncio.create_task(asyncio.to_thread(save_user_data))
+        # Сохраняем пару (запись выполнит фоновый писатель)
+        save_pair(chat_id, new_pair.base, new_pair.quote)
 
 
 @rate_limit(calls=COMMAND_LIMITS['quick'][0], period=COMMAND_LIMITS['quick'][1])
@@ -223,6 +243,8 @@ async def cmd_my_pairs(update: Update, context: CallbackContext) -> None:
         pairs_text += f"{i}. {pair.base}/{pair.quote}"
         if pair.min_price is not None or pair.max_price is not None:
             pairs_text += " 📊"
+        if pair.move_window:
+            pairs_text += " ⚡"
         pairs_text += "\n"
     
     pairs_text += "\n💡 Нажмите на пару для управления:"
@@ -265,17 +287,17 @@ async def handle_range_setting(update: Update, context: CallbackContext) -> None
         return
         
     # Обработка минимальной цены
-    if state.range_min is None:
+    if state.range_step is None:
         state.range_min = price
+        state.range_step = 'max'
         
-        # Получаем последнюю сохраненную цену из мониторинга для справки
+        # Получаем последнюю сохраненную цену из общего кэша для справки
         symbol = f"{state.selected_base}{state.selected_quote}".upper()
-        tracking_key = (chat_id, symbol)
+        cached = get_cached_price(symbol)
         
-        from models import last_prices
-        if tracking_key in last_prices:
-            formatted_price = f"{last_prices[tracking_key]:.8f}"
-            price_text = f"Текущий курс: `{formatted_price}`"
+        if cached is not None:
+            formatted_price = f"{cached.price:.8f}"
+            price_text = f"Текущий курс: `{formatted_price}` ({format_age(cached.age)} назад)"
         else:
             price_text = "Текущий курс: ⏳ Ожидание обновления..."
         
@@ -289,34 +311,59 @@ async def handle_range_setting(update: Update, context: CallbackContext) -> None
         return
         
     # Обработка максимальной цены
-    state.range_max = price
+    if state.range_step == 'max':
+        state.range_max = price
+        
+        # Проверка корректности диапазона
+        if state.range_min is not None and state.range_max is not None:
+            if state.range_min >= state.range_max:
+                await update.message.reply_text(
+                    "❌ Минимальная цена должна быть меньше максимальной. Попробуйте снова:",
+                    reply_markup=get_main_keyboard()
+                )
+                user_states[chat_id] = UserState()
+                return
+        
+        state.range_step = 'move_pct'
+        await update.message.reply_text(
+            "Введите изменение цены в % для оповещения о резком движении\n"
+            "(например 3 - оповещение при росте или падении на 3%), или '-' чтобы пропустить:"
+        )
+        return
     
-    # Проверка корректности диапазона
-    if state.range_min is not None and state.range_max is not None:
-        if state.range_min >= state.range_max:
+    # Обработка порога движения цены
+    if state.range_step == 'move_pct':
+        if price is not None:
+            state.move_pct = price
+            state.range_step = 'move_window'
             await update.message.reply_text(
-                "❌ Минимальная цена должна быть меньше максимальной. Попробуйте снова:",
-                reply_markup=get_main_keyboard()
+                f"Введите окно в минутах, за которое цена должна измениться на {price_input}% "
+                f"(от {MIN_MOVE_WINDOW} до {MAX_MOVE_WINDOW}):"
             )
-            user_states[chat_id] = UserState()
             return
+        move_window = None
+    else:
+        # Обработка окна движения цены
+        if price is None or price != int(price) or not MIN_MOVE_WINDOW <= price <= MAX_MOVE_WINDOW:
+            await update.message.reply_text(
+                f"❌ Введите целое число минут от {MIN_MOVE_WINDOW} до {MAX_MOVE_WINDOW}:"
+            )
+            return
+        move_window = int(price)
+    move_pct = state.move_pct if move_window else None
         
     # Обновляем пару в настройках пользователя
-    pairs = user_settings.get(chat_id, [])
-    for pair in pairs:
-        if pair.base == state.selected_base and pair.quote == state.selected_quote:
-            pair.min_price = state.range_min
-            pair.max_price = state.range_max
-            break
+    pairs = user_settings.get(chat_id)
+    pair = pairs.get(state.selected_base, state.selected_quote) if pairs is not None else None
+    if pair is not None:
+        pair.min_price = state.range_min
+        pair.max_price = state.range_max
+        pair.move_pct = move_pct
+        pair.move_window = move_window
         
-    # Сбрасываем флаг алерта при изменении диапазона
-    symbol = f"{state.selected_base}{state.selected_quote}".upper()
-    tracking_key = (chat_id, symbol)
-    from models import alert_tracking
-    if tracking_key in alert_tracking:
-        alert_tracking[tracking_key]["alerted"] = False
-        alert_tracking[tracking_key]["last_price"] = None  # Сбрасываем отслеживание цены
-        logger.info(f"Сброшен флаг алерта для {symbol} при изменении диапазона")
+    # Сбрасываем флаг алерта и обновляем индексы алертов при изменении диапазона
+    update_alert_range(chat_id, state.selected_base, state.selected_quote, state.range_min, state.range_max)
+    update_move_alert(chat_id, state.selected_base, state.selected_quote, move_pct, move_window)
     
     # Отправляем подтверждение
     range_text = ""
@@ -324,6 +371,8 @@ async def handle_range_setting(update: Update, context: CallbackContext) -> None
         range_text += f"\nМинимум: {state.range_min}"
     if state.range_max is not None:
         range_text += f"\nМаксимум: {state.range_max}"
+    if move_window:
+        range_text += f"\nДвижение: ±{move_pct:g}% за {move_window} мин"
         
     await update.message.reply_text(
         f"✅ Диапазон для {state.selected_base}/{state.selected_quote} установлен!{range_text}\n\nВыберите действие:",
@@ -333,8 +382,8 @@ async def handle_range_setting(update: Update, context: CallbackContext) -> None
     # Сбрасываем состояние
     user_states[chat_id] = UserState()
     
-    # Сохраняем данные асинхронно
-    asyncio.create_task(asyncio.to_thread(save_user_data))
+    # Сохраняем пару (запись выполнит фоновый писатель)
+    save_pair(chat_id, state.selected_base, state.selected_quote)
 
 @rate_limit(calls=COMMAND_LIMITS['quick'][0], period=COMMAND_LIMITS['quick'][1])
 async def cmd_cached_price(update: Update, context: CallbackContext) -> None:
@@ -354,22 +403,20 @@ async def cmd_cached_price(update: Update, context: CallbackContext) -> None:
         )
         return
     
-    # Получаем последние сохраненные цены из мониторинга
+    # Получаем последние сохраненные цены из общего кэша
     prices_text = "💰 Последние курсы:\n\n"
     
-    from models import last_prices  # Добавим хранение последних цен
-    
     for i, pair in enumerate(pairs, 1):
         symbol = f"{pair.base}{pair.quote}".upper()
-        tracking_key = (chat_id, symbol)
+        cached = get_cached_price(symbol)
         
-        if tracking_key in last_prices:
-            formatted_price = f"{last_prices[tracking_key]:.8f}"
-            prices_text += f"{i}. {pair.base}/{pair.quote}: `{formatted_price}`\n"
+        if cached is not None:
+            formatted_price = f"{cached.price:.8f}"
+            prices_text += f"{i}. {pair.base}/{pair.quote}: `{formatted_price}` ({format_age(cached.age)} назад)\n"
         else:
             prices_text += f"{i}. {pair.base}/{pair.quote}: ⏳ Ожидание обновления...\n"
     
-    prices_text += "\n💡 Можно скопировать нажатием\n💡 Цены обновляются каждую минуту\n\nВыберите действие:"
+    prices_text += f"\n💡 Можно скопировать нажатием\n💡 {UPDATE_HINT}\n\nВыберите действие:"
     
     await update.message.reply_text(
         prices_text,
@@ -377,37 +424,6 @@ async def cmd_cached_price(update: Update, context: CallbackContext) -> None:
         parse_mode='Markdown'
     )
 
-@rate_limit(calls=COMMAND_LIMITS['normal'][0], period=COMMAND_LIMITS['normal'][1])
-async def handle_price_check(update: Update, context: CallbackContext) -> None:
-    """Обрабатывает запрос текущей цены и кнопки меню."""
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    chat_id = update.effective_chat.id
-    text = update.message.text
-    logger.info(f"🔍 handle_price_check вызван для пользователя {chat_id} с текстом: '{text}'")
-    logger.debug(f"handle_price_check вызван для пользователя {chat_id} с текстом: '{text}'")
-
-    # Обработка кнопок меню
-    if text in ["📊 Добавить пару", "📊 Установить пару криптовалют"]:
-        logger.info(f"✅ Обрабатываем кнопку 'Добавить пару' для пользователя {chat_id}")
-        await cmd_add_pair(update, context)
-        return
-    elif text == "📈 Текущий курс":
-        logger.info(f"✅ Обрабатываем кнопку 'Текущий курс' для пользователя {chat_id}")
-        await cmd_cached_price(update, context)
-        return
-    elif text == "👁️ Мои пары":
-        logger.info(f"✅ Обрабатываем кнопку 'Мои пары' для пользователя {chat_id}")
-        await cmd_my_pairs(update, context)
-        return
-    elif text == "❓ Помощь":
-        logger.info(f"✅ Обрабатываем кнопку 'Помощь' для пользователя {chat_id}")
-        await cmd_help(update, context)
-        return
-    
-    # Обработка выбора монет для проверки цены (удалено - теперь показываем все пары сразу)
-
 @rate_limit(calls=COMMAND_LIMITS['normal'][0], period=COMMAND_LIMITS['normal'][1])
 async def handle_callback_query(update: Update, context: CallbackContext) -> None:
     """Обрабатывает callback queries от inline кнопок."""
@@ -459,6 +475,8 @@ async def handle_callback_query(update: Update, context: CallbackContext) -> Non
                 pairs_text += f"{i}. {pair.base}/{pair.quote}"
                 if pair.min_price is not None or pair.max_price is not None:
                     pairs_text += " 📊"
+                if pair.move_window:
+                    pairs_text += " ⚡"
                 pairs_text += "\n"
                 
             pairs_text += "\n💡 Нажмите на пару для управления:"
@@ -471,14 +489,13 @@ async def handle_callback_query(update: Update, context: CallbackContext) -> Non
             
         elif data.startswith("pair_"):
             # Выбор пары для управления
-            pair_index = int(data.split("_")[1])
-            pairs = user_settings.get(chat_id, [])
+            pair_id = data[len("pair_"):]
+            pair = _find_user_pair(chat_id, pair_id)
             
-            logger.info(f"🔍 Обработка выбора пары {pair_index} для пользователя {chat_id}")
-            logger.debug(f"Обработка выбора пары {pair_index} для пользователя {chat_id}")
+            logger.info(f"🔍 Обработка выбора пары {pair_id} для пользователя {chat_id}")
+            logger.debug(f"Обработка выбора пары {pair_id} для пользователя {chat_id}")
             
-            if 0 <= pair_index < len(pairs):
-                pair = pairs[pair_index]
+            if pair is not None:
                 
                 # Показываем информацию о паре и действия
                 pair_info = f"📊 Пара: {pair.base}/{pair.quote}\n\n"
@@ -490,10 +507,12 @@ async def handle_callback_query(update: Update, context: CallbackContext) -> Non
                     pair_info += f"Максимум: {pair.max_price:.8f}\n"
                 else:
                     pair_info += "Максимум: не установлен\n"
+                if pair.move_window:
+                    pair_info += f"Движение: ±{pair.move_pct:g}% за {pair.move_window} мин\n"
                 
                 pair_info += "\nВыберите действие:"
                 
-                keyboard = get_pair_actions_keyboard(pair_index)
+                keyboard = get_pair_actions_keyboard(pair_id)
                 logger.info(f"📊 Отправляем меню действий для пары {pair.base}/{pair.quote}")
                 logger.debug(f"Отправляем меню действий для пары {pair.base}/{pair.quote}")
                 
@@ -502,31 +521,28 @@ async def handle_callback_query(update: Update, context: CallbackContext) -> Non
                     reply_markup=keyboard
                 )
             else:
-                logger.warning(f"❌ Пара с индексом {pair_index} не найдена для пользователя {chat_id}")
-                logger.error(f"Пара с индексом {pair_index} не найдена для пользователя {chat_id}")
+                logger.warning(f"❌ Пара {pair_id} не найдена для пользователя {chat_id}")
+                logger.error(f"Пара {pair_id} не найдена для пользователя {chat_id}")
                 await query.answer("❌ Пара не найдена")
             
         elif data.startswith("set_range_"):
             # Настройка диапазона для пары
-            pair_index = int(data.split("_")[2])
-            pairs = user_settings.get(chat_id, [])
+            pair = _find_user_pair(chat_id, data[len("set_range_"):])
             
-            if 0 <= pair_index < len(pairs):
-                pair = pairs[pair_index]
+            if pair is not None:
                 user_states[chat_id] = UserState(
                     current_action='setting_range',
                     selected_base=pair.base,
                     selected_quote=pair.quote
                 )
                 
-                # Получаем последнюю сохраненную цену из мониторинга
+                # Получаем последнюю сохраненную цену из общего кэша
                 symbol = f"{pair.base}{pair.quote}".upper()
-                tracking_key = (chat_id, symbol)
+                cached = get_cached_price(symbol)
                 
-                from models import last_prices
-                if tracking_key in last_prices:
-                    formatted_price = f"{last_prices[tracking_key]:.8f}"
-                    price_text = f"Текущий курс: `{formatted_price}`"
+                if cached is not None:
+                    formatted_price = f"{cached.price:.8f}"
+                    price_text = f"Текущий курс: `{formatted_price}` ({format_age(cached.age)} назад)"
                 else:
                     price_text = "Текущий курс: ⏳ Ожидание обновления..."
                 
@@ -542,37 +558,35 @@ async def handle_callback_query(update: Update, context: CallbackContext) -> Non
                 
         elif data.startswith("view_price_"):
             # Просмотр текущей цены пары
-            pair_index = int(data.split("_")[2])
-            pairs = user_settings.get(chat_id, [])
+            pair_id = data[len("view_price_"):]
+            pair = _find_user_pair(chat_id, pair_id)
             
-            if 0 <= pair_index < len(pairs):
-                pair = pairs[pair_index]
-                
-                # Получаем последнюю сохраненную цену
+            if pair is not None:
+                # Получаем последнюю сохраненную цену из общего кэша
                 symbol = f"{pair.base}{pair.quote}".upper()
-                tracking_key = (chat_id, symbol)
+                cached = get_cached_price(symbol)
                 
-                from models import last_prices
-                if tracking_key in last_prices:
-                    formatted_price = f"{last_prices[tracking_key]:.8f}"
+                if cached is not None:
+                    formatted_price = f"{cached.price:.8f}"
                     price_text = (
                         f"💰 Последняя цена {pair.base}/{pair.quote}:\n\n"
-                        f"`{formatted_price}`\n\n"
+                        f"`{formatted_price}`\n"
+                        f"🕒 Обновлено {format_age(cached.age)} назад\n\n"
                         f"💡 Можно скопировать нажатием\n"
-                        f"💡 Цены обновляются каждую минуту\n\n"
+                        f"💡 {UPDATE_HINT}\n\n"
                         f"Выберите действие:"
                     )
                 else:
                     price_text = (
                         f"💰 Цена {pair.base}/{pair.quote}:\n\n"
                         f"⏳ Ожидание обновления...\n\n"
-                        f"💡 Цены обновляются каждую минуту\n\n"
+                        f"💡 {UPDATE_HINT}\n\n"
                         f"Выберите действие:"
                     )
                 
                 await query.edit_message_text(
                     text=price_text,
-                    reply_markup=get_pair_actions_keyboard(pair_index),
+                    reply_markup=get_pair_actions_keyboard(pair_id),
                     parse_mode='Markdown'
                 )
             else:
@@ -580,23 +594,22 @@ async def handle_callback_query(update: Update, context: CallbackContext) -> Non
                 
         elif data.startswith("delete_pair_"):
             # Удаление пары
-            pair_index = int(data.split("_")[2])
-            pairs = user_settings.get(chat_id, [])
+            pair = _find_user_pair(chat_id, data[len("delete_pair_"):])
             
-            if 0 <= pair_index < len(pairs):
-                pair = pairs[pair_index]
+            if pair is not None:
+                pairs = user_settings[chat_id]
                 
                 # Останавливаем мониторинг и удаляем пару
                 await stop_price_monitoring(chat_id, pair.base, pair.quote)
-                pairs.pop(pair_index)
+                pairs.remove(pair.base, pair.quote)
                 
                 await query.edit_message_text(
                     f"✅ Пара {pair.base}/{pair.quote} удалена.\n\nВыберите действие:",
                     reply_markup=get_pairs_list_keyboard(pairs)
                 )
                 
-                # Сохраняем данные асинхронно
-                asyncio.create_task(asyncio.to_thread(save_user_data))
+                # Удаляем пару из хранилища (запись выполнит фоновый писатель)
+                delete_pair(chat_id, pair.base, pair.quote)
             else:
                 await query.answer("❌ Пара не найдена")
         
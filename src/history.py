@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+История цен по символам в кольцевых буферах фиксированного размера.
+"""
+import time
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+from config import HISTORY_RESOLUTION, HISTORY_RETENTION
+
+# Типы элементов массивов: время - целые секунды (4 байта), цена - double (8 байт)
+TIME_TYPECODE = "I"
+PRICE_TYPECODE = "d"
+
+@dataclass
+class WindowStats:
+    """Статистика цены символа за окно."""
+    count: int
+    first: float
+    last: float
+    min: float
+    max: float
+    mean: float
+
+    @property
+    def change_pct(self) -> float:
+        """Изменение цены за окно в процентах (от первой точки окна к последней)."""
+        return (self.last - self.first) / self.first * 100 if self.first else 0.0
+
+class _RingView:
+    """Логическая индексация кольца (0 - самая старая точка) для bisect."""
+
+    def __init__(self, values: array, start: int, count: int):
+        self.values = values
+        self.start = start
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int):
+        return self.values[(self.start + i) % len(self.values)]
+
+class PriceHistory:
+    """
+    Кольцевой буфер (время, цена) одного символа на capacity точек.
+
+    Точки лежат в двух типизированных массивах array, выделенных целиком при создании,
+    поэтому память буфера постоянна: capacity * 12 байт. Одна точка на интервал resolution:
+    новая цена в том же интервале заменяет последнюю точку. Добавление - O(1),
+    запросы по окну - бинарный поиск начала окна и проход по срезу массива.
+    """
+
+    __slots__ = ("capacity", "resolution", "times", "prices", "head", "count", "dirty")
+
+    def __init__(self, capacity: int, resolution: float):
+        self.capacity = capacity
+        self.resolution = resolution
+        self.times = array(TIME_TYPECODE, bytes(array(TIME_TYPECODE).itemsize * capacity))
+        self.prices = array(PRICE_TYPECODE, bytes(array(PRICE_TYPECODE).itemsize * capacity))
+        self.head = 0   # индекс для следующей точки
+        self.count = 0
+        self.dirty = 0  # изменений с последней записи на диск
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def _start(self) -> int:
+        return (self.head - self.count) % self.capacity
+
+    @property
+    def last(self) -> Optional[Tuple[int, float]]:
+        if not self.count:
+            return None
+        index = (self.head - 1) % self.capacity
+        return self.times[index], self.prices[index]
+
+    def append(self, timestamp: float, price: float) -> None:
+        """Добавляет точку; в пределах одного интервала resolution заменяет последнюю."""
+        ts = int(timestamp)
+        if self.count:
+            last_index = (self.head - 1) % self.capacity
+            last_ts = self.times[last_index]
+            if ts < last_ts:
+                return  # точки только в порядке времени
+            if ts // self.resolution == last_ts // self.resolution:
+                self.times[last_index] = ts
+                self.prices[last_index] = price
+                self.dirty += 1
+                return
+        self.dirty += 1
+        self.times[self.head] = ts
+        self.prices[self.head] = price
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def _slice(self, values: array, first: int) -> array:
+        """Срез values от логического индекса first до конца (с учетом переноса кольца)."""
+        start = (self._start + first) % self.capacity
+        end = self.head if self.head else self.capacity
+        if self.count - first <= 0:
+            return array(values.typecode)
+        if start < end:
+            return values[start:end]
+        return values[start:] + values[:end]
+
+    def window(self, seconds: float, now: Optional[float] = None) -> Tuple[array, array]:
+        """Точки за последние seconds секунд: (массив времени, массив цен)."""
+        since = (now if now is not None else time.time()) - seconds
+        first = bisect_left(_RingView(self.times, self._start, self.count), since)
+        return self._slice(self.times, first), self._slice(self.prices, first)
+
+    def stats(self, seconds: float, now: Optional[float] = None) -> Optional[WindowStats]:
+        """Минимум, максимум, среднее и изменение цены за последние seconds секунд."""
+        _, prices = self.window(seconds, now)
+        if not prices:
+            return None
+        return WindowStats(
+            count=len(prices), first=prices[0], last=prices[-1],
+            min=min(prices), max=max(prices), mean=sum(prices) / len(prices),
+        )
+
+    def percent_change(self, seconds: float, now: Optional[float] = None) -> Optional[float]:
+        """Изменение цены в процентах за последние seconds секунд."""
+        stats = self.stats(seconds, now)
+        return stats.change_pct if stats is not None and stats.count > 1 else None
+
+    def load(self, times: bytes, prices: bytes, head: int, count: int) -> None:
+        """Заполняет буфер готовыми массивами кольца той же емкости (копирование без разбора)."""
+        self.times = array(TIME_TYPECODE)
+        self.times.frombytes(times)
+        self.prices = array(PRICE_TYPECODE)
+        self.prices.frombytes(prices)
+        self.head = head
+        self.count = count
+        self.dirty = 0
+
+    def dirty_runs(self) -> List[Tuple[int, bytes, bytes]]:
+        """
+        Непрерывные участки кольца, измененные с последней записи:
+        (первый слот, байты времени, байты цен). Последняя точка включается всегда,
+        так как новая цена в том же интервале перезаписывает ее.
+        """
+        changed = min(self.dirty + 1, self.count)
+        if not changed:
+            return []
+        start = (self.head - changed) % self.capacity
+        end = start + changed
+        if end <= self.capacity:
+            bounds = [(start, end)]
+        else:
+            bounds = [(start, self.capacity), (0, end - self.capacity)]
+        return [(a, self.times[a:b].tobytes(), self.prices[a:b].tobytes()) for a, b in bounds]
+
+    @property
+    def nbytes(self) -> int:
+        return self.capacity * (self.times.itemsize + self.prices.itemsize)
+
+class HistoryStore:
+    """Истории цен всех символов: буфер создается при первой цене символа."""
+
+    def __init__(self, resolution: float = HISTORY_RESOLUTION, retention: float = HISTORY_RETENTION):
+        self.resolution = resolution
+        self.retention = retention
+        self.capacity = max(1, int(retention // resolution))
+        self._histories: Dict[str, PriceHistory] = {}
+        self.dirty_symbols: Set[str] = set()  # изменены с последней записи на диск
+        self.removed_symbols: Set[str] = set()  # удалены с последней записи на диск
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._histories
+
+    def get(self, symbol: str) -> Optional[PriceHistory]:
+        return self._histories.get(symbol)
+
+    def items(self):
+        return self._histories.items()
+
+    def create(self, symbol: str) -> PriceHistory:
+        """Создает пустой буфер символа (или возвращает существующий)."""
+        history = self._histories.get(symbol)
+        if history is None:
+            history = self._histories[symbol] = PriceHistory(self.capacity, self.resolution)
+            self.removed_symbols.discard(symbol)
+        return history
+
+    def record(self, symbol: str, timestamp: float, price: float) -> None:
+        history = self._histories.get(symbol)
+        if history is None:
+            history = self.create(symbol)
+        history.append(timestamp, price)
+        self.dirty_symbols.add(symbol)
+
+    def remove(self, symbol: str) -> None:
+        if self._histories.pop(symbol, None) is not None:
+            self.dirty_symbols.discard(symbol)
+            self.removed_symbols.add(symbol)
+
+    def stats(self) -> Dict[str, int]:
+        """Число символов, точек и занятая буферами память."""
+        return {
+            "symbols": len(self._histories),
+            "points": sum(len(history) for history in self._histories.values()),
+            "bytes": len(self._histories) * self.capacity * (
+                array(TIME_TYPECODE).itemsize + array(PRICE_TYPECODE).itemsize
+            ),
+        }
+
+price_history = HistoryStore()
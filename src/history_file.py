@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Хранение истории цен на диске для быстрого перезапуска.
+
+Файл символа - копия его кольцевого буфера фиксированного размера:
+заголовок, затем массив времени (uint32) и массив цен (double) на capacity точек.
+При старте файл отображается в память (mmap) и массивы копируются в буфер как есть,
+без разбора записей. Запись идет пакетами в отдельном потоке: раз в интервал
+в файлы попадают только измененные с прошлой записи слоты кольца.
+"""
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+from config import HISTORY_DIR, HISTORY_FLUSH_INTERVAL
+from history import HistoryStore, PriceHistory, TIME_TYPECODE, PRICE_TYPECODE
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PHST"
+VERSION = 1
+# magic, версия, емкость, head, count, разрешение (секунд); дополняется до HEADER_SIZE
+HEADER = struct.Struct("<4sHIIId")
+HEADER_SIZE = 32
+TIME_SIZE = array(TIME_TYPECODE).itemsize
+PRICE_SIZE = array(PRICE_TYPECODE).itemsize
+
+# Пакет записи: symbol -> (capacity, resolution, head, count, [(слот, байты времени, байты цен)])
+WriteBatch = Dict[str, Tuple[int, float, int, int, List[Tuple[int, bytes, bytes]]]]
+
+class HistoryFiles:
+    """Файлы истории цен в каталоге directory, по одному на символ."""
+
+    def __init__(self, directory: str = HISTORY_DIR):
+        self.directory = directory
+        self.flushes = 0
+        self.bytes_written = 0
+        self._lock = asyncio.Lock()  # записи идут по очереди: заголовок файла пишется последним
+
+    def path(self, symbol: str) -> str:
+        return os.path.join(self.directory, f"{symbol}.bin")
+
+    def load_into(self, store: HistoryStore) -> Dict[str, Tuple[int, float]]:
+        """
+        Загружает все файлы истории в store. Возвращает последнюю точку каждого символа:
+        symbol -> (время, цена).
+        """
+        last_points: Dict[str, Tuple[int, float]] = {}
+        if not os.path.isdir(self.directory):
+            return last_points
+        for name in os.listdir(self.directory):
+            symbol, ext = os.path.splitext(name)
+            if ext != ".bin" or not symbol.isalnum():
+                continue
+            try:
+                history = self._load_file(self.path(symbol), store, symbol)
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning(f"Файл истории {name} пропущен: {e}")
+                continue
+            if history is not None and history.last is not None:
+                last_points[symbol] = history.last
+        return last_points
+
+    def _load_file(self, path: str, store: HistoryStore, symbol: str) -> Optional[PriceHistory]:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, version, capacity, head, count, resolution = HEADER.unpack_from(mm, 0)
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError("неизвестный формат")
+                if len(mm) < HEADER_SIZE + capacity * (TIME_SIZE + PRICE_SIZE) or count > capacity:
+                    raise ValueError("файл обрезан")
+                if not count:
+                    return None
+                prices_offset = HEADER_SIZE + capacity * TIME_SIZE
+                times = mm[HEADER_SIZE:prices_offset]
+                prices = mm[prices_offset:prices_offset + capacity * PRICE_SIZE]
+        
+        history = store.create(symbol)
+        if capacity == store.capacity and resolution == store.resolution:
+            history.load(times, prices, head, count)
+        else:
+            # Настройки истории изменились - переносим точки по одной
+            old = PriceHistory(capacity, resolution)
+            old.load(times, prices, head, count)
+            all_times, all_prices = old.window(float("inf"), now=time.time())
+            for ts, price in zip(all_times, all_prices):
+                history.append(ts, price)
+            store.dirty_symbols.add(symbol)
+            history.dirty = history.count
+        return history
+
+    def collect(self, store: HistoryStore) -> Tuple[WriteBatch, List[str]]:
+        """
+        Снимает измененные участки колец (в цикле событий, быстро) для записи в потоке.
+        Если запись не удастся, restore возвращает символы пакета в очередь.
+        """
+        batch: WriteBatch = {}
+        for symbol in store.dirty_symbols:
+            history = store.get(symbol)
+            if history is None or not history.dirty:
+                continue
+            batch[symbol] = (history.capacity, history.resolution, history.head, history.count,
+                             history.dirty_runs())
+            history.dirty = 0
+        store.dirty_symbols.clear()
+        removed = list(store.removed_symbols)
+        store.removed_symbols.clear()
+        return batch, removed
+
+    def restore(self, store: HistoryStore, failed: List[str]) -> None:
+        """
+        Возвращает в очередь символы, запись которых не удалась. Какие слоты файла успели
+        записаться, неизвестно, поэтому кольцо символа будет переписано целиком.
+        """
+        for symbol in failed:
+            history = store.get(symbol)
+            if history is not None:
+                history.dirty = history.count
+                store.dirty_symbols.add(symbol)
+            else:
+                store.removed_symbols.add(symbol)
+
+    def write(self, batch: WriteBatch, removed: List[str]) -> Tuple[int, List[str]]:
+        """
+        Записывает пакет в файлы (в отдельном потоке).
+        Возвращает число записанных байт и символы, которые записать или удалить не удалось.
+        """
+        written = 0
+        failed: List[str] = []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            logger.error(f"Ошибка создания каталога истории {self.directory}: {e}")
+            return written, list(batch) + removed
+        for symbol, (capacity, resolution, head, count, runs) in batch.items():
+            path = self.path(symbol)
+            size = HEADER_SIZE + capacity * (TIME_SIZE + PRICE_SIZE)
+            try:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    if os.fstat(fd).st_size != size:
+                        os.ftruncate(fd, 0)
+                        os.ftruncate(fd, size)
+                    for slot, times, prices in runs:
+                        os.pwrite(fd, times, HEADER_SIZE + slot * TIME_SIZE)
+                        os.pwrite(fd, prices, HEADER_SIZE + capacity * TIME_SIZE + slot * PRICE_SIZE)
+                        written += len(times) + len(prices)
+                    # Заголовок пишется последним: head/count указывают только на записанные слоты
+                    header = HEADER.pack(MAGIC, VERSION, capacity, head, count, resolution)
+                    os.pwrite(fd, header.ljust(HEADER_SIZE, b"\0"), 0)
+                    written += HEADER_SIZE
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                logger.error(f"Ошибка записи истории {symbol}: {e}")
+                failed.append(symbol)
+        for symbol in removed:
+            try:
+                os.remove(self.path(symbol))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Ошибка удаления истории {symbol}: {e}")
+                failed.append(symbol)
+        return written, failed
+
+    async def flush(self, store: HistoryStore) -> None:
+        """Записывает накопленные изменения, не блокируя цикл событий."""
+        async with self._lock:
+            batch, removed = self.collect(store)
+            if not batch and not removed:
+                return
+            try:
+                written, failed = await asyncio.to_thread(self.write, batch, removed)
+            except BaseException:
+                self.restore(store, list(batch) + removed)
+                raise
+            self.restore(store, failed)
+        self.flushes += 1
+        self.bytes_written += written
+        logger.debug(f"История цен записана: {len(batch)} символов, {written} байт")
+
+    async def run_flush_loop(self, store: HistoryStore, interval: float = HISTORY_FLUSH_INTERVAL) -> None:
+        """Периодически записывает историю на диск."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush(store)
+
+history_files = HistoryFiles()
@@ -4,6 +4,7 @@
 """
 from telegram import ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from config import BASE_COINS, QUOTE_COINS
+from models import UserPairs
 
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     """Возвращает главную клавиатуру."""
@@ -68,7 +69,7 @@ def get_pairs_list_keyboard(pairs) -> InlineKeyboardMarkup:
         
         keyboard.append([InlineKeyboardButton(
             pair_text, 
-            callback_data=f"pair_{i-1}"
+            callback_data=f"pair_{UserPairs.pair_id(pair)}"
         )])
     
     # Добавляем кнопку "Назад"
@@ -76,12 +77,12 @@ def get_pairs_list_keyboard(pairs) -> InlineKeyboardMarkup:
     
     return InlineKeyboardMarkup(keyboard)
 
-def get_pair_actions_keyboard(pair_index: int) -> InlineKeyboardMarkup:
-    """Возвращает inline клавиатуру с действиями для пары."""
+def get_pair_actions_keyboard(pair_id: str) -> InlineKeyboardMarkup:
+    """Возвращает inline клавиатуру с действиями для пары (pair_id - UserPairs.pair_id)."""
     keyboard = [
-        [InlineKeyboardButton("📊 Настроить диапазон", callback_data=f"set_range_{pair_index}")],
-        [InlineKeyboardButton("💰 Просмотреть курс", callback_data=f"view_price_{pair_index}")],
-        [InlineKeyboardButton("🗑️ Удалить пару", callback_data=f"delete_pair_{pair_index}")],
+        [InlineKeyboardButton("📊 Настроить диапазон", callback_data=f"set_range_{pair_id}")],
+        [InlineKeyboardButton("💰 Просмотреть курс", callback_data=f"view_price_{pair_id}")],
+        [InlineKeyboardButton("🗑️ Удалить пару", callback_data=f"delete_pair_{pair_id}")],
         [InlineKeyboardButton("🔙 Назад к парам", callback_data="back_to_pairs")]
     ]
     return InlineKeyboardMarkup(keyboard)
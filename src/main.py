@@ -6,22 +6,31 @@ import asyncio
 import signal
 import sys
 import os
+import time
 import logging
 
 # Добавляем путь к src в sys.path для корректных импортов
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from telegram import Update
-from telegram.ext import Application, MessageHandler, CallbackQueryHandler, filters, CallbackContext
+from telegram.ext import Application, MessageHandler, CallbackQueryHandler, TypeHandler, filters, CallbackContext
 from config import TELEGRAM_BOT_TOKEN
 from handlers import (
     cmd_start, cmd_help, cmd_add_pair, cmd_my_pairs, cmd_cached_price,
     handle_coin_selection, handle_range_setting,
-    handle_price_check, handle_callback_query
+    handle_callback_query
 )
 from keyboards import get_main_keyboard
+from router import UpdateRouter
 from models import user_settings, user_states
-from monitoring import start_price_monitoring
-from storage import load_user_data, save_user_data
+from monitoring import restore_subscriptions, set_message_dispatcher, warm_price_cache
+from dispatch import MessageDispatcher, PriorityTokenBucket, DispatchRateLimiter
+from config import TELEGRAM_GLOBAL_RATE, SUPERVISOR_REPORT_INTERVAL
+from supervisor import supervisor
+from storage import load_user_data, storage_saver
+from user_cache import user_cache
+from catalog import symbol_catalog
+from history import price_history
+from history_file import history_files
 
 # Настройка логирования с ротацией
 log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
@@ -76,79 +85,93 @@ def cleanup_old_logs():
     except Exception as e:
         logger.warning(f"Ошибка при очистке логов: {e}")
 
-# Событие для graceful shutdown (не используется в упрощенной версии)
+# Graceful shutdown по сигналам
+def install_signal_handlers(stop_event: asyncio.Event) -> None:
+    """
+    SIGINT/SIGTERM только будят run_bot: финальная запись данных выполняется
+    в его блоке finally и дожидается завершения до выхода из процесса.
+    """
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop_event.set)
+        except NotImplementedError:
+            # Windows: цикл событий не поддерживает add_signal_handler
+            signal.signal(signum, lambda *_: loop.call_soon_threadsafe(stop_event.set))
+
+def build_router() -> UpdateRouter:
+    """Таблица маршрутов: команды и кнопки меню, затем шаги диалога."""
+    router = UpdateRouter()
+    router.text(["/start"], cmd_start, "start")
+    router.text(["/help", "❓ Помощь"], cmd_help, "help")
+    router.text(["/addpair", "📊 Добавить пару", "📊 Установить пару криптовалют"], cmd_add_pair, "add_pair")
+    router.text(["/mypairs", "👁️ Мои пары"], cmd_my_pairs, "my_pairs")
+    router.text(["/price", "📈 Текущий курс"], cmd_cached_price, "price")
+    router.state(["selecting_base", "selecting_quote"], handle_coin_selection, "coin_selection")
+    router.state(["setting_range"], handle_range_setting, "range_setting")
+    # Текст вне диалога: handle_coin_selection отвечает подсказкой о неизвестной команде
+    router.default(handle_coin_selection, "unknown")
+    return router
 
-async def start_existing_pairs_monitoring(application: Application) -> None:
-    """Запускает мониторинг существующих пар при старте бота."""
+async def start_existing_pairs_monitoring(application: Application, load_time: float = 0.0) -> None:
+    """Восстанавливает мониторинг всех сохраненных пар одним проходом при старте бота."""
     logger.info('Запуск мониторинга существующих пар...')
     
     if not user_settings:
         logger.info('Нет сохраненных пар для мониторинга')
         return
     
-    for chat_id, pairs in user_settings.items():
-        if not pairs:
-            continue
-            
-        logger.info(f'Пользователь {chat_id}: {len(pairs)} пар')
-        for pair in pairs:
-            # Проверяем, не запущен ли уже мониторинг для этой пары
-            symbol = f"{pair.base}{pair.quote}".upper()
-            tracking_key = (chat_id, symbol)
-            
-            from models import websocket_connections
-            if tracking_key not in websocket_connections:
-                logger.info(f'Запуск мониторинга пары {pair.base}/{pair.quote} для чата {chat_id}')
-                await start_price_monitoring(chat_id, pair.base, pair.quote, application.bot)
-            else:
-                logger.info(f'Мониторинг пары {pair.base}/{pair.quote} для чата {chat_id} уже запущен')
+    stats = await restore_subscriptions(user_settings, application.bot)
+    logger.info(
+        f"⏱ Мониторинг восстановлен: {stats['pairs']} пар, {stats['symbols']} символов, "
+        f"получено цен: {stats['prices']}. Загрузка {load_time:.2f} с, "
+        f"индекс {stats['index_time']:.2f} с, предзагрузка цен {stats['prefetch_time']:.2f} с"
+    )
 
 async def run_bot() -> None:
     """Запускает бота."""
     logger.info('Инициализация бота...')
+    
+    stop_event = asyncio.Event()
+    install_signal_handlers(stop_event)
         
-    # Загружаем данные пользователей
-    load_user_data()
-    logger.info('Данные пользователей загружены')
+    # Загружаем данные пользователей (в режиме lazy - только пользователей с алертами)
+    load_started = time.perf_counter()
+    load_user_data(active_only=user_cache.lazy)
+    user_cache.mark_loaded(user_settings)
+    load_time = time.perf_counter() - load_started
+    logger.info(f'Данные пользователей загружены за {load_time:.2f} с '
+                f'({len(user_settings)} пользователей, загрузка по запросу: {user_cache.lazy})')
     
     # Создаем приложение
     logger.info(f"Используем токен: {TELEGRAM_BOT_TOKEN[:10]}...")
     logger.info(f"🔑 Используем токен: {TELEGRAM_BOT_TOKEN[:10]}...")
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    # Общее ведро токенов Telegram: алерты из очереди отправки и ответы бота
+    telegram_bucket = PriorityTokenBucket(TELEGRAM_GLOBAL_RATE)
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .rate_limiter(DispatchRateLimiter(telegram_bucket))
+        .build()
+    )
+    dispatcher = MessageDispatcher(application.bot, telegram_bucket, mark_dispatched=True)
+    set_message_dispatcher(dispatcher)
     
     logger.info(f"Бот инициализирован с токеном: {TELEGRAM_BOT_TOKEN[:10]}...")
     logger.info(f"✅ Бот инициализирован с токеном: {TELEGRAM_BOT_TOKEN[:10]}...")
 
-    # Простой обработчик для всех сообщений
-    async def simple_handler(update: Update, context: CallbackContext) -> None:
-        """Простой обработчик для всех сообщений."""
-        if update.message:
-            text = update.message.text
-            chat_id = update.effective_chat.id
-            
-            logger.debug(f"Получено: '{text}' от {chat_id}")
-            logger.info(f"📨 Получено: '{text}' от {chat_id}")
-            
-            if text == "/start":
-                await cmd_start(update, context)
-            elif text == "/help":
-                await cmd_help(update, context)
-            elif text == "/addpair":
-                await cmd_add_pair(update, context)
-            elif text == "/mypairs":
-                await cmd_my_pairs(update, context)
-            elif text == "/price":
-                await cmd_cached_price(update, context)
-            elif text in ["📊 Добавить пару", "📊 Установить пару криптовалют", "📈 Текущий курс", "👁️ Мои пары", "❓ Помощь"]:
-                await handle_price_check(update, context)
-            elif text.replace(".", "").replace("-", "").isdigit() or text == "-" or text == "Отмена":
-                await handle_range_setting(update, context)
-            else:
-                await handle_coin_selection(update, context)
+    # Маршруты текстовых сообщений
+    router = build_router()
+    
+    async def ensure_user_loaded(update: Update, context: CallbackContext) -> None:
+        """Загружает пары пользователя до обработки его обновления (группа -1 выполняется первой)."""
+        if update.effective_chat:
+            await user_cache.ensure_loaded(update.effective_chat.id, context.bot)
     
     # Регистрируем обработчики
-    application.add_handler(MessageHandler(filters.ALL, simple_handler))
+    application.add_handler(TypeHandler(Update, ensure_user_loaded), group=-1)
+    application.add_handler(MessageHandler(filters.TEXT, router.dispatch))
     application.add_handler(CallbackQueryHandler(handle_callback_query))
 
     logger.info('Запуск бота...')
@@ -158,8 +181,41 @@ async def run_bot() -> None:
     await application.initialize()
     await application.start()
     
+    # Запускаем очередь отправки сообщений
+    dispatcher.start()
+    
+    # Загружаем каталог символов биржи до первых запросов цен
+    await symbol_catalog.load()
+    supervisor.spawn("catalog", symbol_catalog.run_refresh_loop, restart=True)
+    
+    # История и последние цены с диска: отображаются в память, без разбора записей
+    history_started = time.perf_counter()
+    last_points = history_files.load_into(price_history)
+    warm_price_cache(last_points)
+    logger.info(f"⏱ История цен загружена: {len(last_points)} символов за "
+                f"{(time.perf_counter() - history_started) * 1000:.0f} мс")
+    supervisor.spawn("history", lambda: history_files.run_flush_loop(price_history), restart=True)
+    
+    # Фоновый писатель пар пользователей (объединяет пачки изменений в одну запись)
+    supervisor.spawn("storage", storage_saver.run, restart=True)
+    if user_cache.lazy:
+        supervisor.spawn("users", user_cache.run_eviction_loop, restart=True)
+    
+    # Периодический отчет о фоновых задачах и очереди отправки
+    from monitoring import price_wheel, refresh_stats
+    from governor import governor
+    from providers import price_providers
+    supervisor.spawn("reporter", lambda: supervisor.run_reporter(
+        SUPERVISOR_REPORT_INTERVAL,
+        extra=lambda: {"wheel": price_wheel.load_summary(), "refresh": refresh_stats(),
+                       "binance": governor.stats(), "providers": price_providers.stats(),
+                       "history": price_history.stats(), "storage": storage_saver.stats(),
+                       "users": user_cache.stats(), "routes": router.stats(),
+                       "dispatch": dispatcher.stats()}
+    ))
+    
     # Запускаем мониторинг существующих пар
-    await start_existing_pairs_monitoring(application)
+    await start_existing_pairs_monitoring(application, load_time)
     
     logger.info('Бот работает...')
     logger.info("Запускаем polling для получения обновлений...")
@@ -180,29 +236,28 @@ async def run_bot() -> None:
             connect_timeout=10
         )
         
-        # Ждем бесконечно
-        await asyncio.Event().wait()
+        # Ждем сигнала завершения
+        await stop_event.wait()
+        logger.info('Получен сигнал завершения, сохраняем данные...')
         
     except Exception as e:
         logger.error(f"Ошибка polling: {e}")
         logger.error(f"❌ Ошибка polling: {e}")
         raise
     finally:
-        await application.stop()
+        # Сначала перестаем принимать обновления и дожидаемся обработчиков: после этого
+        # пары больше не меняются, и финальная запись ниже сохраняет все изменения
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        await dispatcher.stop()
+        await supervisor.shutdown()
+        await history_files.flush(price_history)
+        await storage_saver.close()
+        # Бот (HTTP-клиент) закрывается последним: очередь отправки использует его до конца
         await application.shutdown()
 
-# Обработчик сигналов завершения
-def signal_handler(signum, frame):
-    """Обработчик сигналов для graceful shutdown."""
-    logger.info('Получен сигнал завершения, сохраняем данные...')
-    save_user_data()
-    logger.info('Данные сохранены, завершаем работу.')
-    sys.exit(0)
-
-# Регистрируем обработчики сигналов
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGTERM, signal_handler)
-
 def main() -> None:
     """Основная функция бота."""
     logger.info('Запуск программы...')
@@ -228,6 +283,12 @@ def main() -> None:
             loop.run_until_complete(close_http_session())
         except Exception as e:
             logger.error(f"Ошибка при закрытии HTTP сессии: {e}")
+        # Закрываем соединения потокового режима
+        try:
+            from monitoring import stop_streaming
+            loop.run_until_complete(stop_streaming())
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии потоков: {e}")
         loop.close()
 
 if __name__ == "__main__":
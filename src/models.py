@@ -3,11 +3,13 @@
 Модели данных для бота.
 """
 import asyncio
-from typing import Dict, List, Optional, Tuple, Set
+import hashlib
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 
-@dataclass
+@dataclass(slots=True)
 class CryptoPair:
     """Модель пары криптовалют."""
     base: str
@@ -15,13 +17,80 @@ class CryptoPair:
     min_price: Optional[float] = None
     max_price: Optional[float] = None
     created_at: datetime = None
+    move_pct: Optional[float] = None     # алерт движения: порог изменения цены, %
+    move_window: Optional[int] = None    # окно алерта движения, минут
     
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now()
     
+    @property
+    def has_alerts(self) -> bool:
+        """Задан ли для пары хотя бы один алерт (диапазон или движение цены)."""
+        return self.min_price is not None or self.max_price is not None or self.move_pct is not None
+    
+
+class UserPairs:
+    """
+    Пары пользователя в порядке добавления с поиском по (base, quote) за O(1).
+    Идентификатор пары (pair_id) - короткий хеш от 'BASE/QUOTE': он не зависит от позиции
+    пары в списке, поэтому кнопки старых сообщений не указывают на другую пару после
+    удаления или добавления пар и после перезапуска бота. Длина хеша постоянна, так что
+    callback_data укладывается в 64 байта Telegram при любом названии монеты.
+    """
+    __slots__ = ("_pairs", "_ids")
+    
+    def __init__(self, pairs: Iterable[CryptoPair] = ()):
+        self._pairs: Dict[Tuple[str, str], CryptoPair] = {}
+        self._ids: Dict[str, Tuple[str, str]] = {}  # pair_id -> (base, quote)
+        for pair in pairs:
+            self.add(pair)
+    
+    def __iter__(self) -> Iterator[CryptoPair]:
+        return iter(self._pairs.values())
+    
+    def __len__(self) -> int:
+        return len(self._pairs)
+    
+    def get(self, base: str, quote: str) -> Optional[CryptoPair]:
+        return self._pairs.get((base, quote))
+    
+    def add(self, pair: CryptoPair) -> bool:
+        """Добавляет пару в конец. False, если такая пара уже есть."""
+        key = (pair.base, pair.quote)
+        if key in self._pairs:
+            return False
+        self._pairs[key] = pair
+        self._ids.setdefault(self.pair_id(pair), key)
+        return True
+    
+    def remove(self, base: str, quote: str) -> Optional[CryptoPair]:
+        pair = self._pairs.pop((base, quote), None)
+        if pair is not None and self._ids.get(self.pair_id(pair)) == (base, quote):
+            del self._ids[self.pair_id(pair)]
+        return pair
+    
+    @staticmethod
+    def pair_id(pair: CryptoPair) -> str:
+        return hashlib.blake2s(f"{pair.base}/{pair.quote}".encode(), digest_size=6).hexdigest()
+    
+    def by_id(self, pair_id: str) -> Optional[CryptoPair]:
+        key = self._ids.get(pair_id)
+        return self._pairs.get(key) if key is not None else None
 
 @dataclass
+class PriceEntry:
+    """Последняя известная цена символа."""
+    price: float
+    fetched_at: float  # time.time() получения
+    source: str  # 'rest', 'stream', 'disk'
+    
+    @property
+    def age(self) -> float:
+        """Возраст цены в секундах."""
+        return time.time() - self.fetched_at
+
+@dataclass(slots=True)
 class UserState:
     """Состояние пользователя в боте."""
     current_action: Optional[str] = None
@@ -29,14 +98,17 @@ class UserState:
     selected_quote: Optional[str] = None
     range_min: Optional[float] = None
     range_max: Optional[float] = None
+    range_step: Optional[str] = None  # шаг ввода диапазона: 'max', 'move_pct', 'move_window'
+    move_pct: Optional[float] = None
     is_loading: bool = False
 
 # Глобальные хранилища данных
-user_settings: Dict[int, List[CryptoPair]] = {}  # chat_id -> список пар
+user_settings: Dict[int, UserPairs] = {}  # chat_id -> пары пользователя
 user_states: Dict[int, UserState] = {}           # chat_id -> состояние пользователя
 
-# Архитектура мониторинга
-websocket_connections: Dict[Tuple[int, str], any] = {}  # (chat_id, symbol) -> task
-alert_tracking: Dict[Tuple[int, str], Dict[str, bool]] = {}  # (chat_id, symbol) -> {"min_alerted": bool, "max_alerted": bool}
-last_check_time: Dict[Tuple[int, str], float] = {}  # (chat_id, symbol) -> timestamp
-last_prices: Dict[Tuple[int, str], float] = {}  # (chat_id, symbol) -> последняя цена
\ No newline at end of file
+# Архитектура мониторинга (подписки чатов на символы - в subscriptions.subscriptions)
+price_cache: Dict[str, PriceEntry] = {}  # symbol -> последняя цена, общая для всех подписчиков
+
+# Индексы алертов по символам: стоимость проверки цены зависит от числа сработавших алертов
+alert_indexes: Dict[str, "AlertIndex"] = {}  # symbol -> отсортированные пороги алертов подписчиков
+move_indexes: Dict[str, "MoveAlertIndex"] = {}  # symbol -> алерты движения цены подписчиков
\ No newline at end of file
@@ -3,222 +3,610 @@
 Модуль для мониторинга цен криптовалют.
 """
 import asyncio
+import math
 import time
 import logging
-from typing import Dict, Optional, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from telegram import Bot
-from models import user_settings, websocket_connections, alert_tracking, last_check_time, last_prices
-from config import API_TIMEOUT, UPDATE_INTERVAL
-from utils import get_crypto_price
+from models import CryptoPair, PriceEntry, user_settings, price_cache, alert_indexes, move_indexes
+from config import (
+    API_TIMEOUT, UPDATE_INTERVAL, PRICE_SOURCE, STREAM_MIN_INTERVAL,
+    PRICE_RESULT_TTL, PRICE_MAX_AGE, PRICE_EVICT_AFTER, SCHEDULER_SLOTS,
+    REFRESH_MIN_INTERVAL, REFRESH_MAX_INTERVAL, REFRESH_IDLE_INTERVAL, REFRESH_SIGMAS
+)
+from utils import get_crypto_price_batched
+from streaming import BinanceStreamClient
+from alerts import AlertIndex, MoveAlertIndex, ALERT_MIN, ALERT_RISE, ALERT_FALL
+from dispatch import MessageDispatcher, PRIORITY_ALERT
+from supervisor import supervisor
+from scheduler import TimingWheel
+from history import price_history
+from subscriptions import subscriptions
+from cross_rates import cross_rates
 
-# Группировка запросов для оптимизации
+# Группировка запросов для оптимизации: symbol -> future выполняющегося запроса
 _pending_requests: Dict[str, asyncio.Future] = {}
-_request_lock = asyncio.Lock()
+# Время последней очистки кэша цен
+_last_eviction = 0.0
 
 logger = logging.getLogger(__name__)
 
 # Настройки мониторинга
 MIN_CHECK_INTERVAL = UPDATE_INTERVAL  # Интервал между проверками (секунды)
 
+# Колесо таймеров проверок: каждый символ проверяется раз в MIN_CHECK_INTERVAL
+# в своей фазе, поэтому проверки распределены по интервалу, а не идут залпом
+price_wheel = TimingWheel(MIN_CHECK_INTERVAL, SCHEDULER_SLOTS)
+_wheel_task: Optional[asyncio.Task] = None
+_wheel_bot: Optional[Bot] = None
+
+# Адаптивные интервалы проверки
+VOLATILITY_ALPHA = 0.2  # вес нового наблюдения в скользящей оценке волатильности
+_volatility: Dict[str, float] = {}  # symbol -> дисперсия лог-доходности в секунду (EWMA)
+refresh_intervals: Dict[str, float] = {}  # symbol -> текущий интервал проверки
+# Выполняющиеся проверки: не больше одной на символ, иначе при медленной бирже
+# каждый тик колеса добавлял бы новые задачи поверх незавершенных
+_refresh_tasks: Dict[str, asyncio.Task] = {}
+_refresh_skipped = 0  # тиков, пропущенных из-за незавершенной проверки символа
+
+# Потоковый режим (PRICE_SOURCE=stream): цены приходят из Binance combined streams,
+# REST опрос остается запасным путем для символов без свежих данных из потока
+_stream_client: Optional[BinanceStreamClient] = None
+_stream_bot: Optional[Bot] = None
+_stream_published: Dict[str, float] = {}  # symbol -> время последней публикации из потока
+
+# Очередь отправки алертов с учетом лимитов Telegram
+_dispatcher: Optional[MessageDispatcher] = None
+
+def set_message_dispatcher(dispatcher: MessageDispatcher) -> None:
+    """Назначает очередь отправки, через которую уходят алерты."""
+    global _dispatcher
+    _dispatcher = dispatcher
+
+def _get_dispatcher(bot: Bot) -> MessageDispatcher:
+    """Возвращает очередь отправки, создавая ее при первом алерте, если она не назначена."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = MessageDispatcher(bot)
+    _dispatcher.start()
+    return _dispatcher
+
+def _on_stream_price(symbol: str, price: float) -> None:
+    """Передает цену из потока в общий путь алертов не чаще STREAM_MIN_INTERVAL."""
+    now = time.time()
+    if now - _stream_published.get(symbol, 0) < STREAM_MIN_INTERVAL:
+        return
+    _stream_published[symbol] = now
+    update_price_cache(symbol, price, "stream")
+    publish_price(symbol, price, _stream_bot)
+
+def _get_stream_client(bot: Bot) -> Optional[BinanceStreamClient]:
+    """Возвращает клиент потоков, создавая его при первом обращении в потоковом режиме."""
+    global _stream_client, _stream_bot
+    if PRICE_SOURCE != "stream":
+        return None
+    _stream_bot = bot
+    if _stream_client is None:
+        _stream_client = BinanceStreamClient(_on_stream_price)
+        logger.info("Потоковый режим цен включен")
+    return _stream_client
+
+def _stream_symbol(base: str, quote: str) -> Optional[str]:
+    """
+    Символ потока для пары: поток есть только у пар, которые торгуются напрямую.
+    Обратные и синтетические пары получают цену через REST (пакеты и кросс-курсы).
+    """
+    from catalog import symbol_catalog, ROUTE_DIRECT
+    route, symbol = symbol_catalog.route(base, quote)
+    return symbol if route == ROUTE_DIRECT else None
+
+async def stop_streaming() -> None:
+    """Закрывает соединения потокового режима."""
+    global _stream_client
+    if _stream_client is not None:
+        await _stream_client.close()
+        _stream_client = None
+
 async def get_crypto_price_optimized(base: str, quote: str) -> Optional[float]:
     """
     Оптимизированное получение цены с группировкой запросов.
-    Если уже есть запрос для этой пары, ждем его результат.
+    Если уже есть запрос для этой пары, ждем его результат. Блокировки на время
+    сетевого запроса не держатся, поэтому запросы разных символов идут параллельно.
     """
     symbol = f"{base}{quote}".upper()
     
-    async with _request_lock:
-        # Если уже есть запрос для этой пары, ждем его результат
-        if symbol in _pending_requests:
-            logger.debug(f"Ожидаем результат для {symbol} (группировка запросов)")
-            return await _pending_requests[symbol]
-        
-        # Создаем новый запрос
-        future = asyncio.Future()
-        _pending_requests[symbol] = future
-        
-        try:
-            # Выполняем запрос
-            price = await get_crypto_price(base, quote)
-            future.set_result(price)
-            return price
-        except Exception as e:
-            future.set_exception(e)
-            raise
-        finally:
-            # Удаляем из pending запросов
-            _pending_requests.pop(symbol, None)
+    # Свежий результат из общего кэша цен
+    if PRICE_RESULT_TTL > 0:
+        cached = get_cached_price(symbol, PRICE_RESULT_TTL)
+        if cached is not None:
+            return cached.price
+    
+    # Если уже есть запрос для этой пары, ждем его результат
+    future = _pending_requests.get(symbol)
+    if future is not None:
+        logger.debug(f"Ожидаем результат для {symbol} (группировка запросов)")
+        return await asyncio.shield(future)
+    
+    # Создаем новый запрос
+    future = asyncio.get_running_loop().create_future()
+    _pending_requests[symbol] = future
+    
+    try:
+        # Выполняем запрос через общий пакет
+        price = await get_crypto_price_batched(base, quote)
+        if price is not None:
+            update_price_cache(symbol, price, "rest")
+        future.set_result(price)
+        return price
+    except asyncio.CancelledError:
+        # Отмена инициатора не должна отменять ожидающих - они получат None
+        future.set_result(None)
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # помечаем исключение как полученное, если ожидающих нет
+        raise
+    finally:
+        # Удаляем из pending запросов
+        _pending_requests.pop(symbol, None)
+
+def update_price_cache(symbol: str, price: float, source: str) -> None:
+    """Сохраняет цену символа в общий кэш и периодически удаляет цены символов без подписчиков."""
+    global _last_eviction
+    now = time.time()
+    _update_volatility(symbol, price_cache.get(symbol), price, now)
+    price_cache[symbol] = PriceEntry(price=price, fetched_at=now, source=source)
+    price_history.record(symbol, now, price)
+    
+    if now - _last_eviction > 60:
+        _last_eviction = now
+        evict_price_cache(now)
+
+def evict_price_cache(now: Optional[float] = None) -> int:
+    """
+    Удаляет цены и историю цен символов без подписчиков старше PRICE_EVICT_AFTER.
+    Возвращает число удаленных.
+    """
+    now = now or time.time()
+    expired = [
+        symbol for symbol, entry in price_cache.items()
+        if symbol not in subscriptions and now - entry.fetched_at > PRICE_EVICT_AFTER
+    ]
+    for symbol in expired:
+        del price_cache[symbol]
+        price_history.remove(symbol)
+    if expired:
+        logger.debug(f"Из кэша цен удалено {len(expired)} символов без подписчиков")
+    return len(expired)
+
+def warm_price_cache(last_points: Dict[str, Tuple[int, float]]) -> None:
+    """Заполняет кэш цен последними ценами из сохраненной истории (source='disk')."""
+    for symbol, (timestamp, price) in last_points.items():
+        if symbol not in price_cache:
+            price_cache[symbol] = PriceEntry(price=price, fetched_at=float(timestamp), source="disk")
+
+def get_cached_price(symbol: str, max_age: float = PRICE_MAX_AGE) -> Optional[PriceEntry]:
+    """Возвращает цену символа из общего кэша, если она не старше max_age секунд."""
+    entry = price_cache.get(symbol)
+    if entry is None or entry.age > max_age:
+        return None
+    return entry
 
 async def start_price_monitoring(chat_id: int, base: str, quote: str, bot: Bot) -> None:
     """
-    Запускает мониторинг цены для пары криптовалют.
+    Подписывает пользователя на обновления цены пары криптовалют.
+    Символ проверяется по колесу таймеров один раз за интервал, независимо от числа подписчиков.
+    Новый символ проверяется сразу, не дожидаясь своего слота.
     """
     symbol = f"{base}{quote}".upper()
-    tracking_key = (chat_id, symbol)
     
     # Проверяем, не запущен ли уже мониторинг для этого пользователя и символа
-    if tracking_key in websocket_connections:
+    if subscriptions.get(chat_id, symbol) is not None:
         logger.info(f"Мониторинг {symbol} для пользователя {chat_id} уже запущен")
         return
     
     logger.info(f"Запуск мониторинга {symbol} для пользователя {chat_id}")
     
-    # Инициализируем отслеживание алертов
-    if tracking_key not in alert_tracking:
-        alert_tracking[tracking_key] = {
-            "alerted": False,  # Общий флаг - был ли отправлен алерт для этой пары
-            "last_price": None
-        }
+    # Добавляем пользователя в подписчики символа
+    _, new_symbol = subscriptions.add(chat_id, base, quote)
+    if new_symbol:
+        cross_rates.retain(base, quote)
     
-    # Инициализируем время последней проверки
-    last_check_time[tracking_key] = 0
+    # Добавляем диапазон пары в индекс алертов символа
+    pairs = user_settings.get(chat_id)
+    pair = pairs.get(base, quote) if pairs is not None else None
+    if pair is not None:
+        _index_range(chat_id, symbol, pair.min_price, pair.max_price)
+        _index_move(chat_id, symbol, pair.move_pct, pair.move_window)
     
-    # Запускаем задачу мониторинга
-    task = asyncio.create_task(monitor_price(chat_id, base, quote, bot))
-    websocket_connections[tracking_key] = task
+    # Планируем проверки символа, если это первый подписчик
+    _ensure_scheduler(bot)
+    if symbol not in price_wheel:
+        price_wheel.add(symbol)
+        logger.info(f"Проверки {symbol} запланированы (слот {price_wheel.phase_slot(symbol)}/{price_wheel.slots_count})")
+        _spawn_refresh(symbol, bot)
+        
+        stream_client = _get_stream_client(bot)
+        stream_symbol = _stream_symbol(base, quote)
+        if stream_client is not None and stream_symbol is not None:
+            stream_client.subscribe(stream_symbol)
     
-    logger.info(f"Мониторинг {symbol} запущен для пользователя {chat_id}")
+    logger.info(f"Мониторинг {symbol} запущен для пользователя {chat_id} (подписчиков: {len(subscriptions.subscribers(symbol))})")
 
-async def monitor_price(chat_id: int, base: str, quote: str, bot: Bot) -> None:
+async def restore_subscriptions(settings: Dict[int, Iterable[CryptoPair]], bot: Bot) -> Dict[str, float]:
     """
-    Мониторит цену пары криптовалют и отправляет уведомления.
+    Восстанавливает все сохраненные подписки за один проход при старте бота:
+    регистрирует подписчиков и пороги алертов, ставит символы на колесо проверок,
+    затем один раз получает цены всех символов (запросы объединяются в пакеты)
+    и проверяет по ним алерты. Возвращает статистику и время этапов.
     """
-    symbol = f"{base}{quote}".upper()
-    tracking_key = (chat_id, symbol)
-    
-    logger.info(f"Начинаем мониторинг {symbol} для пользователя {chat_id}")
+    started = time.perf_counter()
+    _ensure_scheduler(bot)
+    stream_client = _get_stream_client(bot)
+    new_symbols: List[str] = []
+    pairs_count = 0
     
-    while True:
-        try:
-            current_time = time.time()
-            time_since_last_check = current_time - last_check_time[tracking_key]
-            
-            # Проверяем, прошла ли минута с последней проверки
-            if time_since_last_check < MIN_CHECK_INTERVAL:
-                sleep_time = MIN_CHECK_INTERVAL - time_since_last_check
-                await asyncio.sleep(sleep_time)
+    for chat_id, pairs in settings.items():
+        for pair in pairs:
+            symbol = f"{pair.base}{pair.quote}".upper()
+            if subscriptions.get(chat_id, symbol) is not None:
                 continue
+            pairs_count += 1
             
-            # Обновляем время последней проверки
-            last_check_time[tracking_key] = current_time
-            
-            # Получаем текущую цену асинхронно с оптимизацией
-            current_price = await get_crypto_price_optimized(base, quote)
-            
-            if current_price is None:
-                logger.warning(f"Не удалось получить цену для {symbol}")
-                await asyncio.sleep(MIN_CHECK_INTERVAL)
-                continue
-            
-            # Сохраняем последнюю цену
-            last_prices[tracking_key] = current_price
-            
-            # Находим пару пользователя
-            user_pair = None
-            for pair in user_settings.get(chat_id, []):
-                if pair.base == base and pair.quote == quote:
-                    user_pair = pair
-                    break
-            
-            if not user_pair:
-                logger.error(f"Пара {symbol} не найдена для пользователя {chat_id}")
-                break
-            
-            # Проверяем алерты только если есть установленные диапазоны
-            if user_pair.min_price is not None or user_pair.max_price is not None:
-                # Создаем задачу для проверки алертов, чтобы не блокировать основной цикл
-                asyncio.create_task(check_price_alerts(chat_id, symbol, current_price, user_pair, bot))
-            
-        except asyncio.CancelledError:
-            logger.info(f"Мониторинг {symbol} для пользователя {chat_id} остановлен")
-            break
-        except Exception as e:
-            logger.error(f"Ошибка в мониторинге {symbol} для пользователя {chat_id}: {e}")
-            await asyncio.sleep(MIN_CHECK_INTERVAL)
-
-async def check_price_alerts(chat_id: int, symbol: str, current_price: float, pair, bot: Bot) -> None:
-    """
-    Проверяет условия алертов и отправляет уведомления только при изменении цены.
-    """
-    tracking_key = (chat_id, symbol)
-    
-    # Инициализируем отслеживание предыдущей цены
-    if "last_price" not in alert_tracking[tracking_key] or alert_tracking[tracking_key]["last_price"] is None:
-        alert_tracking[tracking_key]["last_price"] = current_price
-        return  # Первый запуск - не отправляем алерт
+            _, new_symbol = subscriptions.add(chat_id, pair.base, pair.quote)
+            if new_symbol:
+                new_symbols.append(symbol)
+                cross_rates.retain(pair.base, pair.quote)
+            _index_range(chat_id, symbol, pair.min_price, pair.max_price)
+            _index_move(chat_id, symbol, pair.move_pct, pair.move_window)
     
-    last_price = alert_tracking[tracking_key]["last_price"]
+    # Следующие проверки идут в фазах символов, распределенных по интервалу
+    for symbol in new_symbols:
+        price_wheel.add(symbol)
+        if stream_client is not None:
+            entry = subscriptions.entry(symbol)
+            stream_symbol = _stream_symbol(entry.base, entry.quote)
+            if stream_symbol is not None:
+                stream_client.subscribe(stream_symbol)
+    indexed = time.perf_counter()
     
-    # Проверяем, изменилась ли цена значительно (больше чем на 0.01%)
-    price_change_threshold = 0.0001  # 0.01%
-    price_changed = abs(current_price - last_price) / last_price > price_change_threshold
+    # Первые цены всех символов одним проходом
+    entries = [subscriptions.entry(symbol) for symbol in new_symbols]
+    prices = await asyncio.gather(
+        *(get_crypto_price_optimized(entry.base, entry.quote) for entry in entries),
+        return_exceptions=True
+    )
+    fetched = 0
+    for entry, price in zip(entries, prices):
+        if isinstance(price, float) and entry.symbol in subscriptions:
+            fetched += 1
+            entry.last_check = time.time()
+            publish_price(entry.symbol, price, bot)
+    prefetched = time.perf_counter()
     
-    if not price_changed:
-        return  # Цена не изменилась значительно - не проверяем алерты
+    return {
+        "pairs": pairs_count,
+        "symbols": len(new_symbols),
+        "prices": fetched,
+        "index_time": indexed - started,
+        "prefetch_time": prefetched - indexed,
+    }
+
+def _ensure_scheduler(bot: Bot) -> asyncio.Task:
+    """Запускает драйвер колеса проверок, если он еще не работает."""
+    global _wheel_task, _wheel_bot
+    _wheel_bot = bot
+    if _wheel_task is None or _wheel_task.done():
+        _wheel_task = supervisor.spawn("scheduler", lambda: price_wheel.run(_on_due), name="scheduler", restart=True)
+        logger.info(f"Запущено колесо проверок: {price_wheel.slots_count} слотов по {price_wheel.tick:.2f} с")
+    return _wheel_task
+
+async def _on_due(due: List[str]) -> None:
+    """
+    Сразу планирует следующую проверку сработавших символов с текущим интервалом
+    (после получения цены интервал пересчитывается) и запускает проверки отдельными задачами,
+    чтобы не задерживать драйвер колеса. Запросы цен объединяются в общий пакет.
+    """
+    for symbol in due:
+        price_wheel.schedule(symbol, refresh_intervals.get(symbol, MIN_CHECK_INTERVAL))
+        _spawn_refresh(symbol, _wheel_bot)
+
+def _spawn_refresh(symbol: str, bot: Bot) -> None:
+    """Запускает проверку символа, если предыдущая проверка этого символа уже закончилась."""
+    global _refresh_skipped
+    if symbol in _refresh_tasks:
+        _refresh_skipped += 1
+        logger.debug(f"Проверка {symbol} еще идет, тик пропущен")
+        return
+    task = supervisor.spawn("refresh", lambda: check_symbol(symbol, bot), name=f"refresh:{symbol}")
+    _refresh_tasks[symbol] = task
+
+    def forget(done: asyncio.Task) -> None:
+        if _refresh_tasks.get(symbol) is done:
+            del _refresh_tasks[symbol]
+
+    task.add_done_callback(forget)
+
+def refresh_interval(symbol: str, price: float) -> float:
+    """
+    Интервал до следующей проверки символа.
+
+    Берется расстояние d от цены до ближайшего порога среди всех подписчиков (в долях цены)
+    и волатильность sigma (в долях цены за sqrt(секунды)). За интервал t цена в среднем
+    сдвигается на sigma * sqrt(t), поэтому t = (d / (REFRESH_SIGMAS * sigma))^2,
+    ограниченный REFRESH_MIN_INTERVAL..REFRESH_MAX_INTERVAL.
+    Символы без порогов проверяются раз в REFRESH_IDLE_INTERVAL, а с алертами движения -
+    не реже раза в REFRESH_MAX_INTERVAL.
+    """
+    ceiling = REFRESH_MAX_INTERVAL if move_indexes.get(symbol) else REFRESH_IDLE_INTERVAL
+    index = alert_indexes.get(symbol)
+    if not index or price <= 0:
+        return ceiling
+    nearest_min, nearest_max = index.nearest(price)
+    distances = [abs(price - threshold) / price for threshold in (nearest_min, nearest_max) if threshold is not None]
+    if not distances:
+        return ceiling
+    variance = _volatility.get(symbol)
+    if not variance:
+        # Волатильность еще не оценена - обычный интервал
+        return min(max(MIN_CHECK_INTERVAL, REFRESH_MIN_INTERVAL), REFRESH_MAX_INTERVAL)
+    interval = (min(distances) / REFRESH_SIGMAS) ** 2 / variance
+    return min(max(interval, REFRESH_MIN_INTERVAL), REFRESH_MAX_INTERVAL)
+
+def _update_volatility(symbol: str, previous: Optional[PriceEntry], price: float, now: float) -> None:
+    """Обновляет скользящую оценку дисперсии лог-доходности символа в секунду."""
+    if previous is None or previous.price <= 0 or price <= 0:
+        return
+    elapsed = now - previous.fetched_at
+    if elapsed <= 0:
+        return
+    sample = math.log(price / previous.price) ** 2 / elapsed
+    variance = _volatility.get(symbol)
+    _volatility[symbol] = sample if variance is None else variance + VOLATILITY_ALPHA * (sample - variance)
+
+def reschedule_symbol(symbol: str, price: Optional[float] = None, elapsed: float = 0.0) -> None:
+    """Пересчитывает интервал символа и переносит его следующую проверку на колесе."""
+    if symbol not in price_wheel:
+        return
+    if price is None:
+        cached = price_cache.get(symbol)
+        price = cached.price if cached is not None else 0.0
+    interval = refresh_interval(symbol, price) if price else REFRESH_MIN_INTERVAL
+    refresh_intervals[symbol] = interval
+    price_wheel.schedule(symbol, interval - elapsed)
+
+def refresh_stats() -> Dict[str, float]:
+    """Разброс интервалов проверки, ожидаемое число проверок в минуту и незавершенные проверки."""
+    intervals = list(refresh_intervals.values())
+    if not intervals:
+        return {}
+    return {
+        "min_interval": round(min(intervals), 1),
+        "max_interval": round(max(intervals), 1),
+        "checks_per_min": round(sum(60 / interval for interval in intervals), 1),
+        "in_flight": len(_refresh_tasks),
+        "skipped": _refresh_skipped,
+    }
+
+async def check_symbol(symbol: str, bot: Bot) -> None:
+    """
+    Получает цену символа и раздает ее всем подписчикам.
+    """
+    entry = subscriptions.entry(symbol)
+    if entry is None:
+        return
+    base, quote = entry.base, entry.quote
     
-    # Обновляем последнюю цену
-    alert_tracking[tracking_key]["last_price"] = current_price
+    try:
+        # Обновляем время последней проверки
+        started = time.time()
+        entry.last_check = started
+        
+        # В потоковом режиме опрашиваем REST только если поток молчит
+        if _stream_client is not None and _stream_client.is_fresh(symbol, MIN_CHECK_INTERVAL):
+            return
+        
+        # Получаем текущую цену асинхронно с оптимизацией
+        current_price = await get_crypto_price_optimized(base, quote)
+        
+        if current_price is None:
+            logger.warning(f"Не удалось получить цену для {symbol}")
+            return
+        
+        publish_price(symbol, current_price, bot)
+        reschedule_symbol(symbol, current_price, time.time() - started)
+        
+    except Exception as e:
+        logger.error(f"Ошибка в мониторинге {symbol}: {e}")
+
+def publish_price(symbol: str, current_price: float, bot: Bot) -> None:
+    """
+    Передает новую цену символа в индексы алертов и отправляет сработавшие алерты.
+    Стоимость зависит от числа сработавших алертов, а не от числа подписчиков.
+    """
+    index = alert_indexes.get(symbol)
+    if index:
+        for chat_id, kind in index.triggered(current_price):
+            min_price, max_price = index.remove(chat_id)
+            subscription = subscriptions.get(chat_id, symbol)
+            if subscription is not None:
+                subscription.alerted = True
+            send_price_alert(chat_id, symbol, current_price, kind, min_price, max_price, bot)
     
-    # Проверяем, вышла ли цена за диапазон
-    logger.debug(f"Проверка алертов для {symbol}: цена={current_price:.8f}, мин={pair.min_price}, макс={pair.max_price}")
-    logger.debug(f"Флаг алерта: alerted={alert_tracking[tracking_key]['alerted']}")
+    if move_indexes.get(symbol):
+        check_move_alerts(symbol, current_price, bot)
+
+def check_move_alerts(symbol: str, current_price: float, bot: Bot) -> None:
+    """
+    Проверяет алерты движения цены символа по истории цен.
+    Движение считается один раз на каждое окно (рост от минимума окна или падение
+    от максимума, что больше) и сравнивается сразу со всеми порогами этого окна.
+    """
+    index = move_indexes.get(symbol)
+    history = price_history.get(symbol)
+    if not index or history is None:
+        return
     
-    # Проверяем, вышла ли цена за диапазон (минимум или максимум)
-    price_out_of_range = False
-    alert_message = ""
+    now = time.time()
+    for window in index.windows():
+        stats = history.stats(window, now)
+        if stats is None or stats.count < 2:
+            continue
+        rise = (stats.last - stats.min) / stats.min * 100 if stats.min > 0 else 0.0
+        fall = (stats.max - stats.last) / stats.max * 100 if stats.max > 0 else 0.0
+        if rise >= fall:
+            kind, move, reference = ALERT_RISE, rise, stats.min
+        else:
+            kind, move, reference = ALERT_FALL, fall, stats.max
+        for chat_id, pct in index.triggered(window, move, now):
+            send_move_alert(chat_id, symbol, current_price, kind, move, reference, pct, window, bot)
+
+def _index_move(chat_id: int, symbol: str, move_pct: Optional[float], move_window: Optional[int]) -> None:
+    """Записывает правило алерта движения подписки (move_window в минутах) в индекс символа."""
+    index = move_indexes.get(symbol)
+    if index is None:
+        if move_pct is None or not move_window:
+            return
+        index = move_indexes[symbol] = MoveAlertIndex()
+    index.set(chat_id, move_pct, move_window * 60 if move_window else None)
+    if not index:
+        del move_indexes[symbol]
+
+def update_move_alert(chat_id: int, base: str, quote: str,
+                      move_pct: Optional[float], move_window: Optional[int]) -> None:
+    """Заменяет правило алерта движения подписки после изменения пользователем."""
+    symbol = f"{base}{quote}".upper()
+    if subscriptions.get(chat_id, symbol) is None:
+        return
+    _index_move(chat_id, symbol, move_pct, move_window)
+    reschedule_symbol(symbol)
+
+def _index_range(chat_id: int, symbol: str, min_price: Optional[float], max_price: Optional[float]) -> None:
+    """Записывает диапазон подписки в индекс алертов символа."""
+    index = alert_indexes.get(symbol)
+    if index is None:
+        if min_price is None and max_price is None:
+            return
+        index = alert_indexes[symbol] = AlertIndex()
+    index.set(chat_id, min_price, max_price)
+
+def update_alert_range(chat_id: int, base: str, quote: str,
+                       min_price: Optional[float], max_price: Optional[float]) -> None:
+    """
+    Обновляет диапазон алерта подписки после изменения пользователем:
+    сбрасывает флаг алерта и заменяет пороги в индексе.
+    """
+    symbol = f"{base}{quote}".upper()
+    subscription = subscriptions.get(chat_id, symbol)
+    if subscription is None:
+        return
     
-    if pair.min_price is not None and current_price <= pair.min_price:
-        price_out_of_range = True
+    subscription.alerted = False
+    _index_range(chat_id, symbol, min_price, max_price)
+    # Новый порог может быть ближе к цене - пересчитываем интервал проверки
+    reschedule_symbol(symbol)
+    logger.info(f"Сброшен флаг алерта для {symbol} при изменении диапазона")
+
+def send_price_alert(chat_id: int, symbol: str, current_price: float, kind: str,
+                     min_price: Optional[float], max_price: Optional[float], bot: Bot) -> None:
+    """
+    Ставит уведомление о выходе цены за диапазон в очередь отправки.
+    Если отправить не удалось из-за временной ошибки, пороги возвращаются в индекс
+    и алерт повторится на следующей цене.
+    """
+    if kind == ALERT_MIN:
         alert_message = f"🔔 АЛЕРТ! {symbol}\n"
         alert_message += f"💰 Текущая цена: {current_price:.8f}\n"
-        alert_message += f"📉 Минимальная цена: {pair.min_price:.8f}\n"
+        alert_message += f"📉 Минимальная цена: {min_price:.8f}\n"
         alert_message += f"📊 Цена упала ниже установленного минимума!"
-        logger.info(f"🔔 ТРИГГЕР АЛЕРТА: {symbol} цена {current_price:.8f} <= минимума {pair.min_price:.8f}")
-        
-    elif pair.max_price is not None and current_price >= pair.max_price:
-        price_out_of_range = True
+        logger.info(f"🔔 ТРИГГЕР АЛЕРТА: {symbol} цена {current_price:.8f} <= минимума {min_price:.8f}")
+    else:
         alert_message = f"🔔 АЛЕРТ! {symbol}\n"
         alert_message += f"💰 Текущая цена: {current_price:.8f}\n"
-        alert_message += f"📈 Максимальная цена: {pair.max_price:.8f}\n"
+        alert_message += f"📈 Максимальная цена: {max_price:.8f}\n"
         alert_message += f"📊 Цена поднялась выше установленного максимума!"
-        logger.info(f"🔔 ТРИГГЕР АЛЕРТА: {symbol} цена {current_price:.8f} >= максимума {pair.max_price:.8f}")
-    
-    # Отправляем алерт только если цена вышла за диапазон И флаг не установлен
-    if price_out_of_range and not alert_tracking[tracking_key]["alerted"]:
-        try:
-            await bot.send_message(chat_id=chat_id, text=alert_message)
-            logger.info(f"✅ АЛЕРТ ОТПРАВЛЕН для {symbol}: {current_price:.8f}")
-            alert_tracking[tracking_key]["alerted"] = True
-        except Exception as e:
-            logger.error(f"❌ ОШИБКА ОТПРАВКИ АЛЕРТА для {symbol}: {e}")
-    elif price_out_of_range and alert_tracking[tracking_key]["alerted"]:
-        logger.info(f"🔔 {symbol}: цена {current_price:.8f} все еще вне диапазона (уже уведомлен)")
+        logger.info(f"🔔 ТРИГГЕР АЛЕРТА: {symbol} цена {current_price:.8f} >= максимума {max_price:.8f}")
+    
+    def on_sent() -> None:
+        logger.info(f"✅ АЛЕРТ ОТПРАВЛЕН для {symbol}: {current_price:.8f}")
+    
+    def on_failed(permanent: bool) -> None:
+        logger.error(f"❌ ОШИБКА ОТПРАВКИ АЛЕРТА для {symbol} (чат {chat_id})")
+        subscription = subscriptions.get(chat_id, symbol)
+        if subscription is not None and not permanent:
+            subscription.alerted = False
+            _index_range(chat_id, symbol, min_price, max_price)
+    
+    _get_dispatcher(bot).submit(chat_id, alert_message, PRIORITY_ALERT, on_sent=on_sent, on_failed=on_failed)
+
+def send_move_alert(chat_id: int, symbol: str, current_price: float, kind: str, move: float,
+                    reference: float, pct: float, window: int, bot: Bot) -> None:
+    """
+    Ставит уведомление о резком движении цены в очередь отправки.
+    Если отправить не удалось из-за временной ошибки, молчание подписки снимается.
+    """
+    minutes = window // 60
+    alert_message = f"🔔 АЛЕРТ! {symbol}\n"
+    alert_message += f"💰 Текущая цена: {current_price:.8f}\n"
+    if kind == ALERT_RISE:
+        alert_message += f"🚀 Рост на {move:.2f}% за {minutes} мин (от {reference:.8f})\n"
+    else:
+        alert_message += f"📉 Падение на {move:.2f}% за {minutes} мин (от {reference:.8f})\n"
+    alert_message += f"📊 Порог движения: ±{pct:g}% за {minutes} мин"
+    logger.info(f"🔔 ТРИГГЕР АЛЕРТА ДВИЖЕНИЯ: {symbol} {kind} {move:.2f}% за {minutes} мин (порог {pct:g}%)")
+    
+    def on_sent() -> None:
+        logger.info(f"✅ АЛЕРТ ДВИЖЕНИЯ ОТПРАВЛЕН для {symbol}: {move:.2f}%")
+    
+    def on_failed(permanent: bool) -> None:
+        logger.error(f"❌ ОШИБКА ОТПРАВКИ АЛЕРТА ДВИЖЕНИЯ для {symbol} (чат {chat_id})")
+        index = move_indexes.get(symbol)
+        if index is not None and not permanent:
+            index.cooldown_until.pop(chat_id, None)
+    
+    _get_dispatcher(bot).submit(chat_id, alert_message, PRIORITY_ALERT, on_sent=on_sent, on_failed=on_failed)
 
 async def stop_price_monitoring(chat_id: int, base: str, quote: str) -> None:
     """
-    Останавливает мониторинг цены для пары криптовалют.
+    Отписывает пользователя от обновлений цены пары криптовалют.
     """
     symbol = f"{base}{quote}".upper()
-    tracking_key = (chat_id, symbol)
     
-    if tracking_key in websocket_connections:
-        task = websocket_connections[tracking_key]
-        task.cancel()
-        del websocket_connections[tracking_key]
-        
-        # Очищаем отслеживание алертов
-        if tracking_key in alert_tracking:
-            del alert_tracking[tracking_key]
-        
-        if tracking_key in last_check_time:
-            del last_check_time[tracking_key]
-        
+    if subscriptions.get(chat_id, symbol) is not None:
+        _unsubscribe(chat_id, symbol)
         logger.info(f"Мониторинг {symbol} остановлен для пользователя {chat_id}")
     else:
         logger.warning(f"Мониторинг {symbol} не был запущен для пользователя {chat_id}")
 
-async def get_current_price_for_pair(base: str, quote: str) -> Optional[float]:
-    """
-    Получает текущую цену пары криптовалют.
-    """
-    return await get_crypto_price(base, quote)
\ No newline at end of file
+def _unsubscribe(chat_id: int, symbol: str) -> None:
+    """Удаляет подписчика символа и снимает его с колеса проверок, если подписчиков не осталось."""
+    entry = subscriptions.entry(symbol)
+    _, symbol_emptied = subscriptions.remove(chat_id, symbol)
+    
+    # Очищаем индексы алертов
+    index = alert_indexes.get(symbol)
+    if index is not None:
+        index.remove(chat_id)
+        if not index:
+            del alert_indexes[symbol]
+    move_index = move_indexes.get(symbol)
+    if move_index is not None:
+        move_index.remove(chat_id)
+        if not move_index:
+            del move_indexes[symbol]
+    
+    if not symbol_emptied:
+        return
+    
+    # Подписчиков не осталось - останавливаем проверки символа
+    cross_rates.release(entry.base, entry.quote)
+    refresh_task = _refresh_tasks.pop(symbol, None)
+    if refresh_task is not None:
+        refresh_task.cancel()
+    _stream_published.pop(symbol, None)
+    _volatility.pop(symbol, None)
+    refresh_intervals.pop(symbol, None)
+    if _stream_client is not None:
+        _stream_client.unsubscribe(symbol)
+    price_wheel.remove(symbol)
+    logger.info(f"Проверки {symbol} остановлены (нет подписчиков)")
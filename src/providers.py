@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Источники цен (провайдеры) и хеджированные запросы к ним.
+
+Провайдер отдает цены списка символов (bookTicker). Если основной провайдер не ответил
+за свою наблюдаемую p95 задержку, запрос дублируется следующему провайдеру,
+и берется первый успешный ответ.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+from config import (
+    API_TIMEOUT, BINANCE_API_URL, BINANCE_MIRROR_URLS, HEDGE_DEFAULT_DELAY, HEDGE_MIN_DELAY
+)
+from governor import governor, RequestGovernor
+from utils import binance_get, parse_book_tickers, WEIGHT_BOOK_TICKER, WEIGHT_BOOK_TICKER_MULTI
+
+logger = logging.getLogger(__name__)
+
+# Пока у провайдера меньше замеров, хеджирование ждет HEDGE_DEFAULT_DELAY
+HEDGE_MIN_SAMPLES = 20
+
+class ProviderStats:
+    """Задержка успешных ответов (последние window замеров) и счетчики провайдера."""
+
+    def __init__(self, window: int = 200):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0  # запрос отменен, потому что другой провайдер ответил раньше
+        self.wins = 0       # ответ этого провайдера был использован
+
+    def percentile(self, p: float) -> float:
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "wins": self.wins,
+            "latency_p50": round(self.percentile(0.5), 3),
+            "latency_p95": round(self.percentile(0.95), 3),
+        }
+
+class PriceProvider:
+    """Базовый провайдер: наследники реализуют book_tickers."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = ProviderStats()
+
+    async def book_tickers(self, symbols: Optional[List[str]] = None) -> Optional[Dict[str, float]]:
+        """
+        Цены символов: symbol -> средняя цена. Без списка - все символы провайдера.
+        Символы, которых нет у провайдера, в ответ не попадают; None - провайдер не ответил.
+        """
+        raise NotImplementedError
+
+    async def fetch(self, symbols: Optional[List[str]] = None) -> Optional[Dict[str, float]]:
+        """book_tickers с учетом задержки и ошибок."""
+        self.stats.requests += 1
+        started = time.monotonic()
+        try:
+            result = await self.book_tickers(symbols)
+        except asyncio.CancelledError:
+            self.stats.cancelled += 1
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка провайдера {self.name}: {e}")
+            result = None
+        if result is None:
+            self.stats.errors += 1
+        else:
+            self.stats.latencies.append(time.monotonic() - started)
+        return result
+
+class BinanceProvider(PriceProvider):
+    """
+    REST API Binance (основной хост или зеркало api1/api2/...). Лимиты веса и баны 418/429
+    Binance считает по IP, поэтому все хосты по умолчанию делят общий RequestGovernor.
+    """
+
+    def __init__(self, name: str, base_url: str, request_governor: RequestGovernor = governor):
+        super().__init__(name)
+        self.base_url = base_url.rstrip("/")
+        self.governor = request_governor
+
+    async def _get(self, params: Optional[Dict[str, str]], weight: int):
+        return await binance_get("/api/v3/ticker/bookTicker", params, weight, self.base_url, self.governor)
+
+    async def book_tickers(self, symbols: Optional[List[str]] = None) -> Optional[Dict[str, float]]:
+        # Если в списке есть символ, которого нет на бирже, Binance отвечает 400 на весь запрос -
+        # в этом случае берем полный список и выбираем нужные символы
+        if symbols and len(symbols) == 1:
+            status, data = await self._get({"symbol": symbols[0]}, WEIGHT_BOOK_TICKER)
+        elif symbols:
+            status, data = await self._get({"symbols": json.dumps(symbols, separators=(",", ":"))},
+                                           WEIGHT_BOOK_TICKER_MULTI)
+        else:
+            status, data = await self._get(None, WEIGHT_BOOK_TICKER_MULTI)
+
+        if status == 200:
+            if isinstance(data, dict):
+                data = [data]
+            prices = parse_book_tickers(data)
+            if symbols:
+                prices = {symbol: prices[symbol] for symbol in symbols if symbol in prices}
+            return prices
+        if status == 400 and symbols:
+            if len(symbols) == 1:
+                return {}
+            logger.debug(f"{self.name}: в пакете из {len(symbols)} символов есть неизвестные, запрашиваем все цены")
+            all_prices = await self.book_tickers()
+            if all_prices is None:
+                return None
+            return {symbol: all_prices[symbol] for symbol in symbols if symbol in all_prices}
+        if status is not None:
+            logger.warning(f"{self.name}: ошибка API при запросе цен: {status}")
+        return None
+
+class HedgedPriceSource:
+    """
+    Упорядоченный список провайдеров (первый - основной).
+    Запрос уходит основному провайдеру; если за его p95 задержку ответа нет,
+    запрос дублируется следующему. Возвращается первый успешный ответ, остальные отменяются.
+    Если провайдер ответил ошибкой, следующий запускается сразу.
+    """
+
+    def __init__(self, providers: Optional[List[PriceProvider]] = None):
+        self.providers: List[PriceProvider] = list(providers or [])
+        self.hedges = 0      # запусков запасного провайдера по таймауту
+        self.failovers = 0   # запусков запасного провайдера после ошибки
+        self.hedge_wins = 0  # ответ пришел не от основного провайдера
+
+    def register(self, provider: PriceProvider) -> None:
+        """Добавляет провайдера в конец списка."""
+        self.providers.append(provider)
+        logger.info(f"Провайдер цен {provider.name} зарегистрирован ({len(self.providers)}-й)")
+
+    @staticmethod
+    def hedge_delay(provider: PriceProvider) -> float:
+        """Сколько ждать ответа провайдера перед дублированием запроса."""
+        if len(provider.stats.latencies) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return min(max(provider.stats.percentile(0.95), HEDGE_MIN_DELAY), API_TIMEOUT)
+
+    async def book_tickers(self, symbols: Optional[List[str]] = None) -> Optional[Dict[str, float]]:
+        if not self.providers:
+            return None
+        owners: Dict[asyncio.Task, PriceProvider] = {}
+        pending = set()
+        next_index = 0
+
+        def launch() -> None:
+            nonlocal next_index
+            provider = self.providers[next_index]
+            next_index += 1
+            task = asyncio.ensure_future(provider.fetch(symbols))
+            owners[task] = provider
+            pending.add(task)
+
+        launch()
+        try:
+            while pending:
+                has_spare = next_index < len(self.providers)
+                timeout = self.hedge_delay(self.providers[next_index - 1]) if has_spare else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    launch()
+                    continue
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        provider = owners[task]
+                        provider.stats.wins += 1
+                        if provider is not self.providers[0]:
+                            self.hedge_wins += 1
+                        return result
+                if not pending and next_index < len(self.providers):
+                    self.failovers += 1
+                    launch()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+            "hedge_wins": self.hedge_wins,
+            "providers": {provider.name: provider.stats.as_dict() for provider in self.providers},
+        }
+
+def _default_providers() -> List[PriceProvider]:
+    # Все хосты Binance делят выключатель и бюджет веса с остальными запросами к бирже
+    # (каталог символов): после бана IP зеркало с того же адреса тоже получит отказ,
+    # поэтому зеркала спасают от медленного или недоступного хоста, а не от лимитов
+    providers: List[PriceProvider] = [BinanceProvider("binance", BINANCE_API_URL, governor)]
+    for url in BINANCE_MIRROR_URLS:
+        providers.append(BinanceProvider(url.split("//")[-1], url, governor))
+    return providers
+
+price_providers = HedgedPriceSource(_default_providers())
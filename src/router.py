@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Маршрутизация текстовых сообщений по таблицам.
+
+Команды и надписи кнопок ищутся в словаре точных совпадений, остальной текст
+направляется обработчику текущего шага диалога (UserState.current_action).
+Выбор маршрута - два поиска в словарях, независимо от числа маршрутов.
+Для каждого маршрута считаются число вызовов и время обработки.
+"""
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+from telegram import Update
+from telegram.ext import CallbackContext
+from models import user_states
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Update, CallbackContext], Awaitable[None]]
+
+class Route:
+    """Обработчик маршрута и его счетчики."""
+
+    __slots__ = ("name", "handler", "calls", "errors", "total_time", "max_time")
+
+    def __init__(self, name: str, handler: Handler):
+        self.name = name
+        self.handler = handler
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_time / self.calls * 1000, 1) if self.calls else 0.0,
+            "max_ms": round(self.max_time * 1000, 1),
+        }
+
+class UpdateRouter:
+    """Таблицы маршрутов: точный текст -> маршрут, шаг диалога -> маршрут, маршрут по умолчанию."""
+
+    def __init__(self):
+        self._exact: Dict[str, Route] = {}
+        self._states: Dict[str, Route] = {}
+        self._routes: Dict[str, Route] = {}
+        self._default: Optional[Route] = None
+
+    def _route(self, name: str, handler: Handler) -> Route:
+        route = self._routes.get(name)
+        if route is None:
+            route = self._routes[name] = Route(name, handler)
+        return route
+
+    def text(self, texts: Iterable[str], handler: Handler, name: Optional[str] = None) -> None:
+        """Команды и кнопки: сообщения с одним из texts идут в handler при любом шаге диалога."""
+        texts = list(texts)
+        route = self._route(name or texts[0], handler)
+        for text in texts:
+            self._exact[text] = route
+
+    def state(self, actions: Iterable[str], handler: Handler, name: Optional[str] = None) -> None:
+        """Свободный текст пользователя, находящегося на одном из шагов actions."""
+        actions = list(actions)
+        route = self._route(name or actions[0], handler)
+        for action in actions:
+            self._states[action] = route
+
+    def default(self, handler: Handler, name: str = "default") -> None:
+        """Текст вне диалога, не совпавший ни с одной командой."""
+        self._default = self._route(name, handler)
+
+    def resolve(self, chat_id: int, text: str) -> Optional[Route]:
+        route = self._exact.get(text)
+        if route is not None:
+            return route
+        state = user_states.get(chat_id)
+        if state is not None and state.current_action:
+            route = self._states.get(state.current_action)
+            if route is not None:
+                return route
+        return self._default
+
+    async def dispatch(self, update: Update, context: CallbackContext) -> None:
+        """Обработчик текстовых сообщений для Application."""
+        message = update.message
+        if message is None or message.text is None:
+            return
+        route = self.resolve(update.effective_chat.id, message.text)
+        if route is None:
+            return
+        logger.debug(f"📨 '{message.text}' от {update.effective_chat.id} -> {route.name}")
+        started = time.perf_counter()
+        try:
+            await route.handler(update, context)
+        except Exception:
+            route.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            route.calls += 1
+            route.total_time += elapsed
+            if elapsed > route.max_time:
+                route.max_time = elapsed
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Счетчики маршрутов, которые вызывались."""
+        return {name: route.as_dict() for name, route in self._routes.items() if route.calls}
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Колесо таймеров для планирования проверок цен.
+"""
+import asyncio
+import logging
+import math
+import zlib
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class TimingWheel:
+    """
+    Колесо из slots слотов по tick = period / slots секунд.
+
+    Ключ (символ) лежит в слоте своего времени срабатывания вместе с числом оборотов,
+    которые колесо должно сделать до срабатывания. Один драйвер раз в tick сдвигает
+    колесо и отдает сработавшие ключи - вместо отдельной задачи со sleep на каждый ключ.
+    Новые ключи получают детерминированную фазу по crc32 ключа, поэтому проверки
+    равномерно распределены по периоду и не совпадают после перезапуска.
+    """
+
+    def __init__(self, period: float, slots: int):
+        self.period = period
+        self.slots_count = slots
+        self.tick = period / slots
+        self.position = 0
+        self._slots: List[Dict[str, int]] = [{} for _ in range(slots)]  # slot -> {key: оборотов до срабатывания}
+        self._slot_of: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._slot_of
+
+    def phase_slot(self, key: str) -> int:
+        """Детерминированный слот ключа внутри периода."""
+        return zlib.crc32(key.encode()) % self.slots_count
+
+    def add(self, key: str) -> None:
+        """Планирует ключ на ближайшее наступление его фазы."""
+        ticks = (self.phase_slot(key) - self.position) % self.slots_count or self.slots_count
+        self._place(key, ticks)
+
+    def schedule(self, key: str, delay: float) -> None:
+        """Планирует ключ через delay секунд (округляется до tick, не меньше одного tick)."""
+        self._place(key, max(1, math.ceil(delay / self.tick - 1e-9)))
+
+    def _place(self, key: str, ticks: int) -> None:
+        self.remove(key)
+        slot = (self.position + ticks) % self.slots_count
+        self._slots[slot][key] = (ticks - 1) // self.slots_count
+        self._slot_of[key] = slot
+
+    def remove(self, key: str) -> None:
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self._slots[slot].pop(key, None)
+
+    def advance(self) -> List[str]:
+        """Сдвигает колесо на один слот и возвращает сработавшие ключи."""
+        self.position = (self.position + 1) % self.slots_count
+        slot = self._slots[self.position]
+        due = []
+        for key, rounds in list(slot.items()):
+            if rounds == 0:
+                due.append(key)
+                del slot[key]
+                del self._slot_of[key]
+            else:
+                slot[key] = rounds - 1
+        return due
+
+    def load(self) -> List[int]:
+        """Число ключей в каждом слоте, начиная со следующего за текущим."""
+        return [
+            len(self._slots[(self.position + offset) % self.slots_count])
+            for offset in range(1, self.slots_count + 1)
+        ]
+
+    def load_summary(self) -> Tuple[int, int, float]:
+        """(ключей всего, максимум в слоте, среднее на слот)."""
+        load = self.load()
+        return len(self), max(load), len(self) / self.slots_count
+
+    async def run(self, on_due: Callable[[List[str]], Awaitable[None]]) -> None:
+        """Драйвер колеса: раз в tick сдвигает колесо и передает сработавшие ключи в on_due."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self.tick
+        while True:
+            delay = next_tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif -delay > self.period:
+                # Цикл событий надолго остановился - не пытаемся наверстать все тики
+                logger.warning(f"Колесо таймеров отстало на {-delay:.1f} с")
+                next_tick = loop.time()
+            next_tick += self.tick
+            due = self.advance()
+            if due:
+                await on_due(due)
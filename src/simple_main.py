@@ -13,7 +13,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext
 from config import TELEGRAM_BOT_TOKEN
-from models import user_settings, user_states
+from models import UserPairs, user_settings, user_states
 from storage import load_user_data
 
 # Настройка логирования
@@ -31,7 +31,7 @@ async def cmd_start(update: Update, context: CallbackContext) -> None:
     
     # Инициализация пользователя
     if chat_id not in user_settings:
-        user_settings[chat_id] = []
+        user_settings[chat_id] = UserPairs()
     if chat_id not in user_states:
         user_states[chat_id] = None
     
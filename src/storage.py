@@ -1,12 +1,24 @@
 #!/usr/bin/env python3
 """
 Модуль для сохранения и загрузки данных пользователей.
+
+По умолчанию пары хранятся в SQLite (storage_sqlite): добавление, изменение и удаление
+пары пишут только одну строку. JSON (user_data.json) остается форматом импорта/экспорта
+и запасным хранилищем (STORAGE_BACKEND=json): изменения пар дописываются в журнал
+(storage_journal), а снимок user_data.json перезаписывается только при сжатии журнала.
+
+Обработчики только помечают измененные пары (save_pair/delete_pair); запись делает
+один писатель storage_saver, объединяя все изменения за STORAGE_SAVE_DELAY в одну запись.
 """
+import argparse
+import asyncio
 import json
 import os
 import logging
-from typing import Dict, List
-from models import user_settings, CryptoPair
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from config import STORAGE_BACKEND, STORAGE_DB, STORAGE_SAVE_DELAY, STORAGE_JOURNAL_MAX_BYTES
+from models import user_settings, CryptoPair, UserPairs
 
 logger = logging.getLogger(__name__)
 
@@ -18,85 +30,321 @@ if os.path.exists("/app/user_data.json"):
 else:
     STORAGE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "user_data.json")
 
-def save_user_data():
-    """Сохраняет данные пользователей в файл."""
-    try:
-        # Конвертируем данные в JSON-совместимый формат
-        data_to_save = {}
-        for chat_id, pairs in user_settings.items():
-            data_to_save[str(chat_id)] = []
-            for pair in pairs:
-                data_to_save[str(chat_id)].append({
-                    "base": pair.base,
-                    "quote": pair.quote,
-                    "min_price": pair.min_price,
-                    "max_price": pair.max_price,
-                    "created_at": pair.created_at.isoformat() if pair.created_at else None
-                })
-        
-        with open(STORAGE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data_to_save, f, ensure_ascii=False, indent=2)
-        
-        logger.info(f"Данные сохранены в {STORAGE_FILE}")
-        
-    except Exception as e:
-        logger.error(f"Ошибка при сохранении данных: {e}")
-
-def load_user_data():
-    """Загружает данные пользователей из файла."""
-    global user_settings
-    
-    if not os.path.exists(STORAGE_FILE):
-        logger.info(f"Файл {STORAGE_FILE} не найден, создаем новый")
-        return
-    
-    try:
+DB_FILE = STORAGE_DB or os.path.join(os.path.dirname(STORAGE_FILE), "user_data.db")
+JOURNAL_FILE = os.path.splitext(STORAGE_FILE)[0] + ".journal"
+
+# Отметка в базе: данные из JSON-хранилища перенесены (время переноса)
+META_JSON_IMPORTED = "json_imported_at"
+
+_db = None
+_journal = None
+
+def _use_sqlite() -> bool:
+    return STORAGE_BACKEND == "sqlite"
+
+def get_db():
+    """Соединение с базой пар (создается при первом обращении)."""
+    global _db
+    if _db is None:
+        from storage_sqlite import SQLiteStorage
+        _db = SQLiteStorage(DB_FILE)
+    return _db
+
+def get_journal():
+    """Журнал изменений JSON-хранилища."""
+    global _journal
+    if _journal is None:
+        from storage_journal import PairJournal
+        _journal = PairJournal(JOURNAL_FILE)
+    return _journal
+
+def pair_to_dict(pair: CryptoPair) -> Dict[str, Any]:
+    return {
+        "base": pair.base,
+        "quote": pair.quote,
+        "min_price": pair.min_price,
+        "max_price": pair.max_price,
+        "move_pct": pair.move_pct,
+        "move_window": pair.move_window,
+        "created_at": pair.created_at.isoformat() if pair.created_at else None
+    }
+
+def pair_from_dict(pair_data: Dict[str, Any]) -> CryptoPair:
+    min_price = pair_data.get("min_price")
+    max_price = pair_data.get("max_price")
+
+    # Логируем загруженные значения для отладки
+    logger.debug(f"Загружаем пару {pair_data['base']}/{pair_data['quote']}:")
+    logger.debug(f"   min_price: {min_price} (тип: {type(min_price)})")
+    logger.debug(f"   max_price: {max_price} (тип: {type(max_price)})")
+
+    # Обрабатываем created_at
+    created_at = None
+    if pair_data.get("created_at"):
+        try:
+            created_at = datetime.fromisoformat(pair_data["created_at"])
+        except (ValueError, TypeError):
+            created_at = None
+
+    return CryptoPair(
+        base=pair_data["base"],
+        quote=pair_data["quote"],
+        min_price=min_price,
+        max_price=max_price,
+        move_pct=pair_data.get("move_pct"),
+        move_window=pair_data.get("move_window"),
+        created_at=created_at
+    )
+
+def _snapshot() -> Dict[str, List[Dict[str, Any]]]:
+    """JSON-совместимая копия user_settings (снимается в цикле событий, до записи в потоке)."""
+    return {
+        str(chat_id): [pair_to_dict(pair) for pair in pairs]
+        for chat_id, pairs in list(user_settings.items())
+    }
+
+def _write_json(data: Dict[str, List[Dict[str, Any]]], path: str) -> None:
+    """Атомарная запись: временный файл, fsync, затем rename поверх старого файла."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if os.name == "posix":
+        # rename должен попасть на диск вместе с каталогом
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def _settings_from_data(data: Dict[str, List[Dict[str, Any]]]) -> Dict[int, UserPairs]:
+    return {
+        int(chat_id_str): UserPairs(pair_from_dict(pair_data) for pair_data in pairs_data)
+        for chat_id_str, pairs_data in data.items()
+    }
+
+def read_json(path: str) -> Dict[int, UserPairs]:
+    """Читает пары пользователей из JSON-файла."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return _settings_from_data(json.load(f))
+
+def read_json_store() -> Dict[int, UserPairs]:
+    """Читает JSON-хранилище: снимок и журнал изменений после него."""
+    data = {}
+    if os.path.exists(STORAGE_FILE):
         with open(STORAGE_FILE, 'r', encoding='utf-8') as f:
             data = json.load(f)
-        
+    applied = get_journal().replay(data)
+    if applied:
+        logger.info(f"Из журнала {JOURNAL_FILE} применено изменений: {applied}")
+    return _settings_from_data(data)
+
+def _json_store_exists() -> bool:
+    return os.path.exists(STORAGE_FILE) or os.path.exists(JOURNAL_FILE)
+
+def _compact_json(data: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Сжатие журнала: новый снимок, затем пустой журнал (в отдельном потоке)."""
+    _write_json(data, STORAGE_FILE)
+    get_journal().reset()
+
+def load_user_data(active_only: bool = False):
+    """
+    Загружает данные пользователей из базы (или из файла для STORAGE_BACKEND=json).
+    active_only - только пользователи с алертами (остальных загружает load_user по запросу);
+    JSON-хранилище всегда загружается целиком.
+    """
+    try:
+        if _use_sqlite():
+            db = get_db()
+            if db.get_meta(META_JSON_IMPORTED) is None:
+                # Первый запуск с SQLite: переносим данные из JSON. Перенос отмечается в базе
+                # и больше не повторяется, иначе после удаления пользователями всех пар
+                # база снова была бы пустой и при перезапуске вернулись бы старые пары из JSON
+                if db.is_empty() and _json_store_exists():
+                    db.replace_all(read_json_store())
+                    logger.info(f"Данные перенесены из {STORAGE_FILE} в {DB_FILE}")
+                db.set_meta(META_JSON_IMPORTED, datetime.now().isoformat())
+            settings = db.load(active_only)
+            source = DB_FILE
+        else:
+            if not _json_store_exists():
+                logger.info(f"Файл {STORAGE_FILE} не найден, создаем новый")
+                return
+            settings = read_json_store()
+            source = STORAGE_FILE
+
         user_settings.clear()
-        for chat_id_str, pairs_data in data.items():
-            chat_id = int(chat_id_str)
-            user_settings[chat_id] = []
-            
-            for pair_data in pairs_data:
-                min_price = pair_data.get("min_price")
-                max_price = pair_data.get("max_price")
-                
-                # Логируем загруженные значения для отладки
-                logger.debug(f"Загружаем пару {pair_data['base']}/{pair_data['quote']}:")
-                logger.debug(f"   min_price: {min_price} (тип: {type(min_price)})")
-                logger.debug(f"   max_price: {max_price} (тип: {type(max_price)})")
-                
-                # Обрабатываем created_at
-                created_at = None
-                if "created_at" in pair_data and pair_data["created_at"]:
-                    try:
-                        from datetime import datetime
-                        created_at = datetime.fromisoformat(pair_data["created_at"])
-                    except (ValueError, TypeError):
-                        created_at = None
-                
-                pair = CryptoPair(
-                    base=pair_data["base"],
-                    quote=pair_data["quote"],
-                    min_price=min_price,
-                    max_price=max_price,
-                    created_at=created_at
-                )
-                user_settings[chat_id].append(pair)
-        
-        logger.info(f"Данные загружены из {STORAGE_FILE}")
+        user_settings.update(settings)
+
+        logger.info(f"Данные загружены из {source}")
         logger.info(f"Загружено {len(user_settings)} пользователей")
-        
+
     except Exception as e:
         logger.error(f"Ошибка при загрузке данных: {e}")
 
-def cleanup_user_data():
-    """Очищает файл данных при завершении работы."""
-    try:
-        if os.path.exists(STORAGE_FILE):
-            os.remove(STORAGE_FILE)
-            logger.info(f"Файл {STORAGE_FILE} удален")
-    except Exception as e:
-        logger.error(f"Ошибка при удалении файла: {e}")
+def load_user(chat_id: int) -> List[CryptoPair]:
+    """Пары одного пользователя из базы (для загрузки по запросу)."""
+    if not _use_sqlite():
+        return []
+    return get_db().load_user(chat_id)
+
+def supports_lazy_loading() -> bool:
+    return _use_sqlite()
+
+PairKey = Tuple[int, str, str]
+
+class SaveScheduler:
+    """
+    Отложенная запись пар пользователей. save_pair/delete_pair помечают пару грязной,
+    писатель (run) после первой пометки ждет delay и записывает все накопленные изменения сразу:
+    в SQLite - только помеченные строки, в JSON - записи журнала (и снимок, когда журнал
+    превысил journal_max_bytes). Записи идут строго по одной.
+    """
+
+    def __init__(self, delay: float = STORAGE_SAVE_DELAY, journal_max_bytes: int = STORAGE_JOURNAL_MAX_BYTES):
+        self.delay = delay
+        self.journal_max_bytes = journal_max_bytes
+        # Грязные пары в порядке пометки (dict вместо set): новые пары попадают в базу
+        # в порядке добавления, и после перезапуска список пар показывается в том же порядке
+        self.dirty: Dict[PairKey, None] = {}
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        # Метрики
+        self.marks = 0
+        self.writes = 0
+        self.failures = 0
+        self.compactions = 0
+
+    def mark(self, chat_id: int, base: str, quote: str) -> None:
+        self.dirty[(chat_id, base, quote)] = None
+        self.marks += 1
+        self._wake.set()
+
+    async def run(self) -> None:
+        """Цикл писателя: пачка изменений за delay - одна запись."""
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.delay)
+            self._wake.clear()
+            # Запись не прерывается отменой цикла: остановка дождется ее в flush
+            await asyncio.shield(asyncio.ensure_future(self.flush()))
+
+    async def flush(self) -> None:
+        """Записывает все накопленные изменения (ждет текущую запись, если она идет)."""
+        async with self._lock:
+            if not self.dirty:
+                return
+            keys, self.dirty = self.dirty, {}
+            try:
+                if _use_sqlite():
+                    rows, deleted = self._collect_rows(keys)
+                    await asyncio.to_thread(get_db().apply, rows, deleted)
+                else:
+                    size = await asyncio.to_thread(get_journal().append, self._collect_records(keys))
+                    if size > self.journal_max_bytes:
+                        await asyncio.to_thread(_compact_json, _snapshot())
+                        self.compactions += 1
+                        logger.info(f"Журнал {JOURNAL_FILE} ({size} байт) сжат в снимок {STORAGE_FILE}")
+            except Exception as e:
+                # Пары останутся грязными до следующей записи
+                self.dirty = {**keys, **self.dirty}
+                self.failures += 1
+                self._wake.set()
+                logger.error(f"Ошибка при сохранении данных: {e}")
+                return
+            self.writes += 1
+            logger.debug(f"Сохранено изменений пар: {len(keys)}")
+
+    def has_pending(self, chat_id: int) -> bool:
+        """Есть ли у пользователя пометки, еще не записанные в хранилище."""
+        return any(key[0] == chat_id for key in self.dirty)
+
+    @staticmethod
+    def _marked_pairs(keys: Dict[PairKey, None]):
+        """
+        (chat_id, base, quote, пара) для помеченных ключей; пара None - пользователь ее удалил.
+        Пользователей, которых нет в памяти (выгружены), пропускаем: отсутствие их пар
+        в user_settings не означает удаления, и запись удаления стерла бы их данные.
+        """
+        for chat_id, base, quote in keys:
+            pairs = user_settings.get(chat_id)
+            if pairs is None:
+                logger.warning(f"Пользователь {chat_id} не в памяти, изменение {base}/{quote} не записано")
+                continue
+            yield chat_id, base, quote, pairs.get(base, quote)
+
+    @classmethod
+    def _collect_rows(cls, keys: Dict[PairKey, None]):
+        """Строки для записи (пара есть у пользователя) и ключи для удаления (пары уже нет)."""
+        from storage_sqlite import pair_to_row
+        rows, deleted = [], []
+        for chat_id, base, quote, pair in cls._marked_pairs(keys):
+            if pair is None:
+                deleted.append((chat_id, base, quote))
+            else:
+                rows.append(pair_to_row(chat_id, pair))
+        return rows, deleted
+
+    @classmethod
+    def _collect_records(cls, keys: Dict[PairKey, None]) -> List[list]:
+        """Записи журнала: текущее состояние пары или ее удаление."""
+        from storage_journal import put_record, delete_record
+        records = []
+        for chat_id, base, quote, pair in cls._marked_pairs(keys):
+            if pair is None:
+                records.append(delete_record(chat_id, base, quote))
+            else:
+                records.append(put_record(chat_id, pair_to_dict(pair)))
+        return records
+
+    async def close(self) -> None:
+        """Финальная запись при остановке бота."""
+        await self.flush()
+        if _use_sqlite():
+            await asyncio.to_thread(get_db().close)
+        logger.info(f"Данные пользователей сохранены ({self.writes} записей, {self.marks} изменений)")
+
+    def stats(self) -> Dict[str, int]:
+        return {"dirty": len(self.dirty), "marks": self.marks, "writes": self.writes,
+                "failures": self.failures, "compactions": self.compactions}
+
+storage_saver = SaveScheduler()
+
+def save_pair(chat_id: int, base: str, quote: str) -> None:
+    """Помечает добавленную или измененную пару пользователя для записи."""
+    storage_saver.mark(chat_id, base, quote)
+
+def delete_pair(chat_id: int, base: str, quote: str) -> None:
+    """Помечает удаленную пару пользователя для записи."""
+    storage_saver.mark(chat_id, base, quote)
+
+def export_json(path: str) -> int:
+    """Выгружает базу в JSON-файл. Возвращает число пар."""
+    settings = get_db().load()
+    _write_json({str(chat_id): [pair_to_dict(pair) for pair in pairs] for chat_id, pairs in settings.items()}, path)
+    return sum(len(pairs) for pairs in settings.values())
+
+def import_json(path: str) -> int:
+    """Заменяет содержимое базы данными из JSON-файла. Возвращает число пар."""
+    settings = read_json(path)
+    get_db().replace_all(settings)
+    return sum(len(pairs) for pairs in settings.values())
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Импорт/экспорт пар пользователей между SQLite и JSON")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", nargs="?", default=STORAGE_FILE, help="JSON-файл")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "export":
+        count = export_json(args.path)
+        logger.info(f"Выгружено {count} пар из {DB_FILE} в {args.path}")
+    else:
+        count = import_json(args.path)
+        logger.info(f"Загружено {count} пар из {args.path} в {DB_FILE}")
+    get_db().close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Журнал изменений пар пользователей для JSON-хранилища.
+
+Каждое изменение пары дописывается в конец журнала одной строкой JSON:
+["put", chat_id, {пара}] или ["del", chat_id, base, quote]. Снимок (user_data.json)
+перезаписывается только при сжатии журнала, после чего журнал обнуляется.
+При загрузке журнал проигрывается поверх снимка; записи идемпотентны, поэтому
+повторное проигрывание (сбой между записью снимка и обнулением журнала) безопасно.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+OP_PUT = "put"
+OP_DELETE = "del"
+
+# Данные в формате снимка: str(chat_id) -> [словари пар]
+SnapshotData = Dict[str, List[Dict[str, Any]]]
+
+def put_record(chat_id: int, pair_data: Dict[str, Any]) -> list:
+    return [OP_PUT, chat_id, pair_data]
+
+def delete_record(chat_id: int, base: str, quote: str) -> list:
+    return [OP_DELETE, chat_id, base, quote]
+
+class PairJournal:
+    """Файл журнала: дописывание пачек записей, проигрывание и обнуление."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0  # записей в журнале после последнего сжатия
+
+    def append(self, records: List[list]) -> int:
+        """Дописывает записи и сбрасывает их на диск. Возвращает размер журнала."""
+        lines = "".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                        for record in records)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        self.records += len(records)
+        return size
+
+    def replay(self, data: SnapshotData) -> int:
+        """Применяет журнал к данным снимка. Возвращает число примененных записей."""
+        if not os.path.exists(self.path):
+            return 0
+        positions: Dict[Tuple[str, str, str], int] = {}
+
+        def index(chat_key: str) -> None:
+            for i, pair_data in enumerate(data.get(chat_key, [])):
+                positions[(chat_key, pair_data["base"], pair_data["quote"])] = i
+
+        for chat_key in data:
+            index(chat_key)
+
+        applied = 0
+        valid_end = 0
+        torn_tail = False
+        with open(self.path, "rb") as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.endswith(b"\n"):
+                    torn_tail = True
+                    break
+                valid_end += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Журнал {self.path}: строка {line_no} повреждена, пропущена")
+                    continue
+                op, chat_key = record[0], str(record[1])
+                pairs = data.setdefault(chat_key, [])
+                if op == OP_PUT:
+                    pair_data = record[2]
+                    key = (chat_key, pair_data["base"], pair_data["quote"])
+                    if key in positions:
+                        pairs[positions[key]] = pair_data
+                    else:
+                        positions[key] = len(pairs)
+                        pairs.append(pair_data)
+                elif op == OP_DELETE:
+                    i = positions.pop((chat_key, record[2], record[3]), None)
+                    if i is not None:
+                        pairs.pop(i)
+                        index(chat_key)
+                applied += 1
+        if torn_tail:
+            # Недописанная строка в конце журнала (сбой во время записи):
+            # обрезаем ее, чтобы следующие записи начинались с новой строки
+            os.truncate(self.path, valid_end)
+            logger.warning(f"Журнал {self.path}: недописанная запись в конце отброшена")
+        self.records = applied
+        return applied
+
+    def reset(self) -> None:
+        """Обнуляет журнал после записи снимка."""
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self.records = 0
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Хранилище пар пользователей в SQLite (режим WAL).
+
+Каждая пара - одна строка таблицы pairs, изменения пишутся точечно (upsert/delete),
+поэтому стоимость сохранения зависит от числа измененных пар, а не от числа пользователей.
+"""
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from models import CryptoPair, UserPairs
+
+logger = logging.getLogger(__name__)
+
+# (chat_id, base, quote, min_price, max_price, move_pct, move_window, created_at)
+PairRow = Tuple[int, str, str, Optional[float], Optional[float], Optional[float], Optional[int], Optional[str]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pairs (
+    chat_id     INTEGER NOT NULL,
+    base        TEXT    NOT NULL,
+    quote       TEXT    NOT NULL,
+    min_price   REAL,
+    max_price   REAL,
+    move_pct    REAL,
+    move_window INTEGER,
+    created_at  TEXT,
+    UNIQUE (chat_id, base, quote)
+)
+"""
+
+# Служебные отметки хранилища (например, что данные из JSON уже перенесены)
+META_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+)
+"""
+
+UPSERT = """
+INSERT INTO pairs (chat_id, base, quote, min_price, max_price, move_pct, move_window, created_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (chat_id, base, quote) DO UPDATE SET
+    min_price = excluded.min_price,
+    max_price = excluded.max_price,
+    move_pct = excluded.move_pct,
+    move_window = excluded.move_window
+"""
+
+# Пользователи с алертами загружаются при старте (условие совпадает с CryptoPair.has_alerts)
+HAS_ALERTS = "min_price IS NOT NULL OR max_price IS NOT NULL OR move_pct IS NOT NULL"
+
+SELECT_PAIRS = "SELECT chat_id, base, quote, min_price, max_price, move_pct, move_window, created_at FROM pairs"
+
+def pair_to_row(chat_id: int, pair: CryptoPair) -> PairRow:
+    """Снимок пары для записи (делается в цикле событий, до передачи в поток)."""
+    return (
+        chat_id, pair.base, pair.quote, pair.min_price, pair.max_price,
+        pair.move_pct, pair.move_window,
+        pair.created_at.isoformat() if pair.created_at else None,
+    )
+
+def row_to_pair(row: PairRow) -> CryptoPair:
+    _, base, quote, min_price, max_price, move_pct, move_window, created_at = row
+    try:
+        created = datetime.fromisoformat(created_at) if created_at else None
+    except ValueError:
+        created = None
+    return CryptoPair(base=base, quote=quote, min_price=min_price, max_price=max_price,
+                      move_pct=move_pct, move_window=move_window, created_at=created)
+
+class SQLiteStorage:
+    """
+    Соединение с базой пар. Методы синхронные и вызываются из потока (asyncio.to_thread),
+    доступ к соединению сериализуется блокировкой.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(SCHEMA)
+            conn.execute(META_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._connection().execute("SELECT 1 FROM pairs LIMIT 1").fetchone() is None
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._connection().execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    def load(self, active_only: bool = False) -> Dict[int, UserPairs]:
+        """
+        Пары по пользователям в порядке добавления. active_only - только пользователи,
+        у которых есть хотя бы одна пара с алертом.
+        """
+        query = SELECT_PAIRS
+        if active_only:
+            query += f" WHERE chat_id IN (SELECT chat_id FROM pairs WHERE {HAS_ALERTS})"
+        settings: Dict[int, UserPairs] = {}
+        with self._lock:
+            rows = self._connection().execute(query + " ORDER BY chat_id, rowid").fetchall()
+        for row in rows:
+            pairs = settings.get(row[0])
+            if pairs is None:
+                pairs = settings[row[0]] = UserPairs()
+            pairs.add(row_to_pair(row))
+        return settings
+
+    def load_user(self, chat_id: int) -> List[CryptoPair]:
+        """Пары одного пользователя (поиск по индексу UNIQUE(chat_id, ...))."""
+        with self._lock:
+            rows = self._connection().execute(
+                SELECT_PAIRS + " WHERE chat_id = ? ORDER BY rowid", (chat_id,)
+            ).fetchall()
+        return [row_to_pair(row) for row in rows]
+
+    def apply(self, rows: Iterable[PairRow], deleted: Iterable[Tuple[int, str, str]]) -> None:
+        """Добавляет или обновляет пары rows и удаляет пары (chat_id, base, quote) одной транзакцией."""
+        rows = list(rows)
+        deleted = list(deleted)
+        if not rows and not deleted:
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(UPSERT, rows)
+                conn.executemany("DELETE FROM pairs WHERE chat_id = ? AND base = ? AND quote = ?", deleted)
+            self.writes += len(rows) + len(deleted)
+
+    def replace_all(self, settings: Dict[int, Iterable[CryptoPair]]) -> None:
+        """Заменяет содержимое базы (импорт из JSON)."""
+        rows = [pair_to_row(chat_id, pair) for chat_id, pairs in settings.items() for pair in pairs]
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("BEGIN")
+                conn.execute("DELETE FROM pairs")
+                conn.executemany(UPSERT, rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Клиент Binance combined streams для получения цен в реальном времени.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Callable, Dict, List, Optional, Set
+import aiohttp
+from config import BINANCE_WS_URL, STREAMS_PER_CONNECTION, STREAM_RECONNECT_MAX_DELAY
+from supervisor import supervisor
+
+logger = logging.getLogger(__name__)
+
+# Binance принимает не более 5 управляющих сообщений в секунду на соединение
+CONTROL_MESSAGE_INTERVAL = 0.25  # секунд
+# Максимум потоков в одном сообщении SUBSCRIBE
+STREAMS_PER_MESSAGE = 100
+
+def stream_name(symbol: str) -> str:
+    """Имя потока bookTicker для символа."""
+    return f"{symbol.lower()}@bookTicker"
+
+class StreamConnection:
+    """Одно WebSocket соединение с набором потоков, переподключается с повторной подпиской."""
+
+    def __init__(self, client: "BinanceStreamClient", index: int):
+        self.client = client
+        self.index = index
+        self.streams: Set[str] = set()
+        self._to_subscribe: Set[str] = set()
+        self._to_unsubscribe: Set[str] = set()
+        self._changed = asyncio.Event()
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._request_id = 0
+        self.task = supervisor.spawn("stream", self.run, name=f"stream:{index}", restart=True)
+
+    def subscribe(self, stream: str) -> None:
+        self.streams.add(stream)
+        self._to_unsubscribe.discard(stream)
+        self._to_subscribe.add(stream)
+        self._changed.set()
+
+    def unsubscribe(self, stream: str) -> None:
+        self.streams.discard(stream)
+        self._to_subscribe.discard(stream)
+        self._to_unsubscribe.add(stream)
+        self._changed.set()
+
+    async def run(self) -> None:
+        """Поддерживает соединение: подключение, повторная подписка, чтение сообщений."""
+        delay = 1.0
+        while True:
+            try:
+                session = await self.client.get_session()
+                async with session.ws_connect(f"{self.client.url}/stream", heartbeat=30) as ws:
+                    self._ws = ws
+                    logger.info(f"Stream #{self.index}: подключено, потоков: {len(self.streams)}")
+                    delay = 1.0
+
+                    # После (пере)подключения подписываемся на все потоки заново
+                    self._to_unsubscribe.clear()
+                    self._to_subscribe = set(self.streams)
+                    self._changed.set()
+
+                    sender = asyncio.create_task(self._send_control_messages(ws))
+                    try:
+                        async for message in ws:
+                            if message.type == aiohttp.WSMsgType.TEXT:
+                                self._handle_message(message.data)
+                            elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+                    finally:
+                        sender.cancel()
+                        self._ws = None
+                logger.warning(f"Stream #{self.index}: соединение закрыто сервером")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Stream #{self.index}: ошибка соединения: {e}")
+
+            # Экспоненциальная задержка с джиттером перед переподключением
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, STREAM_RECONNECT_MAX_DELAY)
+
+    async def _send_control_messages(self, ws: aiohttp.ClientWebSocketResponse) -> None:
+        """Отправляет накопленные SUBSCRIBE/UNSUBSCRIBE, соблюдая лимит сообщений Binance."""
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            for method, pending in (("UNSUBSCRIBE", self._to_unsubscribe), ("SUBSCRIBE", self._to_subscribe)):
+                while pending:
+                    params = [pending.pop() for _ in range(min(len(pending), STREAMS_PER_MESSAGE))]
+                    self._request_id += 1
+                    await ws.send_str(json.dumps({"method": method, "params": params, "id": self._request_id}))
+                    logger.debug(f"Stream #{self.index}: {method} {len(params)} потоков")
+                    await asyncio.sleep(CONTROL_MESSAGE_INTERVAL)
+
+    def _handle_message(self, raw: str) -> None:
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            return
+        data = message.get("data") if isinstance(message, dict) else None
+        if not data:
+            # Ответы на SUBSCRIBE/UNSUBSCRIBE: {"result": null, "id": N}
+            if isinstance(message, dict) and message.get("error"):
+                logger.warning(f"Stream #{self.index}: ошибка Binance: {message['error']}")
+            return
+        try:
+            bid = float(data["b"])
+            ask = float(data["a"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if bid > 0 and ask > 0:
+            self.client.handle_price(data["s"], (bid + ask) / 2)
+
+    async def close(self) -> None:
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+class BinanceStreamClient:
+    """
+    Мультиплексирует потоки <symbol>@bookTicker по нескольким соединениям
+    (не более STREAMS_PER_CONNECTION потоков на соединение).
+    """
+
+    def __init__(self, on_price: Callable[[str, float], None], url: str = BINANCE_WS_URL,
+                 streams_per_connection: int = STREAMS_PER_CONNECTION):
+        self.on_price = on_price
+        self.url = url.rstrip("/")
+        self.streams_per_connection = streams_per_connection
+        self.connections: List[StreamConnection] = []
+        self.last_update: Dict[str, float] = {}  # symbol -> время последнего сообщения
+        self._symbol_connection: Dict[str, StreamConnection] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    def subscribe(self, symbol: str) -> None:
+        """Подписывается на поток символа."""
+        symbol = symbol.upper()
+        if symbol in self._symbol_connection:
+            return
+        connection = next((c for c in self.connections if len(c.streams) < self.streams_per_connection), None)
+        if connection is None:
+            connection = StreamConnection(self, len(self.connections))
+            self.connections.append(connection)
+        connection.subscribe(stream_name(symbol))
+        self._symbol_connection[symbol] = connection
+        logger.info(f"Подписка на поток {symbol} (соединение #{connection.index})")
+
+    def unsubscribe(self, symbol: str) -> None:
+        """Отписывается от потока символа."""
+        symbol = symbol.upper()
+        connection = self._symbol_connection.pop(symbol, None)
+        if connection is None:
+            return
+        connection.unsubscribe(stream_name(symbol))
+        self.last_update.pop(symbol, None)
+        logger.info(f"Отписка от потока {symbol}")
+
+    def is_fresh(self, symbol: str, max_age: float) -> bool:
+        """Есть ли по символу данные из потока не старше max_age секунд."""
+        updated = self.last_update.get(symbol)
+        return updated is not None and time.time() - updated < max_age
+
+    def handle_price(self, symbol: str, price: float) -> None:
+        if symbol not in self._symbol_connection:
+            return
+        self.last_update[symbol] = time.time()
+        self.on_price(symbol, price)
+
+    async def close(self) -> None:
+        for connection in self.connections:
+            await connection.close()
+        self.connections.clear()
+        self._symbol_connection.clear()
+        if self._session and not self._session.closed:
+            await self._session.close()
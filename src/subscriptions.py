@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Реестр подписок пользователей на символы.
+
+Подписка - компактная запись со __slots__ (чат, числовой id символа, флаг алерта),
+доступная из двух индексов: по чату и по символу. Строки символов интернируются
+и получают числовой id, поэтому каждая подписка не хранит свою копию строки
+и не требует кортежного ключа (chat_id, symbol).
+"""
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class Subscription:
+    """Подписка чата на символ."""
+
+    __slots__ = ("chat_id", "symbol_id", "alerted")
+
+    def __init__(self, chat_id: int, symbol_id: int):
+        self.chat_id = chat_id
+        self.symbol_id = symbol_id
+        self.alerted = False  # алерт диапазона отправлен, пороги сняты с индекса до изменения диапазона
+
+class SymbolEntry:
+    """Символ, на который есть подписки: пара, время последней проверки и подписчики."""
+
+    __slots__ = ("id", "symbol", "base", "quote", "last_check", "subscribers")
+
+    def __init__(self, symbol_id: int, symbol: str, base: str, quote: str):
+        self.id = symbol_id
+        self.symbol = symbol
+        self.base = base
+        self.quote = quote
+        self.last_check = 0.0  # time.time() последнего запроса цены
+        self.subscribers: Dict[int, Subscription] = {}  # chat_id -> подписка
+
+class SubscriptionRegistry:
+    """Подписки всех пользователей с индексами по чату и по символу."""
+
+    def __init__(self):
+        self._symbol_ids: Dict[str, int] = {}
+        self._symbols: List[str] = []  # id -> символ (id не переиспользуются)
+        self._by_symbol: Dict[int, SymbolEntry] = {}
+        self._by_chat: Dict[int, Dict[int, Subscription]] = {}  # chat_id -> symbol_id -> подписка
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, symbol: str) -> bool:
+        """Есть ли у символа подписчики."""
+        symbol_id = self._symbol_ids.get(symbol)
+        return symbol_id is not None and symbol_id in self._by_symbol
+
+    def symbol_id(self, symbol: str) -> int:
+        """Числовой id символа (назначается при первом обращении, строка интернируется)."""
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol = sys.intern(symbol)
+            symbol_id = self._symbol_ids[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+        return symbol_id
+
+    def symbol_name(self, symbol_id: int) -> str:
+        return self._symbols[symbol_id]
+
+    def entry(self, symbol: str) -> Optional[SymbolEntry]:
+        symbol_id = self._symbol_ids.get(symbol)
+        return self._by_symbol.get(symbol_id) if symbol_id is not None else None
+
+    def get(self, chat_id: int, symbol: str) -> Optional[Subscription]:
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            return None
+        chat = self._by_chat.get(chat_id)
+        return chat.get(symbol_id) if chat is not None else None
+
+    def add(self, chat_id: int, base: str, quote: str) -> Tuple[Subscription, bool]:
+        """
+        Подписывает чат на символ пары. Возвращает подписку и признак того,
+        что это первый подписчик символа. Повторная подписка возвращает существующую.
+        """
+        symbol = f"{base}{quote}".upper()
+        symbol_id = self.symbol_id(symbol)
+        entry = self._by_symbol.get(symbol_id)
+        new_symbol = entry is None
+        if new_symbol:
+            entry = self._by_symbol[symbol_id] = SymbolEntry(symbol_id, self._symbols[symbol_id], base, quote)
+        subscription = entry.subscribers.get(chat_id)
+        if subscription is None:
+            subscription = entry.subscribers[chat_id] = Subscription(chat_id, symbol_id)
+            self._by_chat.setdefault(chat_id, {})[symbol_id] = subscription
+            self._count += 1
+        return subscription, new_symbol
+
+    def remove(self, chat_id: int, symbol: str) -> Tuple[Optional[Subscription], bool]:
+        """
+        Удаляет подписку. Возвращает удаленную подписку (None, если ее не было)
+        и признак того, что у символа не осталось подписчиков.
+        """
+        symbol_id = self._symbol_ids.get(symbol)
+        entry = self._by_symbol.get(symbol_id) if symbol_id is not None else None
+        if entry is None:
+            return None, False
+        subscription = entry.subscribers.pop(chat_id, None)
+        if subscription is not None:
+            self._count -= 1
+            chat = self._by_chat[chat_id]
+            del chat[symbol_id]
+            if not chat:
+                del self._by_chat[chat_id]
+        if entry.subscribers:
+            return subscription, False
+        del self._by_symbol[symbol_id]
+        return subscription, True
+
+    def subscribers(self, symbol: str) -> Iterable[int]:
+        """chat_id подписчиков символа."""
+        entry = self.entry(symbol)
+        return entry.subscribers.keys() if entry is not None else ()
+
+    def chat_symbols(self, chat_id: int) -> List[str]:
+        """Символы, на которые подписан чат."""
+        return [self._symbols[symbol_id] for symbol_id in self._by_chat.get(chat_id, ())]
+
+    def symbols(self) -> List[str]:
+        """Символы, у которых есть подписчики."""
+        return [entry.symbol for entry in self._by_symbol.values()]
+
+    def stats(self) -> Dict[str, int]:
+        return {"subscriptions": self._count, "symbols": len(self._by_symbol), "chats": len(self._by_chat)}
+
+subscriptions = SubscriptionRegistry()
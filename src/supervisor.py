@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Супервизор фоновых задач мониторинга.
+"""
+import asyncio
+import logging
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional, Set
+from config import FETCH_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+RESTART_DELAY = 1.0  # секунд, удваивается при повторных падениях
+RESTART_MAX_DELAY = 60.0
+
+class TaskSupervisor:
+    """
+    Владеет всеми фоновыми задачами: учитывает их по видам, перезапускает упавшие,
+    ограничивает число одновременно выполняемых операций на каждом этапе
+    и отменяет все задачи при остановке.
+    """
+
+    def __init__(self, stage_limits: Dict[str, int]):
+        self.tasks: Dict[str, Set[asyncio.Task]] = {}
+        self.restarts: Counter = Counter()
+        self.crashes: Counter = Counter()
+        self._stage_limits = stage_limits
+        self._stages: Dict[str, asyncio.Semaphore] = {}
+        self.in_flight: Counter = Counter()
+        self.waiting: Counter = Counter()
+
+    def spawn(self, kind: str, factory: Callable[[], Awaitable], name: Optional[str] = None,
+              restart: bool = False) -> asyncio.Task:
+        """
+        Запускает задачу вида kind. factory создает корутину заново при каждом запуске,
+        поэтому при restart=True упавшая задача перезапускается с нарастающей задержкой.
+        Нормальное завершение и отмена не перезапускаются.
+        """
+        task = asyncio.create_task(self._run(kind, factory, name or kind, restart), name=name)
+        self.tasks.setdefault(kind, set()).add(task)
+        task.add_done_callback(lambda t: self.tasks.get(kind, set()).discard(t))
+        return task
+
+    async def _run(self, kind: str, factory: Callable[[], Awaitable], name: str, restart: bool):
+        failures = 0
+        while True:
+            try:
+                return await factory()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.crashes[kind] += 1
+                logger.error(f"Задача {name} ({kind}) упала: {e!r}", exc_info=True)
+                if not restart:
+                    return None
+                failures += 1
+                self.restarts[kind] += 1
+                delay = min(RESTART_MAX_DELAY, RESTART_DELAY * 2 ** (failures - 1))
+                logger.info(f"Перезапуск задачи {name} через {delay:.0f} с")
+                await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def stage(self, stage: str):
+        """Ограничивает число одновременных операций этапа (лимит из stage_limits)."""
+        semaphore = self._stages.get(stage)
+        if semaphore is None:
+            semaphore = self._stages[stage] = asyncio.Semaphore(self._stage_limits.get(stage, 10))
+        self.waiting[stage] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting[stage] -= 1
+        self.in_flight[stage] += 1
+        try:
+            yield
+        finally:
+            self.in_flight[stage] -= 1
+            semaphore.release()
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """Живые задачи по видам и загрузка этапов (в работе / ожидают)."""
+        return {
+            "tasks": {kind: len(tasks) for kind, tasks in self.tasks.items() if tasks},
+            "in_flight": {stage: n for stage, n in self.in_flight.items() if n},
+            "waiting": {stage: n for stage, n in self.waiting.items() if n},
+            "restarts": dict(self.restarts),
+        }
+
+    async def run_reporter(self, interval: float, extra: Optional[Callable[[], Dict]] = None) -> None:
+        """Периодически пишет в лог число задач и загрузку этапов."""
+        while True:
+            await asyncio.sleep(interval)
+            counts = self.counts()
+            if extra is not None:
+                counts.update(extra())
+            logger.info(f"📊 Фоновые задачи: {counts}")
+
+    async def shutdown(self, timeout: float = 5.0) -> None:
+        """Отменяет все задачи и ждет их завершения."""
+        tasks = [task for kind_tasks in self.tasks.values() for task in kind_tasks]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        logger.info(f"Остановлено фоновых задач: {len(tasks)}")
+
+supervisor = TaskSupervisor({"fetch": FETCH_CONCURRENCY})
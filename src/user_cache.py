@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Загрузка пар пользователей по запросу.
+
+При старте в память (user_settings) загружаются только пользователи с алертами:
+их пары должны проверяться постоянно. Остальные загружаются из базы при первом
+обновлении от пользователя и выгружаются после USER_IDLE_TTL секунд бездействия,
+поэтому время старта и память зависят от числа активных пользователей, а не всех.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, Optional, Set
+from telegram import Bot
+from config import STORAGE_LOAD_MODE, USER_IDLE_TTL
+from models import UserPairs, user_settings, user_states
+from storage import load_user, storage_saver, supports_lazy_loading
+
+logger = logging.getLogger(__name__)
+
+class UserCache:
+    """Учет загруженных пользователей и их последней активности."""
+
+    def __init__(self, idle_ttl: float = USER_IDLE_TTL, lazy: Optional[bool] = None):
+        self.idle_ttl = idle_ttl
+        self.lazy = lazy if lazy is not None else STORAGE_LOAD_MODE == "lazy" and supports_lazy_loading()
+        self.loaded: Set[int] = set()         # пользователи, чьи пары уже в user_settings
+        self.last_seen: Dict[int, float] = {}  # chat_id -> время последнего обновления
+        self._loading: Dict[int, asyncio.Task] = {}  # загрузки из базы, которые еще идут
+        # Метрики
+        self.loads = 0
+        self.evictions = 0
+
+    def mark_loaded(self, chat_ids: Iterable[int]) -> None:
+        """Отмечает пользователей, загруженных при старте."""
+        now = time.time()
+        for chat_id in chat_ids:
+            self.loaded.add(chat_id)
+            self.last_seen[chat_id] = now
+
+    async def ensure_loaded(self, chat_id: int, bot: Bot) -> None:
+        """Загружает пары пользователя и восстанавливает их мониторинг, если они еще не в памяти."""
+        self.last_seen[chat_id] = time.time()
+        if not self.lazy or chat_id in self.loaded:
+            return
+        task = self._loading.get(chat_id)
+        if task is None:
+            task = self._loading[chat_id] = asyncio.ensure_future(self._load(chat_id, bot))
+            task.add_done_callback(lambda _: self._loading.pop(chat_id, None))
+        # Одновременные обновления одного пользователя ждут одну загрузку
+        await asyncio.shield(task)
+
+    async def _load(self, chat_id: int, bot: Bot) -> None:
+        pairs = await asyncio.to_thread(load_user, chat_id)
+        # Отмечаем только после успешного чтения: при ошибке следующее обновление повторит загрузку
+        self.loaded.add(chat_id)
+        self.loads += 1
+        if not pairs:
+            return
+        merged = UserPairs(pairs)
+        for pair in user_settings.get(chat_id, ()):
+            merged.add(pair)
+        user_settings[chat_id] = merged
+        from monitoring import restore_subscriptions
+        await restore_subscriptions({chat_id: pairs}, bot)
+        logger.info(f"Пользователь {chat_id} загружен по запросу: {len(pairs)} пар")
+
+    def _is_idle(self, chat_id: int, now: float) -> bool:
+        if now - self.last_seen.get(chat_id, 0.0) < self.idle_ttl:
+            return False
+        if chat_id in user_states and user_states[chat_id].current_action:
+            return False  # пользователь не закончил диалог
+        return not any(pair.has_alerts for pair in user_settings.get(chat_id, ()))
+
+    async def evict_idle(self, now: Optional[float] = None) -> int:
+        """Выгружает бездействующих пользователей без алертов. Возвращает их число."""
+        if not self.lazy:
+            return 0
+        now = now if now is not None else time.time()
+        idle = [chat_id for chat_id in self.loaded if self._is_idle(chat_id, now)]
+        if not idle:
+            return 0
+        seen = {chat_id: self.last_seen.get(chat_id) for chat_id in idle}
+        # Несохраненные изменения выгружаемых пользователей должны попасть в базу
+        await storage_saver.flush()
+        # Пока шла запись, пользователь мог написать боту или изменить пары:
+        # такого пользователя оставляем в памяти до следующей проверки
+        now = max(now, time.time())
+        idle = [
+            chat_id for chat_id in idle
+            if chat_id in self.loaded and self.last_seen.get(chat_id) == seen[chat_id]
+            and self._is_idle(chat_id, now) and not storage_saver.has_pending(chat_id)
+        ]
+        if not idle:
+            return 0
+        from monitoring import stop_price_monitoring
+        for chat_id in idle:
+            for pair in user_settings.pop(chat_id, ()):
+                await stop_price_monitoring(chat_id, pair.base, pair.quote)
+            user_states.pop(chat_id, None)
+            self.loaded.discard(chat_id)
+            self.last_seen.pop(chat_id, None)
+        self.evictions += len(idle)
+        logger.info(f"Выгружено бездействующих пользователей: {len(idle)} (в памяти: {len(self.loaded)})")
+        return len(idle)
+
+    async def run_eviction_loop(self, interval: Optional[float] = None) -> None:
+        """Периодически выгружает бездействующих пользователей."""
+        interval = interval or max(60.0, self.idle_ttl / 10)
+        while True:
+            await asyncio.sleep(interval)
+            await self.evict_idle()
+
+    def stats(self) -> Dict[str, int]:
+        return {"lazy": self.lazy, "loaded": len(self.loaded), "loads": self.loads, "evictions": self.evictions}
+
+user_cache = UserCache()
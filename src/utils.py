@@ -4,13 +4,24 @@
 """
 import asyncio
 import aiohttp
+import random
 import time
 import logging
-from typing import Optional, Tuple
-from config import API_TIMEOUT, MAX_RETRIES, RETRY_DELAY
+from typing import Any, Dict, List, Optional, Tuple
+from config import (
+    API_TIMEOUT, MAX_RETRIES, RETRY_DELAY, BINANCE_API_URL,
+    BATCH_WINDOW, BATCH_CHUNK_SIZE
+)
+from supervisor import supervisor
+from governor import governor, CircuitOpenError, RequestGovernor
 
 logger = logging.getLogger(__name__)
 
+# Вес запросов Binance (https://binance-docs.github.io/apidocs/spot/en/#limits)
+WEIGHT_BOOK_TICKER = 2        # bookTicker одного символа
+WEIGHT_BOOK_TICKER_MULTI = 4  # bookTicker списка символов или всех символов
+WEIGHT_EXCHANGE_INFO = 20
+
 # Глобальный пул соединений для оптимизации HTTP запросов
 _http_session = None
 
@@ -39,114 +50,212 @@ async def close_http_session():
         await _http_session.close()
         _http_session = None
 
-async def get_crypto_price(base: str, quote: str) -> Optional[float]:
+async def binance_get(path: str, params: Optional[Dict[str, str]] = None,
+                      weight: int = WEIGHT_BOOK_TICKER, base_url: str = BINANCE_API_URL,
+                      request_governor: RequestGovernor = governor) -> Tuple[Optional[int], Any]:
     """
-    Получает текущую цену пары криптовалют.
-    Сначала пробует Binance, если не найдено - использует Binance USD цены.
+    GET запрос к Binance (base_url - основной хост или зеркало) через бюджет веса и выключатель.
+    Возвращает (статус, JSON при статусе 200). Таймауты, сетевые ошибки и прочие
+    неуспешные статусы повторяются с экспоненциальной задержкой и джиттером;
+    4xx, 418, 429 и 5xx не повторяются. (None, None) - ответа нет или выключатель разомкнут.
     """
-    symbol = f"{base}{quote}".upper()
-    
-    # Проверяем, является ли это символом, который нужно получать через USD цены
-    # Убираем циклический импорт - проверяем напрямую
-    usd_symbols = ["BTCSOL", "SOLBTC", "ETHBTC", "BNBBTC"]  # Символы, недоступные на Binance
-    if symbol in usd_symbols:
-        logger.debug(f"Получение цены {symbol} через Binance USD (недоступно на Binance)")
-        return await get_crypto_price_binance_usd(base, quote)
-    
-    # Специальная обработка для BTC/SOL - получаем через обратный перевод SOL/BTC
-    if symbol == "BTCSOL":
-        logger.debug(f"Получение цены {symbol} через обратный перевод SOL/BTC...")
-        return await get_btc_sol_reverse()
-    
-    # Специальная обработка для SOL/BTC - получаем напрямую с Binance
-    if symbol == "SOLBTC":
-        logger.debug(f"Получение цены {symbol} напрямую с Binance...")
-        return await get_sol_btc_direct()
-    
+    url = f"{base_url}{path}"
+    status = None
     for attempt in range(MAX_RETRIES):
+        if attempt:
+            await asyncio.sleep(RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        try:
+            await request_governor.acquire(weight)
+        except CircuitOpenError as e:
+            logger.debug(f"Запрос {path} не отправлен: {e}")
+            return None, None
         try:
-            url = f"https://api.binance.com/api/v3/ticker/bookTicker?symbol={symbol}"
-            
             session = await get_http_session()
-            async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        if "bidPrice" in data and "askPrice" in data:
-                            bid = float(data["bidPrice"])
-                            ask = float(data["askPrice"])
-                            mid_price = (bid + ask) / 2
-                            return mid_price
-                        else:
-                            return None
-                    elif response.status == 400:
-                        # Символ не найден на Binance, пробуем через USD цены
-                        logger.debug(f"Пара {symbol} не найдена на Binance, пробуем через USD цены...")
-                        return await get_crypto_price_binance_usd(base, quote)
-                    else:
-                        return None
-                    
+            async with session.get(url, params=params) as response:
+                status = response.status
+                request_governor.record(status, response.headers)
+                if status == 200:
+                    return status, await response.json()
+                if 400 <= status < 600:
+                    return status, None
+                logger.warning(f"Ошибка Binance API {path}: {status}")
+        except asyncio.CancelledError:
+            request_governor.record_cancel()
+            raise
         except asyncio.TimeoutError:
-            if attempt < MAX_RETRIES - 1:
-                await asyncio.sleep(RETRY_DELAY)
+            request_governor.record_error()
+            logger.warning(f"Таймаут запроса Binance {path}, попытка {attempt + 1}")
         except Exception as e:
-            if attempt < MAX_RETRIES - 1:
-                await asyncio.sleep(RETRY_DELAY)
+            request_governor.record_error()
+            logger.error(f"Ошибка запроса Binance {path}: {e}")
+    return status, None
+
+async def get_crypto_price(base: str, quote: str) -> Optional[float]:
+    """
+    Получает текущую цену пары криптовалют.
+    Маршрут выбирается заранее по каталогу символов биржи: прямая пара, обратная
+    пара (1 / цена) или синтетическая пара через Binance USD цены.
+    """
+    from catalog import symbol_catalog, ROUTE_INVERSE, ROUTE_SYNTHETIC
+    
+    route, symbol = symbol_catalog.route(base, quote)
+    if route == ROUTE_SYNTHETIC:
+        logger.debug(f"Пары {base}{quote} нет на Binance, получаем через USD цены")
+        return await get_crypto_price_binance_usd(base, quote)
     
-    # Если Binance не сработал, пробуем через USD цены
-    logger.debug(f"Binance не сработал для {symbol}, пробуем через USD цены...")
+    prices = await fetch_book_tickers([symbol])
+    mid_price = prices.get(symbol)
+    if mid_price is not None:
+        return 1.0 / mid_price if route == ROUTE_INVERSE else mid_price
+    
+    # Символа нет на Binance или биржа не ответила - пробуем через USD цены
+    logger.debug(f"Binance не вернул цену {symbol}, пробуем через USD цены...")
     return await get_crypto_price_binance_usd(base, quote)
 
 
 async def get_crypto_price_binance_usd(base: str, quote: str) -> Optional[float]:
     """
     Получает цену пары криптовалют через Binance USD цены.
-    Максимально точный метод - как у CoinMarketCap.
+    Цена вычисляется движком кросс-курсов из общего вектора цен в USDT,
+    поэтому стоимость не зависит от числа таких пар и их подписчиков.
     """
-    for attempt in range(MAX_RETRIES):
+    from cross_rates import cross_rates
+    
+    price = await cross_rates.get_price(base, quote)
+    if price is None:
+        logger.error(f"Не удалось вычислить цену {base}/{quote} через кросс-курсы")
+        return None
+    logger.debug(f"Получена цена {base}/{quote} через кросс-курсы: {price:.8f}")
+    return price
+
+def parse_book_tickers(data: List[dict]) -> Dict[str, float]:
+    """Разбирает ответ bookTicker за один проход: symbol -> средняя цена (bid + ask) / 2."""
+    prices = {}
+    for item in data:
         try:
-            session = await get_http_session()
-            # Получаем цены обеих валют в USDT через Binance
-            base_url = f"https://api.binance.com/api/v3/ticker/price?symbol={base.upper()}USDT"
-            quote_url = f"https://api.binance.com/api/v3/ticker/price?symbol={quote.upper()}USDT"
-            
-            # Делаем параллельные запросы
-            async with session.get(base_url) as base_response, \
-                     session.get(quote_url) as quote_response:
-                
-                if base_response.status == 200 and quote_response.status == 200:
-                    base_data = await base_response.json()
-                    quote_data = await quote_response.json()
-                    
-                    base_price_usdt = float(base_data["price"])
-                    quote_price_usdt = float(quote_data["price"])
-                    
-                    if quote_price_usdt > 0:
-                        # Вычисляем цену base/quote
-                        price = base_price_usdt / quote_price_usdt
-                        logger.debug(f"Получена цена {base}/{quote} через Binance USD: {price:.8f}")
-                        return price
-                    else:
-                        logger.warning(f"Нулевая цена quote для {base}/{quote}")
-                        return None
-                else:
-                    logger.warning(f"Ошибка Binance API: base={base_response.status}, quote={quote_response.status}")
-                    if attempt < MAX_RETRIES - 1:
-                        await asyncio.sleep(RETRY_DELAY)
-                        
-        except asyncio.TimeoutError:
-            logger.warning(f"Таймаут Binance для {base}/{quote}, попытка {attempt + 1}")
-            if attempt < MAX_RETRIES - 1:
-                await asyncio.sleep(RETRY_DELAY)
-        except Exception as e:
-            logger.error(f"Ошибка при получении цены {base}/{quote} через Binance: {e}")
-            if attempt < MAX_RETRIES - 1:
-                await asyncio.sleep(RETRY_DELAY)
+            bid = float(item["bidPrice"])
+            ask = float(item["askPrice"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if bid > 0 and ask > 0:
+            prices[item["symbol"]] = (bid + ask) / 2
+    return prices
+
+async def fetch_book_tickers(symbols: Optional[List[str]] = None) -> Dict[str, float]:
+    """
+    Получает цены нескольких символов одним запросом к Binance bookTicker.
+    Без списка символов возвращает цены всех пар биржи.
+    Запрос идет через провайдеров цен: если основной хост не ответил вовремя,
+    запрос дублируется на зеркало. Пустой словарь - цены получить не удалось.
+    """
+    from providers import price_providers
+    
+    prices = await price_providers.book_tickers(symbols)
+    return prices if prices is not None else {}
+
+class BatchFailedError(Exception):
+    """Пакетный запрос цен, в который попал символ, не удался (биржа не ответила)."""
+
+class PriceBatcher:
+    """
+    Собирает запросы цен, пришедшие в течение BATCH_WINDOW, и выполняет их
+    одним или несколькими пакетными запросами по BATCH_CHUNK_SIZE символов.
+    """
     
-    logger.error(f"Не удалось получить цену {base}/{quote} через Binance после {MAX_RETRIES} попыток")
-    return None
+    def __init__(self, window: float = BATCH_WINDOW, chunk_size: int = BATCH_CHUNK_SIZE):
+        self.window = window
+        self.chunk_size = chunk_size
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.batches_sent = 0
+        self.batches_failed = 0
+        self.symbols_requested = 0
+    
+    async def get(self, symbol: str) -> Optional[float]:
+        """
+        Ставит символ в текущий пакет и ждет его цену. None - биржа ответила,
+        но символа в ответе нет; BatchFailedError - пакет с символом не удался.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(symbol, []).append(future)
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._start_flush)
+        return await future
+    
+    def _start_flush(self) -> None:
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            supervisor.spawn("batch", lambda: self._flush(pending))
+    
+    async def _fetch_chunk(self, chunk: List[str]) -> Optional[Dict[str, float]]:
+        from providers import price_providers
+        async with supervisor.stage("fetch"):
+            return await price_providers.book_tickers(chunk)
+    
+    async def _flush(self, pending: Dict[str, List[asyncio.Future]]) -> None:
+        symbols = list(pending)
+        chunks = [symbols[i:i + self.chunk_size] for i in range(0, len(symbols), self.chunk_size)]
+        self.batches_sent += len(chunks)
+        self.symbols_requested += len(symbols)
+        
+        try:
+            results = await asyncio.gather(*(self._fetch_chunk(chunk) for chunk in chunks), return_exceptions=True)
+            for chunk, prices in zip(chunks, results):
+                if isinstance(prices, Exception):
+                    logger.error(f"Ошибка пакетного получения цен: {prices}")
+                    prices = None
+                if prices is None:
+                    self.batches_failed += 1
+                    continue
+                for symbol in chunk:
+                    for future in pending[symbol]:
+                        if not future.done():
+                            future.set_result(prices.get(symbol))
+            logger.debug(f"Пакет: {len(symbols)} символов, {len(chunks)} запросов")
+        finally:
+            # Символы неудавшихся запросов (или всего пакета, если его отменили)
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(BatchFailedError())
 
+_price_batcher = PriceBatcher()
+
+async def get_crypto_price_batched(base: str, quote: str) -> Optional[float]:
+    """
+    Получает цену пары через общий пакет запросов.
+    В пакет попадают только символы, которые есть в каталоге биржи; синтетические
+    пары считаются через кросс-курсы. Если пакет не удался, возвращается None:
+    отдельные запросы по каждому символу только умножили бы нагрузку на биржу.
+    Через get_crypto_price получаются только символы, неизвестные каталогу.
+    """
+    from catalog import symbol_catalog, ROUTE_INVERSE, ROUTE_SYNTHETIC
+    
+    route, symbol = symbol_catalog.route(base, quote)
+    if route == ROUTE_SYNTHETIC:
+        return await get_crypto_price_binance_usd(base, quote)
+    
+    try:
+        price = await _price_batcher.get(symbol)
+    except BatchFailedError:
+        return None
+    if price is not None:
+        return 1.0 / price if route == ROUTE_INVERSE else price
+    if symbol in symbol_catalog.symbols:
+        # Символ торгуется, но не пришел в ответе - цена будет на следующей проверке
+        return None
+    return await get_crypto_price(base, quote)
 
+def format_age(seconds: float) -> str:
+    """Форматирует возраст цены: '12 с', '3 мин', '2 ч'."""
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds} с"
+    if seconds < 3600:
+        return f"{seconds // 60} мин"
+    return f"{seconds // 3600} ч"
 
 def validate_price(price_str: str) -> Tuple[bool, Optional[float], Optional[str]]:
     """
@@ -171,55 +280,3 @@ def validate_price(price_str: str) -> Tuple[bool, Optional[float], Optional[str]
         return True, price, None
     except (ValueError, InvalidOperation):
         return False, None, "Некорректный формат числа"
-
-async def get_sol_btc_direct() -> Optional[float]:
-    """
-    Получает цену SOL/BTC напрямую с Binance.
-    """
-    for attempt in range(MAX_RETRIES):
-        try:
-            url = "https://api.binance.com/api/v3/ticker/price?symbol=SOLBTC"
-            session = await get_http_session()
-            async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        price = float(data["price"])
-                        logger.debug(f"Получена цена SOL/BTC с Binance: {price:.8f}")
-                        return price
-                    elif response.status == 400:
-                        logger.warning("Пара SOL/BTC не найдена на Binance")
-                        return None
-                    else:
-                        logger.warning(f"Binance API ошибка: {response.status}")
-                        if attempt < MAX_RETRIES - 1:
-                            await asyncio.sleep(RETRY_DELAY)
-        except asyncio.TimeoutError:
-            logger.warning(f"Таймаут Binance для SOL/BTC, попытка {attempt + 1}")
-            if attempt < MAX_RETRIES - 1:
-                await asyncio.sleep(RETRY_DELAY)
-        except Exception as e:
-            logger.error(f"Ошибка Binance API для SOL/BTC: {e}")
-            if attempt < MAX_RETRIES - 1:
-                await asyncio.sleep(RETRY_DELAY)
-    
-    logger.error(f"Не удалось получить SOL/BTC с Binance после {MAX_RETRIES} попыток")
-    return None
-
-async def get_btc_sol_reverse() -> Optional[float]:
-    """
-    Получает цену BTC/SOL через обратный перевод от SOL/BTC.
-    """
-    # Получаем цену SOL/BTC напрямую
-    sol_btc_price = await get_sol_btc_direct()
-    
-    if sol_btc_price is not None and sol_btc_price > 0:
-        # Вычисляем обратную цену BTC/SOL
-        btc_sol_price = 1.0 / sol_btc_price
-        logger.debug(f"Вычислена цена BTC/SOL: {btc_sol_price:.8f} (из SOL/BTC: {sol_btc_price:.8f})")
-        return btc_sol_price
-    else:
-        logger.warning("Не удалось получить SOL/BTC для вычисления BTC/SOL")
-        return None
-
-
-
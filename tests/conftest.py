@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Общие настройки тестов: модули бота из src/, токен-заглушка для config
+и запуск асинхронных сценариев.
+
+    python -m pytest -q tests
+"""
+import asyncio
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "test")
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "tests")]
+
+@pytest.fixture
+def run():
+    """Выполняет корутину в новом цикле событий и закрывает общую HTTP сессию после нее."""
+    from utils import close_http_session
+
+    async def scenario(coro):
+        try:
+            return await coro
+        finally:
+            await close_http_session()
+
+    return lambda coro: asyncio.run(scenario(coro))
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Локальные заглушки внешних сервисов для тестов и офлайн-отладки бота.
+
+Запуск заглушки потоков Binance:
+    python tests/fakes.py stream --port 9443
+и затем бота с PRICE_SOURCE=stream BINANCE_WS_URL=ws://127.0.0.1:9443
+
+Запуск заглушки REST API Binance:
+    python tests/fakes.py rest --port 8080 [--weight-limit 6000]
+и затем бота с BINANCE_API_URL=http://127.0.0.1:8080
+
+В тестах заглушки запускаются с port=0 (свободный порт), адрес - в атрибуте url.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from aiohttp import web, WSMsgType
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRICES = {
+    "BTCUSDT": 65000.0, "ETHUSDT": 3200.0, "SOLUSDT": 150.0, "BNBUSDT": 580.0,
+    "XRPUSDT": 0.52, "ADAUSDT": 0.45, "DOGEUSDT": 0.12, "SOLBTC": 0.0023, "ETHBTC": 0.049,
+}
+
+def _bound_port(runner: web.AppRunner) -> int:
+    """Порт, который получил сервер (при port=0 - выбранный системой)."""
+    return runner.addresses[0][1]
+
+class FakeMarket:
+    """Случайное блуждание цен для заглушек биржи."""
+
+    def __init__(self, prices: Optional[Dict[str, float]] = None, volatility: float = 0.001):
+        self.prices = dict(prices or DEFAULT_PRICES)
+        self.volatility = volatility
+
+    def step(self, symbol: str) -> float:
+        price = self.prices[symbol] * (1 + random.gauss(0, self.volatility))
+        self.prices[symbol] = price
+        return price
+
+    def book_ticker(self, symbol: str) -> dict:
+        price = self.prices[symbol]
+        return {
+            "symbol": symbol,
+            "bidPrice": f"{price * 0.9999:.8f}", "bidQty": "1.00000000",
+            "askPrice": f"{price * 1.0001:.8f}", "askQty": "1.00000000",
+        }
+
+class FakeBinanceStreamServer:
+    """
+    Заглушка Binance combined streams: /stream с SUBSCRIBE/UNSUBSCRIBE/LIST_SUBSCRIPTIONS
+    и рассылкой <symbol>@bookTicker по случайному блужданию цен.
+    """
+
+    def __init__(self, market: Optional[FakeMarket] = None, tick_interval: float = 0.1):
+        self.market = market or FakeMarket()
+        self.tick_interval = tick_interval
+        self.clients: Dict[web.WebSocketResponse, Set[str]] = {}
+        self.control_messages = 0
+        self.connections = 0
+        self.url = ""
+        self._runner: Optional[web.AppRunner] = None
+        self._ticker: Optional[asyncio.Task] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 9443) -> None:
+        app = web.Application()
+        app.router.add_get("/stream", self._handle_ws)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.url = f"ws://{host}:{_bound_port(self._runner)}"
+        self._ticker = asyncio.create_task(self._tick())
+        logger.info(f"Заглушка потоков Binance: {self.url}/stream")
+
+    async def stop(self) -> None:
+        if self._ticker:
+            self._ticker.cancel()
+        await self.drop_connections()
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def drop_connections(self) -> None:
+        """Разрывает все соединения (проверка переподключения клиента)."""
+        for ws in list(self.clients):
+            await ws.close()
+
+    async def _handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams: Set[str] = set(filter(None, request.query.get("streams", "").split("/")))
+        self.clients[ws] = streams
+        self.connections += 1
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                request_data = json.loads(message.data)
+                self.control_messages += 1
+                method = request_data.get("method")
+                params = request_data.get("params", [])
+                result = None
+                if method == "SUBSCRIBE":
+                    streams.update(params)
+                elif method == "UNSUBSCRIBE":
+                    streams.difference_update(params)
+                elif method == "LIST_SUBSCRIPTIONS":
+                    result = sorted(streams)
+                await ws.send_str(json.dumps({"result": result, "id": request_data.get("id")}))
+        finally:
+            self.clients.pop(ws, None)
+        return ws
+
+    async def _tick(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            for ws, streams in list(self.clients.items()):
+                for stream in list(streams):
+                    symbol = stream.split("@")[0].upper()
+                    if symbol not in self.market.prices:
+                        continue
+                    self.market.step(symbol)
+                    ticker = self.market.book_ticker(symbol)
+                    data = {"u": 0, "s": symbol, "b": ticker["bidPrice"], "B": ticker["bidQty"],
+                            "a": ticker["askPrice"], "A": ticker["askQty"]}
+                    try:
+                        await ws.send_str(json.dumps({"stream": stream, "data": data}))
+                    except ConnectionResetError:
+                        break
+
+INVALID_SYMBOL = {"code": -1121, "msg": "Invalid symbol."}
+
+class FakeBinanceRestServer:
+    """
+    Заглушка REST API Binance: /api/v3/ticker/bookTicker и /api/v3/exchangeInfo.
+    Считает вес запросов за минуту и возвращает его в X-MBX-USED-WEIGHT-1M,
+    при превышении weight_limit отвечает 429 с Retry-After. Через fail_next можно
+    заставить сервер ответить заданным статусом (418, 429, 5xx) на несколько запросов.
+    Задержка ответа - latency, с вероятностью spike_probability - spike_latency.
+    """
+
+    def __init__(self, market: Optional[FakeMarket] = None, weight_limit: int = 6000,
+                 latency: float = 0.0, spike_latency: float = 0.0, spike_probability: float = 0.0):
+        self.market = market or FakeMarket()
+        self.weight_limit = weight_limit
+        self.latency = latency
+        self.spike_latency = spike_latency
+        self.spike_probability = spike_probability
+        self.used_weight = 0
+        self.requests = 0
+        self.statuses: Dict[int, int] = {}
+        self._window = int(time.time() // 60)
+        self._failures: Deque[Tuple[int, Optional[int]]] = deque()
+        self.url = ""
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        app = web.Application()
+        app.router.add_get("/api/v3/ticker/bookTicker", self._handle_book_ticker)
+        app.router.add_get("/api/v3/exchangeInfo", self._handle_exchange_info)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.url = f"http://{host}:{_bound_port(self._runner)}"
+        logger.info(f"Заглушка REST API Binance: {self.url}")
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    def fail_next(self, status: int, count: int = 1, retry_after: Optional[int] = None) -> None:
+        """Следующие count запросов получат ответ status (с заголовком Retry-After, если задан)."""
+        self._failures.extend([(status, retry_after)] * count)
+
+    def _respond(self, weight: int, payload, status: int = 200) -> web.Response:
+        self.requests += 1
+        window = int(time.time() // 60)
+        if window != self._window:
+            self._window = window
+            self.used_weight = 0
+        self.used_weight += weight
+        headers = {"X-MBX-USED-WEIGHT-1M": str(self.used_weight)}
+        retry_after = None
+        if self._failures:
+            status, retry_after = self._failures.popleft()
+        elif self.used_weight > self.weight_limit:
+            status, retry_after = 429, 60 - int(time.time() % 60)
+        if retry_after is not None:
+            headers["Retry-After"] = str(retry_after)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status != 200 and status != 400:
+            payload = {"code": -1003, "msg": "fake error"}
+        return web.json_response(payload, status=status, headers=headers)
+
+    async def _delay(self) -> None:
+        if self.spike_probability and random.random() < self.spike_probability:
+            await asyncio.sleep(self.spike_latency)
+        elif self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _handle_book_ticker(self, request: web.Request) -> web.Response:
+        await self._delay()
+        if "symbol" in request.query:
+            symbol = request.query["symbol"]
+            if symbol not in self.market.prices:
+                return self._respond(2, INVALID_SYMBOL, status=400)
+            return self._respond(2, self.market.book_ticker(symbol))
+        if "symbols" in request.query:
+            symbols = json.loads(request.query["symbols"])
+            if any(symbol not in self.market.prices for symbol in symbols):
+                return self._respond(4, INVALID_SYMBOL, status=400)
+        else:
+            symbols = list(self.market.prices)
+        return self._respond(4, [self.market.book_ticker(symbol) for symbol in symbols])
+
+    async def _handle_exchange_info(self, request: web.Request) -> web.Response:
+        await self._delay()
+        symbols = []
+        for symbol in self.market.prices:
+            for quote in ("USDT", "BTC", "ETH", "BNB"):
+                if symbol.endswith(quote) and len(symbol) > len(quote):
+                    symbols.append({"symbol": symbol, "status": "TRADING",
+                                    "baseAsset": symbol[:-len(quote)], "quoteAsset": quote})
+                    break
+        return self._respond(20, {"symbols": symbols})
+
+class FakeBot:
+    """
+    Заглушка telegram.Bot для нагрузочной проверки отправки без сети.
+    Имитирует задержку API и лимиты Telegram: при превышении общего лимита
+    или лимита на чат выбрасывает RetryAfter.
+    """
+
+    def __init__(self, latency: float = 0.05, global_rate: int = 30, chat_rate: int = 1,
+                 retry_after: int = 1):
+        self.latency = latency
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.retry_after = retry_after
+        self.sent: List[Tuple[int, str, float]] = []  # (chat_id, text, время)
+        self.rejected = 0
+        self._recent: Deque[float] = deque()
+        self._chat_recent: Dict[int, Deque[float]] = {}
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> dict:
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 1.0:
+            self._recent.popleft()
+        chat_recent = self._chat_recent.setdefault(chat_id, deque())
+        while chat_recent and now - chat_recent[0] >= 1.0:
+            chat_recent.popleft()
+        if len(self._recent) >= self.global_rate or len(chat_recent) >= self.chat_rate:
+            self.rejected += 1
+            raise RetryAfter(self.retry_after)
+        self._recent.append(now)
+        chat_recent.append(now)
+        self.sent.append((chat_id, text, now))
+        return {"chat_id": chat_id, "text": text}
+
+async def _serve(args: argparse.Namespace) -> None:
+    if args.service == "stream":
+        server = FakeBinanceStreamServer(tick_interval=args.tick)
+    else:
+        server = FakeBinanceRestServer(weight_limit=args.weight_limit)
+    await server.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Локальные заглушки Binance/Telegram")
+    parser.add_argument("service", choices=["stream", "rest"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9443)
+    parser.add_argument("--tick", type=float, default=0.1, help="интервал рассылки цен (секунды)")
+    parser.add_argument("--weight-limit", type=int, default=6000, help="лимит веса запросов в минуту (rest)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
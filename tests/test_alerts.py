@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Индексы алертов символа: границы диапазонов (включая равенство порогу) и алерты движения.
+"""
+from alerts import AlertIndex, MoveAlertIndex, ALERT_MAX, ALERT_MIN
+
+def _index() -> AlertIndex:
+    index = AlertIndex()
+    index.set(1, 90.0, 110.0)
+    index.set(2, 95.0, 105.0)
+    index.set(3, None, 100.0)
+    index.set(4, 100.0, None)
+    return index
+
+def test_price_inside_all_ranges_triggers_nothing():
+    index = _index()
+    index.remove(3)
+    index.remove(4)
+    assert index.triggered(100.0) == []
+    assert index.nearest(100.0) == (95.0, 105.0)
+
+def test_equality_at_min_and_max_triggers():
+    index = _index()
+    assert sorted(index.triggered(95.0)) == [(2, ALERT_MIN), (4, ALERT_MIN)]
+    assert sorted(index.triggered(110.0)) == [(1, ALERT_MAX), (2, ALERT_MAX), (3, ALERT_MAX)]
+    assert sorted(index.triggered(100.0)) == [(3, ALERT_MAX), (4, ALERT_MIN)]
+    assert index.triggered(90.0) == [(1, ALERT_MIN), (2, ALERT_MIN), (4, ALERT_MIN)]
+    assert sorted(index.triggered(110.0 - 1e-9)) == [(2, ALERT_MAX), (3, ALERT_MAX)]  # чуть ниже максимума 1
+
+def test_equal_thresholds_are_removed_by_subscription():
+    index = AlertIndex()
+    for sub_id in (1, 2, 3):
+        index.set(sub_id, 100.0, None)
+    index.remove(2)
+    index.set(3, None, 200.0)  # замена диапазона
+    assert index.triggered(100.0) == [(1, ALERT_MIN)]
+    assert index.triggered(200.0) == [(3, ALERT_MAX)]
+    assert len(index) == 2 and 2 not in index
+
+def test_move_alerts_trigger_at_threshold_once_per_window():
+    index = MoveAlertIndex()
+    index.set(1, 2.0, 300)
+    index.set(2, 5.0, 300)
+    index.set(3, 2.0, 900)
+    assert sorted(index.windows()) == [300, 900]
+    assert index.triggered(300, 1.9, now=0.0) == []
+    assert index.triggered(300, 2.0, now=0.0) == [(1, 2.0)]  # равенство порогу срабатывает
+    assert index.triggered(300, 6.0, now=10.0) == [(2, 5.0)]  # 1 молчит до конца окна
+    assert index.triggered(300, 6.0, now=301.0) == [(1, 2.0)]
+
+    index.remove(3)
+    assert index.windows() == [300]
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Каталог символов: повтор загрузки exchangeInfo, пока каталог пуст.
+"""
+import asyncio
+import catalog
+from catalog import SymbolCatalog
+
+class FlakyCatalog(SymbolCatalog):
+    """exchangeInfo недоступен первые failures попыток."""
+
+    def __init__(self, path, failures: int):
+        super().__init__(path)
+        self.failures = failures
+        self.calls = 0
+
+    async def refresh(self) -> bool:
+        self.calls += 1
+        if self.calls <= self.failures:
+            return False
+        self._set_symbols({"BTCUSDT": ("BTC", "USDT")}, 0.0)
+        return True
+
+def test_empty_catalog_is_retried_with_backoff(run, monkeypatch, tmp_path):
+    monkeypatch.setattr(catalog, "CATALOG_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(catalog, "CATALOG_REFRESH_INTERVAL", 3600)
+    symbols = FlakyCatalog(str(tmp_path / "exchange_info.json"), failures=3)
+
+    async def scenario():
+        loop = asyncio.ensure_future(symbols.run_refresh_loop())
+        await asyncio.sleep(0.5)  # паузы 0.01 + 0.02 + 0.04 + 0.08, затем полный интервал
+        loop.cancel()
+        await asyncio.gather(loop, return_exceptions=True)
+
+    run(scenario())
+    assert symbols.calls == 4 and symbols.loaded
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Движок кросс-курсов: пересчет через USDT, монеты подписок и пауза после неудачного обновления.
+"""
+import pytest
+import cross_rates
+from catalog import symbol_catalog
+from cross_rates import CrossRateEngine
+
+TICKERS = {"BTCUSDT": 65000.0, "ETHUSDT": 3200.0, "SOLBTC": 0.0023}
+
+class FakeTickers:
+    """Подмена fetch_book_tickers: считает запросы всех цен."""
+
+    def __init__(self, tickers):
+        self.tickers = tickers
+        self.calls = 0
+
+    async def __call__(self, symbols=None):
+        self.calls += 1
+        return dict(self.tickers)
+
+def test_prices_through_usdt_and_bridge(run, monkeypatch):
+    monkeypatch.setattr(cross_rates, "fetch_book_tickers", FakeTickers(TICKERS))
+    engine = CrossRateEngine(["SOL"])
+    assert run(engine.get_price("ETH", "BTC")) == pytest.approx(3200 / 65000)
+    assert engine.price("SOL", "USDT") == pytest.approx(0.0023 * 65000)  # через посредника BTC
+    assert engine.price("DOGE", "USDT") is None
+
+def test_failed_refresh_is_not_repeated_every_call(run, monkeypatch):
+    fetch = FakeTickers({})
+    monkeypatch.setattr(cross_rates, "fetch_book_tickers", fetch)
+    engine = CrossRateEngine([], ttl=5)
+
+    async def scenario():
+        for _ in range(5):
+            assert await engine.get_price("BTC", "ETH") is None
+        assert fetch.calls == 1 and engine.failures == 1
+
+        engine.retry_at = 0.0  # пауза прошла
+        await engine.ensure_fresh()
+        assert fetch.calls == 2 and engine.failures == 2
+        assert engine.retry_at - cross_rates.time.time() > 5  # пауза удвоилась
+
+        fetch.tickers = TICKERS
+        engine.retry_at = 0.0
+        assert await engine.get_price("BTC", "ETH") == pytest.approx(65000 / 3200)
+        assert engine.failures == 0 and engine.retry_at == 0.0
+
+    run(scenario())
+
+def test_subscribed_coins_are_kept_while_they_have_subscribers(run, monkeypatch):
+    monkeypatch.setattr(cross_rates, "fetch_book_tickers", FakeTickers({**TICKERS, "DOGEUSDT": 0.15}))
+    monkeypatch.setattr(symbol_catalog, "symbols", {symbol: () for symbol in [*TICKERS, "DOGEUSDT"]})
+    engine = CrossRateEngine([])
+    engine.retain("DOGE", "BTC")
+    engine.retain("DOGE", "ETH")
+    engine.retain("NOTACOIN", "USDT")  # монеты нет в каталоге - в вектор не попадает
+    assert "NOTACOIN" not in engine.index
+    assert run(engine.get_price("DOGE", "BTC")) == pytest.approx(0.15 / 65000)
+
+    engine.release("DOGE", "BTC")
+    assert engine.price("DOGE", "ETH") == pytest.approx(0.15 / 3200)  # у DOGE/ETH еще есть подписчики
+    engine.release("DOGE", "ETH")
+    assert "DOGE" not in engine.index
+    assert engine.price("ETH", "BTC") == pytest.approx(3200 / 65000)  # посредники остаются
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Очередь отправки на заглушке FakeBot: приоритеты, темп отправки в чат и RetryAfter.
+"""
+import asyncio
+from typing import List
+from telegram.error import Forbidden
+from dispatch import MessageDispatcher, PriorityTokenBucket, PRIORITY_ALERT, PRIORITY_REPLY
+from fakes import FakeBot
+
+def _dispatcher(bot, workers: int = 4, **kwargs) -> MessageDispatcher:
+    kwargs.setdefault("bucket", PriorityTokenBucket(rate=1000, capacity=100))
+    kwargs.setdefault("chat_rate", 1000)
+    return MessageDispatcher(bot, workers=workers, **kwargs)
+
+def test_bucket_serves_waiters_by_priority(run):
+    async def scenario():
+        bucket = PriorityTokenBucket(rate=20)
+        await bucket.acquire()  # единственный токен израсходован, дальше все ждут
+        order: List[str] = []
+
+        async def take(name: str, priority: int) -> None:
+            await bucket.acquire(priority)
+            order.append(name)
+
+        await asyncio.gather(take("reply-1", PRIORITY_REPLY), take("reply-2", PRIORITY_REPLY),
+                             take("alert", PRIORITY_ALERT))
+        return order
+
+    assert run(scenario()) == ["alert", "reply-1", "reply-2"]
+
+def test_alerts_are_sent_before_replies(run):
+    async def scenario():
+        bot = FakeBot(latency=0, global_rate=1000, chat_rate=1000)
+        dispatcher = _dispatcher(bot, workers=1)
+        for chat_id in (1, 2, 3):
+            dispatcher.submit(chat_id, f"reply {chat_id}", PRIORITY_REPLY)
+        for chat_id in (4, 5):
+            dispatcher.submit(chat_id, f"alert {chat_id}", PRIORITY_ALERT)
+        dispatcher.start()
+        await dispatcher.stop()
+        return [text for _, text, _ in bot.sent]
+
+    assert run(scenario()) == ["alert 4", "alert 5", "reply 1", "reply 2", "reply 3"]
+
+def test_messages_to_one_chat_are_spaced_without_blocking_others(run):
+    async def scenario():
+        bot = FakeBot(latency=0, global_rate=1000, chat_rate=1000)
+        dispatcher = _dispatcher(bot, chat_rate=10)  # интервал в чат 0.11 с
+        for i in (1, 2, 3):
+            dispatcher.submit(1, f"chat1 #{i}")
+        dispatcher.submit(2, "chat2")
+        dispatcher.start()
+        await dispatcher.stop()
+        return bot
+
+    bot = run(scenario())
+    chat1 = [(text, sent_at) for chat_id, text, sent_at in bot.sent if chat_id == 1]
+    chat2_sent_at = next(sent_at for chat_id, _, sent_at in bot.sent if chat_id == 2)
+    assert [text for text, _ in chat1] == ["chat1 #1", "chat1 #2", "chat1 #3"]
+    gaps = [later - earlier for (_, earlier), (_, later) in zip(chat1, chat1[1:])]
+    assert all(gap >= 0.1 for gap in gaps)
+    # Отложенные сообщения первого чата не задерживают второй
+    assert chat2_sent_at < chat1[1][1]
+    assert bot.rejected == 0
+
+def test_retry_after_pauses_sending_and_retries(run):
+    async def scenario():
+        bot = FakeBot(latency=0, global_rate=3, chat_rate=1000, retry_after=1)
+        dispatcher = _dispatcher(bot, workers=8)
+        for chat_id in range(6):
+            dispatcher.submit(chat_id, f"alert {chat_id}")
+        dispatcher.start()
+        await dispatcher.stop(drain_timeout=10)
+        return bot, dispatcher
+
+    bot, dispatcher = run(scenario())
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) == list(range(6))
+    assert dispatcher.failed == 0
+    assert dispatcher.retry_after_hits == bot.rejected >= 1
+    assert dispatcher.retried == dispatcher.retry_after_hits
+    # После RetryAfter отправка возобновилась не раньше, чем через retry_after
+    first, *_, last = sorted(sent_at for _, _, sent_at in bot.sent)
+    assert last - first >= 1.0
+
+def test_permanent_failure_is_not_retried(run):
+    class BlockedBot(FakeBot):
+        async def send_message(self, chat_id: int, text: str, **kwargs) -> dict:
+            raise Forbidden("bot was blocked by the user")
+
+    async def scenario():
+        failures: List[bool] = []
+        dispatcher = _dispatcher(BlockedBot())
+        dispatcher.submit(1, "alert", on_failed=failures.append)
+        dispatcher.start()
+        await dispatcher.stop()
+        return dispatcher, failures
+
+    dispatcher, failures = run(scenario())
+    assert failures == [True]
+    assert dispatcher.failed == 1 and dispatcher.retried == 0
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Бюджет веса и выключатель запросов к Binance на заглушке FakeBinanceRestServer.
+"""
+import asyncio
+import time
+import pytest
+from fakes import FakeBinanceRestServer
+from governor import RequestGovernor, BREAKER_CLOSED, BREAKER_OPEN
+from utils import binance_get, WEIGHT_BOOK_TICKER
+
+BOOK_TICKER = "/api/v3/ticker/bookTicker"
+
+@pytest.fixture(autouse=True)
+def fixed_minute(monkeypatch):
+    """Окно учета веса не сменяется посреди теста."""
+    monkeypatch.setattr(RequestGovernor, "_current_window", staticmethod(lambda: 0))
+
+async def _get(server: FakeBinanceRestServer, governor: RequestGovernor):
+    return await binance_get(BOOK_TICKER, {"symbol": "BTCUSDT"}, WEIGHT_BOOK_TICKER, server.url, governor)
+
+async def _started(**kwargs) -> FakeBinanceRestServer:
+    server = FakeBinanceRestServer(**kwargs)
+    await server.start(port=0)
+    return server
+
+def test_budget_holds_requests_over_limit(run):
+    async def scenario():
+        server = await _started()
+        governor = RequestGovernor(budget=4 * WEIGHT_BOOK_TICKER)
+        try:
+            for _ in range(4):
+                status, data = await _get(server, governor)
+                assert status == 200 and data["symbol"] == "BTCUSDT"
+            blocked = asyncio.ensure_future(_get(server, governor))
+            await asyncio.sleep(0.2)
+            assert not blocked.done()
+            blocked.cancel()
+            assert server.requests == 4
+            assert governor.throttled == 1
+            assert governor.used_weight == 4 * WEIGHT_BOOK_TICKER
+        finally:
+            await server.stop()
+
+    run(scenario())
+
+def test_used_weight_follows_response_header(run):
+    async def scenario():
+        server = await _started()
+        server.used_weight = 2500  # вес, израсходованный другими процессами с того же IP
+        governor = RequestGovernor(budget=3000)
+        try:
+            status, _ = await _get(server, governor)
+            assert status == 200
+            assert governor.used_weight == server.used_weight == 2500 + WEIGHT_BOOK_TICKER
+        finally:
+            await server.stop()
+
+    run(scenario())
+
+@pytest.mark.parametrize("status", [418, 429])
+def test_ban_status_opens_breaker_for_retry_after(run, status):
+    async def scenario():
+        server = await _started()
+        governor = RequestGovernor(base_delay=0.05, max_delay=0.05)
+        try:
+            server.fail_next(status, retry_after=120)
+            assert (await _get(server, governor))[0] == status
+            assert governor.state == BREAKER_OPEN
+            # Retry-After важнее собственной задержки выключателя
+            assert governor.open_until - time.time() > 119
+
+            # Пока выключатель разомкнут, запросы не уходят на биржу
+            assert await _get(server, governor) == (None, None)
+            assert server.requests == 1
+            assert governor.rejected == 1
+        finally:
+            await server.stop()
+
+    run(scenario())
+
+def test_backoff_grows_without_retry_after(run):
+    async def scenario():
+        server = await _started()
+        governor = RequestGovernor(base_delay=10, max_delay=100)
+        try:
+            server.fail_next(503)
+            await _get(server, governor)
+            assert 5 <= governor.open_until - time.time() <= 15
+            governor.open_until = 0  # задержка прошла, следующий запрос - пробный
+            server.fail_next(503)
+            await _get(server, governor)
+            assert governor.failures == 2
+            assert 10 <= governor.open_until - time.time() <= 30
+        finally:
+            await server.stop()
+
+    run(scenario())
+
+def test_half_open_lets_one_probe_and_closes_on_success(run):
+    async def scenario():
+        server = await _started(latency=0.1)
+        governor = RequestGovernor(base_delay=0.05, max_delay=0.05)
+        try:
+            server.fail_next(500)
+            await _get(server, governor)
+            assert governor.state == BREAKER_OPEN
+            await asyncio.sleep(0.1)
+
+            probe, other = await asyncio.gather(_get(server, governor), _get(server, governor))
+            assert probe[0] == 200
+            assert other == (None, None)  # второй запрос не прошел, пока пробный в полете
+            assert server.requests == 2
+            assert governor.state == BREAKER_CLOSED
+            assert governor.failures == 0
+        finally:
+            await server.stop()
+
+    run(scenario())
+
+def test_failed_probe_reopens_breaker(run):
+    async def scenario():
+        server = await _started()
+        governor = RequestGovernor(base_delay=0.05, max_delay=0.05)
+        try:
+            server.fail_next(500, count=2)
+            await _get(server, governor)
+            await asyncio.sleep(0.1)
+            assert (await _get(server, governor))[0] == 500
+            assert governor.state == BREAKER_OPEN
+            assert governor.trips == 2
+        finally:
+            await server.stop()
+
+    run(scenario())
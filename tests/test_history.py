@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+История цен в кольцевых буферах и ее файлы на диске.
+"""
+import os
+import pytest
+from handlers import MIN_MOVE_WINDOW
+from history import HistoryStore, PriceHistory
+from history_file import HEADER_SIZE, HistoryFiles
+
+def _points(store: HistoryStore, symbol: str):
+    times, prices = store.get(symbol).window(float("inf"), now=2_000_000)
+    return list(zip(times, prices))
+
+T0 = 1_000_000 - 1_000_000 % 60  # начало интервала resolution
+
+def _filled(capacity: int, count: int) -> PriceHistory:
+    """Буфер с точками цены 100, 101, ... раз в минуту."""
+    history = PriceHistory(capacity=capacity, resolution=60)
+    for step in range(count):
+        history.append(T0 + step * 60, 100.0 + step)
+    return history
+
+def test_ring_keeps_newest_points_after_wraparound():
+    history = _filled(capacity=4, count=7)
+    times, prices = history.window(float("inf"), now=T0 + 10 * 60)
+    assert len(history) == 4
+    assert list(prices) == [103.0, 104.0, 105.0, 106.0]
+    assert list(times) == [T0 + step * 60 for step in range(3, 7)]
+    assert history.last == (T0 + 6 * 60, 106.0)
+
+def test_point_in_same_interval_replaces_last():
+    history = _filled(capacity=4, count=2)
+    history.append(T0 + 60 + 30, 150.0)
+    history.append(T0 + 10, 1.0)  # старше последней точки - игнорируется
+    assert len(history) == 2
+    assert history.last == (T0 + 90, 150.0)
+
+def test_window_stats_across_wrap():
+    history = _filled(capacity=5, count=8)  # в кольце 103..107, начало окна - после переноса
+    now = T0 + 7 * 60
+    stats = history.stats(3 * 60, now)
+    assert (stats.count, stats.first, stats.last) == (4, 104.0, 107.0)
+    assert (stats.min, stats.max, stats.mean) == (104.0, 107.0, 105.5)
+    assert stats.change_pct == pytest.approx(3 / 104 * 100)
+    assert history.percent_change(30, now) is None  # одна точка - изменения нет
+    assert history.stats(30, now + 3600) is None
+
+def test_min_move_window_always_has_two_points():
+    for phase in range(0, 120, 7):
+        history = PriceHistory(capacity=10, resolution=60)
+        for step in range(5):
+            history.append(1_000_000 + phase + step * 60, 100.0 + step)
+        now = history.last[0] + 59  # проверка в конце интервала последней точки
+        assert history.stats(MIN_MOVE_WINDOW * 60, now).count >= 2
+
+def test_failed_write_is_retried_in_full(run, monkeypatch, tmp_path):
+    files = HistoryFiles(str(tmp_path))
+    store = HistoryStore(resolution=60, retention=8 * 60)
+    for step in range(3):
+        store.record("BTCUSDT", 1_000_000 + step * 60, 100.0 + step)
+    run(files.flush(store))
+
+    pwrite = os.pwrite
+
+    def broken_pwrite(fd, data, offset):
+        raise OSError(28, "No space left on device")
+
+    for step in range(3, 6):
+        store.record("BTCUSDT", 1_000_000 + step * 60, 100.0 + step)
+    monkeypatch.setattr(os, "pwrite", broken_pwrite)
+    run(files.flush(store))
+    monkeypatch.setattr(os, "pwrite", pwrite)
+
+    store.record("BTCUSDT", 1_000_000 + 6 * 60, 106.0)
+    run(files.flush(store))
+
+    restored = HistoryStore(resolution=60, retention=8 * 60)
+    files.load_into(restored)
+    assert _points(restored, "BTCUSDT") == _points(store, "BTCUSDT")
+
+def _reloaded(files: HistoryFiles, resolution: float = 60, retention: float = 8 * 60) -> HistoryStore:
+    """Новый процесс: история загружается из файлов в пустое хранилище."""
+    store = HistoryStore(resolution=resolution, retention=retention)
+    files.load_into(store)
+    return store
+
+def test_files_round_trip(run, tmp_path):
+    files = HistoryFiles(str(tmp_path))
+    store = HistoryStore(resolution=60, retention=8 * 60)
+    for step in range(5):
+        store.record("BTCUSDT", T0 + step * 60, 100.0 + step)
+        store.record("ETHUSDT", T0 + step * 60, 10.0 + step)
+    run(files.flush(store))
+
+    restored = HistoryStore(resolution=60, retention=8 * 60)
+    last_points = files.load_into(restored)
+    assert last_points == {"BTCUSDT": (T0 + 4 * 60, 104.0), "ETHUSDT": (T0 + 4 * 60, 14.0)}
+    for symbol in ("BTCUSDT", "ETHUSDT"):
+        assert _points(restored, symbol) == _points(store, symbol)
+
+def test_partial_dirty_runs_across_wrap(run, tmp_path):
+    files = HistoryFiles(str(tmp_path))
+    store = HistoryStore(resolution=60, retention=8 * 60)
+    for step in range(6):
+        store.record("BTCUSDT", T0 + step * 60, 100.0 + step)
+    run(files.flush(store))
+    full = files.bytes_written
+
+    # Новые точки переходят через конец кольца: запись двумя участками
+    for step in range(6, 11):
+        store.record("BTCUSDT", T0 + step * 60, 100.0 + step)
+    runs = store.get("BTCUSDT").dirty_runs()
+    assert [slot for slot, _, _ in runs] == [5, 0]
+    run(files.flush(store))
+    # Последняя точка прошлой записи (могла замениться) и 5 новых, затем заголовок
+    assert files.bytes_written - full == 6 * 12 + HEADER_SIZE
+
+    assert _points(_reloaded(files), "BTCUSDT") == _points(store, "BTCUSDT")
+
+def test_removed_symbol_file_is_deleted(run, tmp_path):
+    files = HistoryFiles(str(tmp_path))
+    store = HistoryStore(resolution=60, retention=8 * 60)
+    store.record("BTCUSDT", T0, 100.0)
+    store.record("ETHUSDT", T0, 10.0)
+    run(files.flush(store))
+    store.remove("ETHUSDT")
+    run(files.flush(store))
+    assert sorted(os.listdir(tmp_path)) == ["BTCUSDT.bin"]
+
+def test_file_with_other_capacity_is_migrated(run, tmp_path):
+    files = HistoryFiles(str(tmp_path))
+    store = HistoryStore(resolution=60, retention=8 * 60)
+    for step in range(8):
+        store.record("BTCUSDT", T0 + step * 60, 100.0 + step)
+    run(files.flush(store))
+
+    restored = _reloaded(files, retention=4 * 60)  # хранится меньше истории
+    assert [price for _, price in _points(restored, "BTCUSDT")] == [104.0, 105.0, 106.0, 107.0]
+    assert "BTCUSDT" in restored.dirty_symbols  # файл будет переписан в новой емкости
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Идентификаторы пар в callback_data: короткие, стабильные и не зависят от названий монет.
+"""
+from keyboards import get_pair_actions_keyboard, get_pairs_list_keyboard
+from models import CryptoPair, UserPairs
+
+def test_pair_id_is_stable_and_short():
+    pairs = UserPairs([CryptoPair(base="BTC", quote="USDT"), CryptoPair(base="A/B" * 40, quote="USDT")])
+    long_pair = pairs.get("A/B" * 40, "USDT")
+    pair_id = UserPairs.pair_id(long_pair)
+    assert pairs.by_id(pair_id) is long_pair  # "/" в названии монеты не мешает поиску
+    assert UserPairs([CryptoPair(base="A/B" * 40, quote="USDT")]).by_id(pair_id) is not None  # после перезапуска
+
+    buttons = [row[0] for row in get_pairs_list_keyboard(pairs).inline_keyboard]
+    buttons += [row[0] for row in get_pair_actions_keyboard(pair_id).inline_keyboard]
+    assert all(len(button.callback_data.encode()) <= 64 for button in buttons)
+
+def test_removed_pair_id_is_not_found():
+    pairs = UserPairs([CryptoPair(base="BTC", quote="USDT")])
+    pair_id = UserPairs.pair_id(pairs.get("BTC", "USDT"))
+    pairs.remove("BTC", "USDT")
+    assert pairs.by_id(pair_id) is None
+    assert pairs.by_id("BTC/USDT") is None
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Проверки символов по колесу: не больше одной выполняющейся проверки на символ
+и отмена проверки при удалении последнего подписчика.
+"""
+import asyncio
+import pytest
+import monitoring
+from subscriptions import subscriptions
+
+SYMBOL = "BTCUSDT"
+
+class SlowPrice:
+    """Подмена get_crypto_price_optimized: биржа отвечает через latency секунд."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self, base: str, quote: str):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return None
+
+@pytest.fixture
+def subscribed(monkeypatch):
+    subscriptions.add(1, "BTC", "USDT")
+    monitoring.price_wheel.add(SYMBOL)
+    yield
+    if subscriptions.get(1, SYMBOL) is not None:
+        monitoring._unsubscribe(1, SYMBOL)
+
+def test_due_symbol_is_skipped_while_its_refresh_runs(run, monkeypatch, subscribed):
+    fetch = SlowPrice(0.1)
+    monkeypatch.setattr(monitoring, "get_crypto_price_optimized", fetch)
+    skipped = monitoring._refresh_skipped
+
+    async def scenario():
+        for _ in range(3):
+            await monitoring._on_due([SYMBOL])
+            await asyncio.sleep(0.01)
+        assert fetch.calls == 1
+        assert monitoring._refresh_skipped == skipped + 2
+        await monitoring._refresh_tasks[SYMBOL]
+        assert SYMBOL not in monitoring._refresh_tasks
+
+        # Проверка закончилась - следующий тик запускает новую
+        await monitoring._on_due([SYMBOL])
+        await asyncio.sleep(0.01)
+        assert fetch.calls == 2
+        await monitoring._refresh_tasks[SYMBOL]
+
+    run(scenario())
+
+def test_removing_last_subscriber_cancels_running_refresh(run, monkeypatch, subscribed):
+    fetch = SlowPrice(10)
+    monkeypatch.setattr(monitoring, "get_crypto_price_optimized", fetch)
+
+    async def scenario():
+        await monitoring._on_due([SYMBOL])
+        await asyncio.sleep(0.01)
+        task = monitoring._refresh_tasks[SYMBOL]
+        await monitoring.stop_price_monitoring(1, "BTC", "USDT")
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled() and fetch.cancelled == 1
+        assert SYMBOL not in monitoring._refresh_tasks
+
+    run(scenario())
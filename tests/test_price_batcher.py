@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Пакетные запросы цен на заглушке FakeBinanceRestServer: один запрос на пакет
+и никаких отдельных запросов по символам, если пакет не удался.
+"""
+import asyncio
+import pytest
+import providers
+from catalog import symbol_catalog
+from fakes import FakeBinanceRestServer
+from governor import RequestGovernor
+from providers import BinanceProvider, HedgedPriceSource
+from utils import get_crypto_price_batched
+
+PAIRS = [("BTC", "USDT"), ("ETH", "USDT"), ("SOL", "USDT"), ("BTC", "ETH")]
+
+@pytest.fixture(autouse=True)
+def catalog(monkeypatch):
+    symbols = {"BTCUSDT": ("BTC", "USDT"), "ETHUSDT": ("ETH", "USDT"),
+               "SOLUSDT": ("SOL", "USDT"), "ETHBTC": ("ETH", "BTC")}
+    monkeypatch.setattr(symbol_catalog, "symbols", symbols)
+    monkeypatch.setattr(symbol_catalog, "_routes", {})
+
+async def _with_server(monkeypatch, scenario):
+    server = FakeBinanceRestServer()
+    await server.start(port=0)
+    monkeypatch.setattr(providers, "price_providers",
+                        HedgedPriceSource([BinanceProvider("fake", server.url, RequestGovernor())]))
+    try:
+        return await scenario(server)
+    finally:
+        await server.stop()
+
+def test_due_symbols_share_one_request(run, monkeypatch):
+    async def scenario(server):
+        prices = await asyncio.gather(*(get_crypto_price_batched(base, quote) for base, quote in PAIRS))
+        assert server.requests == 1
+        return prices
+
+    prices = run(_with_server(monkeypatch, scenario))
+    assert all(price is not None for price in prices)
+    assert prices[3] == pytest.approx(1 / 0.049, rel=1e-3)  # BTC/ETH через обратную пару ETHBTC
+
+def test_failed_batch_does_not_fan_out(run, monkeypatch):
+    class DownSource(HedgedPriceSource):
+        """Биржа не отвечает (таймаут или разомкнутый выключатель)."""
+        calls = 0
+
+        async def book_tickers(self, symbols=None):
+            DownSource.calls += 1
+            return None
+
+    async def scenario():
+        return await asyncio.gather(*(get_crypto_price_batched(base, quote) for base, quote in PAIRS))
+
+    monkeypatch.setattr(providers, "price_providers", DownSource())
+    prices = run(scenario())
+    assert prices == [None] * len(PAIRS)
+    assert DownSource.calls == 1  # ни запросов по отдельным символам, ни полного списка цен
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Хеджированные запросы цен: запуск запасного провайдера, отмена проигравшего,
+порядок перехода на запасные и общий выключатель хостов Binance.
+"""
+import asyncio
+from typing import Dict, List, Optional
+import pytest
+import providers
+from fakes import FakeBinanceRestServer
+from governor import RequestGovernor, BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN
+from providers import BinanceProvider, HedgedPriceSource, PriceProvider
+from utils import binance_get, WEIGHT_BOOK_TICKER
+
+SYMBOLS = ["BTCUSDT", "ETHUSDT"]
+
+class FakeProvider(PriceProvider):
+    """Провайдер с заданной задержкой; failing - отвечает ошибкой (None)."""
+
+    def __init__(self, name: str, latency: float = 0.0, failing: bool = False, calls: Optional[List[str]] = None):
+        super().__init__(name)
+        self.latency = latency
+        self.failing = failing
+        self.calls = calls if calls is not None else []
+        self.interrupted = False
+
+    async def book_tickers(self, symbols: Optional[List[str]] = None) -> Optional[Dict[str, float]]:
+        self.calls.append(self.name)
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.interrupted = True
+            raise
+        if self.failing:
+            return None
+        return {symbol: 1.0 for symbol in symbols or SYMBOLS}
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(providers, "HEDGE_DEFAULT_DELAY", 0.05)
+
+def test_fast_primary_is_not_hedged(run):
+    primary, spare = FakeProvider("primary", 0.01), FakeProvider("spare")
+    source = HedgedPriceSource([primary, spare])
+    assert run(source.book_tickers(SYMBOLS)) == {"BTCUSDT": 1.0, "ETHUSDT": 1.0}
+    assert spare.calls == []
+    assert source.hedges == 0 and primary.stats.wins == 1
+
+def test_slow_primary_is_hedged_and_loser_cancelled(run):
+    primary, spare = FakeProvider("primary", 1.0), FakeProvider("spare", 0.01)
+    source = HedgedPriceSource([primary, spare])
+    assert run(source.book_tickers(SYMBOLS)) is not None
+    assert source.hedges == 1 and source.hedge_wins == 1
+    assert spare.stats.wins == 1
+    assert primary.interrupted
+    assert primary.stats.cancelled == 1 and primary.stats.errors == 0
+
+def test_failover_follows_provider_order(run):
+    calls: List[str] = []
+    source = HedgedPriceSource([
+        FakeProvider("first", failing=True, calls=calls),
+        FakeProvider("second", failing=True, calls=calls),
+        FakeProvider("third", calls=calls),
+        FakeProvider("fourth", calls=calls),
+    ])
+    assert run(source.book_tickers(SYMBOLS)) is not None
+    assert calls == ["first", "second", "third"]
+    assert source.failovers == 2 and source.hedges == 0
+
+def test_all_providers_failing_returns_none(run):
+    source = HedgedPriceSource([FakeProvider("first", failing=True), FakeProvider("second", failing=True)])
+    assert run(source.book_tickers(SYMBOLS)) is None
+    assert source.failovers == 1
+
+def test_binance_hosts_share_one_governor():
+    hosts = providers._default_providers()
+    assert len(hosts) >= 2
+    assert all(host.governor is providers.governor for host in hosts)
+
+def test_ip_ban_on_primary_stops_mirror_requests(run):
+    async def scenario():
+        primary, mirror = FakeBinanceRestServer(), FakeBinanceRestServer()
+        await primary.start(port=0)
+        await mirror.start(port=0)
+        shared = RequestGovernor()
+        source = HedgedPriceSource([
+            BinanceProvider("primary", primary.url, shared),
+            BinanceProvider("mirror", mirror.url, shared),
+        ])
+        try:
+            primary.fail_next(418, count=5, retry_after=60)
+            mirror.fail_next(418, count=5, retry_after=60)
+            for _ in range(3):
+                assert await source.book_tickers(SYMBOLS) is None
+            assert primary.requests == 1
+            assert mirror.requests == 0  # бан IP распространяется и на зеркало
+            assert shared.state == BREAKER_OPEN and shared.trips == 1
+        finally:
+            await primary.stop()
+            await mirror.stop()
+
+    run(scenario())
+
+def test_cancelled_hedge_is_not_counted_as_error(run):
+    async def scenario():
+        primary, mirror = FakeBinanceRestServer(latency=1.0), FakeBinanceRestServer()
+        await primary.start(port=0)
+        await mirror.start(port=0)
+        shared = RequestGovernor()
+        source = HedgedPriceSource([
+            BinanceProvider("primary", primary.url, shared),
+            BinanceProvider("mirror", mirror.url, shared),
+        ])
+        try:
+            assert await source.book_tickers(SYMBOLS) is not None
+            assert source.hedge_wins == 1
+            assert shared.state == BREAKER_CLOSED and shared.trips == 0
+        finally:
+            await primary.stop()
+            await mirror.stop()
+
+    run(scenario())
+
+def test_cancelled_probe_frees_half_open_slot(run):
+    async def scenario():
+        server = FakeBinanceRestServer(latency=1.0)
+        await server.start(port=0)
+        governor = RequestGovernor()
+        governor.state, governor.open_until = BREAKER_OPEN, 0.0
+        get = lambda: binance_get("/api/v3/ticker/bookTicker", {"symbol": "BTCUSDT"},  # noqa: E731
+                                  WEIGHT_BOOK_TICKER, server.url, governor)
+        try:
+            probe = asyncio.ensure_future(get())
+            await asyncio.sleep(0.1)
+            probe.cancel()
+            await asyncio.gather(probe, return_exceptions=True)
+            # Отмена не размыкает выключатель и не занимает место пробного запроса
+            assert governor.state == BREAKER_HALF_OPEN and governor.trips == 0
+            server.latency = 0.0
+            status, _ = await get()
+            assert status == 200
+            assert governor.state == BREAKER_CLOSED
+        finally:
+            await server.stop()
+
+    run(scenario())
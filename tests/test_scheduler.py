@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Колесо таймеров: распределение фаз, перепланирование и снятие символов.
+"""
+import monitoring
+from scheduler import TimingWheel
+from subscriptions import subscriptions
+
+def _ticks_until_due(wheel: TimingWheel, key: str, limit: int = 1000) -> int:
+    for tick in range(1, limit + 1):
+        if key in wheel.advance():
+            return tick
+    raise AssertionError(f"{key} не сработал за {limit} тиков")
+
+def test_phases_are_spread_over_the_period():
+    wheel = TimingWheel(period=60, slots=60)
+    for i in range(6000):
+        wheel.add(f"COIN{i}USDT")
+    total, peak, average = wheel.load_summary()
+    assert total == 6000 and average == 100
+    assert peak < 2 * average  # без фаз все 6000 символов сработали бы в одном тике
+
+def test_added_key_fires_in_its_phase_slot_once_per_period():
+    wheel = TimingWheel(period=60, slots=60)
+    wheel.add("BTCUSDT")
+    slot = wheel.phase_slot("BTCUSDT") or wheel.slots_count
+    assert _ticks_until_due(wheel, "BTCUSDT") == slot
+    assert "BTCUSDT" not in wheel
+    assert TimingWheel(period=60, slots=60).phase_slot("BTCUSDT") == wheel.phase_slot("BTCUSDT")  # после перезапуска
+
+def test_reschedule_replaces_previous_placement():
+    wheel = TimingWheel(period=60, slots=60)
+    wheel.schedule("BTCUSDT", 10)
+    wheel.schedule("BTCUSDT", 150)  # больше периода: колесо делает два оборота
+    assert len(wheel) == 1
+    assert _ticks_until_due(wheel, "BTCUSDT") == 150
+    wheel.schedule("ETHUSDT", 0.2)  # меньше тика - не раньше следующего тика
+    assert wheel.advance() == ["ETHUSDT"]
+
+def test_removed_key_does_not_fire():
+    wheel = TimingWheel(period=60, slots=60)
+    wheel.schedule("BTCUSDT", 5)
+    wheel.remove("BTCUSDT")
+    assert all(not wheel.advance() for _ in range(120))
+
+def test_last_unsubscribe_takes_symbol_off_the_wheel():
+    subscriptions.add(1, "BTC", "USDT")
+    subscriptions.add(2, "BTC", "USDT")
+    monitoring.price_wheel.add("BTCUSDT")
+    monitoring._unsubscribe(1, "BTCUSDT")
+    assert "BTCUSDT" in monitoring.price_wheel
+    monitoring._unsubscribe(2, "BTCUSDT")
+    assert "BTCUSDT" not in monitoring.price_wheel
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Хранилище пар во временном каталоге: SQLite (перенос из JSON, отложенная запись,
+загрузка/выгрузка пользователей по запросу) и журнал JSON-хранилища.
+"""
+import json
+import os
+import sqlite3
+import time
+import pytest
+import monitoring
+import storage
+import user_cache
+from models import CryptoPair, UserPairs, user_settings
+from storage import load_user_data, storage_saver
+from user_cache import UserCache
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """SQLite-хранилище и JSON-файлы во временном каталоге."""
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "sqlite")
+    monkeypatch.setattr(storage, "STORAGE_FILE", str(tmp_path / "user_data.json"))
+    monkeypatch.setattr(storage, "JOURNAL_FILE", str(tmp_path / "user_data.journal"))
+    monkeypatch.setattr(storage, "DB_FILE", str(tmp_path / "user_data.db"))
+    monkeypatch.setattr(storage, "_db", None)
+    monkeypatch.setattr(storage, "_journal", None)
+    monkeypatch.setattr(storage_saver, "dirty", {})
+    user_settings.clear()
+    yield tmp_path
+    if storage._db is not None:
+        storage._db.close()
+    user_settings.clear()
+
+@pytest.fixture
+def json_store(store, monkeypatch):
+    """JSON-хранилище: снимок user_data.json и журнал изменений."""
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "json")
+    return store
+
+def _restart() -> None:
+    """Перезапуск бота: закрыть базу и журнал, забыть пары в памяти и загрузить заново."""
+    if storage._db is not None:
+        storage._db.close()
+        storage._db = None
+    storage._journal = None
+    user_settings.clear()
+    load_user_data()
+
+def _add(chat_id: int, *bases: str) -> None:
+    """Пользователь добавляет пары BASE/USDT."""
+    pairs = user_settings.setdefault(chat_id, UserPairs())
+    for base in bases:
+        pairs.add(CryptoPair(base=base, quote="USDT"))
+        storage.save_pair(chat_id, base, "USDT")
+
+def _bases(chat_id: int):
+    return [pair.base for pair in user_settings.get(chat_id, ())]
+
+def test_json_is_imported_once(store, run):
+    (store / "user_data.json").write_text(json.dumps({
+        "42": [{"base": "BTC", "quote": "USDT", "min_price": 60000.0, "max_price": None}],
+    }))
+    load_user_data()
+    assert [pair.base for pair in user_settings[42]] == ["BTC"]
+
+    # Пользователь удалил единственную пару - база пуста
+    user_settings[42].remove("BTC", "USDT")
+    storage.delete_pair(42, "BTC", "USDT")
+    run(storage_saver.flush())
+    assert storage.get_db().is_empty()
+
+    _restart()
+    assert not user_settings.get(42)  # пары из JSON не вернулись
+
+def test_marked_changes_are_written_in_order(store, run):
+    load_user_data()
+    user_settings[7] = UserPairs()
+    for base in ("ETH", "BTC", "SOL"):
+        user_settings[7].add(CryptoPair(base=base, quote="USDT"))
+        storage.save_pair(7, base, "USDT")
+    user_settings[7].get("BTC", "USDT").max_price = 70000.0
+    storage.save_pair(7, "BTC", "USDT")
+    run(storage_saver.flush())
+
+    _restart()
+    assert [pair.base for pair in user_settings[7]] == ["ETH", "BTC", "SOL"]
+    assert user_settings[7].get("BTC", "USDT").max_price == 70000.0
+
+def test_marks_of_unloaded_user_are_not_written_as_deletes(store, run):
+    load_user_data()
+    user_settings[9] = UserPairs([CryptoPair(base="BTC", quote="USDT")])
+    storage.save_pair(9, "BTC", "USDT")
+    run(storage_saver.flush())
+
+    del user_settings[9]  # пользователь выгружен, пометка пришла позже
+    storage.save_pair(9, "BTC", "USDT")
+    run(storage_saver.flush())
+    assert [pair.base for pair in storage.load_user(9)] == ["BTC"]
+
+def _idle_cache(chat_id: int) -> UserCache:
+    cache = UserCache(idle_ttl=60, lazy=True)
+    cache.mark_loaded([chat_id])
+    cache.last_seen[chat_id] = time.time() - 120
+    return cache
+
+def test_user_active_during_eviction_flush_is_kept(store, run, monkeypatch):
+    load_user_data()
+    user_settings[5] = UserPairs([CryptoPair(base="BTC", quote="USDT")])
+    storage.save_pair(5, "BTC", "USDT")
+    cache = _idle_cache(5)
+    flush = storage_saver.flush
+
+    async def flush_with_activity():
+        await flush()
+        # Пока шла запись, пользователь добавил пару
+        cache.last_seen[5] = time.time()
+        user_settings[5].add(CryptoPair(base="ETH", quote="USDT"))
+        storage.save_pair(5, "ETH", "USDT")
+
+    monkeypatch.setattr(storage_saver, "flush", flush_with_activity)
+    assert run(cache.evict_idle()) == 0
+    assert 5 in cache.loaded and len(user_settings[5]) == 2
+
+    monkeypatch.setattr(storage_saver, "flush", flush)
+    run(storage_saver.flush())
+    assert [pair.base for pair in storage.load_user(5)] == ["BTC", "ETH"]
+
+def test_idle_user_is_evicted_after_flush(store, run):
+    load_user_data()
+    user_settings[5] = UserPairs([CryptoPair(base="BTC", quote="USDT")])
+    storage.save_pair(5, "BTC", "USDT")
+    cache = _idle_cache(5)
+    assert run(cache.evict_idle()) == 1
+    assert 5 not in user_settings and 5 not in cache.loaded
+    assert [pair.base for pair in storage.load_user(5)] == ["BTC"]
+
+def test_failed_load_is_retried(store, run, monkeypatch):
+    load_user_data()
+    user_settings[3] = UserPairs([CryptoPair(base="SOL", quote="USDT")])
+    storage.save_pair(3, "SOL", "USDT")
+    run(storage_saver.flush())
+    del user_settings[3]
+    cache = UserCache(lazy=True)
+
+    def broken_load(chat_id):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(user_cache, "load_user", broken_load)
+    with pytest.raises(sqlite3.OperationalError):
+        run(cache.ensure_loaded(3, bot=None))
+    assert 3 not in cache.loaded and 3 not in user_settings
+
+    restored = []
+
+    async def restore_subscriptions(settings, bot):
+        restored.extend(settings)
+
+    monkeypatch.setattr(user_cache, "load_user", storage.load_user)
+    monkeypatch.setattr(monitoring, "restore_subscriptions", restore_subscriptions)
+    run(cache.ensure_loaded(3, bot=None))
+    assert 3 in cache.loaded and restored == [3]
+    assert [pair.base for pair in user_settings[3]] == ["SOL"]
+
+def test_journal_is_replayed_after_restart(json_store, run):
+    load_user_data()
+    _add(1, "BTC", "ETH", "SOL")
+    run(storage_saver.flush())
+    user_settings[1].get("ETH", "USDT").min_price = 3000.0
+    storage.save_pair(1, "ETH", "USDT")
+    user_settings[1].remove("BTC", "USDT")
+    storage.delete_pair(1, "BTC", "USDT")
+    run(storage_saver.flush())
+    assert not (json_store / "user_data.json").exists()  # снимок пишется только при сжатии
+
+    _restart()
+    assert _bases(1) == ["ETH", "SOL"]
+    assert user_settings[1].get("ETH", "USDT").min_price == 3000.0
+
+def test_torn_journal_tail_is_dropped(json_store, run):
+    load_user_data()
+    _add(1, "BTC", "ETH")
+    run(storage_saver.flush())
+    _add(1, "SOL")
+    run(storage_saver.flush())
+    journal = json_store / "user_data.journal"
+    os.truncate(journal, journal.stat().st_size - 5)  # сбой посреди записи последней пары
+
+    _restart()
+    assert _bases(1) == ["BTC", "ETH"]
+
+    # Следующая запись начинается с новой строки и не склеивается с обрывком
+    _add(1, "DOGE")
+    run(storage_saver.flush())
+    _restart()
+    assert _bases(1) == ["BTC", "ETH", "DOGE"]
+
+def test_journal_is_compacted_into_snapshot(json_store, run, monkeypatch):
+    monkeypatch.setattr(storage_saver, "journal_max_bytes", 1)
+    load_user_data()
+    compactions = storage_saver.compactions
+    _add(1, "BTC", "ETH")
+    _add(2, "SOL")
+    run(storage_saver.flush())
+    assert storage_saver.compactions == compactions + 1
+    assert (json_store / "user_data.journal").stat().st_size == 0
+    assert set(json.loads((json_store / "user_data.json").read_text())) == {"1", "2"}
+
+    _restart()
+    assert _bases(1) == ["BTC", "ETH"] and _bases(2) == ["SOL"]
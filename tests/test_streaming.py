@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Клиент Binance combined streams на заглушке FakeBinanceStreamServer:
+подписка, отписка, переподключение с повторной подпиской и выбор пар для потока.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List
+import pytest
+import streaming
+from catalog import symbol_catalog
+from fakes import FakeBinanceStreamServer
+from monitoring import _stream_symbol
+from streaming import BinanceStreamClient
+
+async def _wait_until(condition: Callable[[], bool], timeout: float = 3.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "условие не выполнилось вовремя"
+        await asyncio.sleep(0.02)
+
+def _server_streams(server: FakeBinanceStreamServer) -> List[str]:
+    return sorted(stream for streams in server.clients.values() for stream in streams)
+
+@pytest.fixture(autouse=True)
+def fast_reconnect(monkeypatch):
+    monkeypatch.setattr(streaming, "CONTROL_MESSAGE_INTERVAL", 0.01)
+    monkeypatch.setattr(streaming.random, "uniform", lambda a, b: 0.05)
+
+def test_subscribe_unsubscribe_and_resubscribe_after_reconnect(run):
+    async def scenario():
+        server = FakeBinanceStreamServer(tick_interval=0.02)
+        await server.start(port=0)
+        prices: Dict[str, List[float]] = {}
+        client = BinanceStreamClient(lambda symbol, price: prices.setdefault(symbol, []).append(price), server.url)
+        try:
+            client.subscribe("btcusdt")
+            client.subscribe("ETHUSDT")
+            await _wait_until(lambda: "BTCUSDT" in prices and "ETHUSDT" in prices)
+            assert _server_streams(server) == ["btcusdt@bookTicker", "ethusdt@bookTicker"]
+            assert client.is_fresh("BTCUSDT", 1.0)
+
+            client.unsubscribe("ETHUSDT")
+            await _wait_until(lambda: _server_streams(server) == ["btcusdt@bookTicker"])
+            prices.clear()
+            await asyncio.sleep(0.1)
+            assert "ETHUSDT" not in prices and not client.is_fresh("ETHUSDT", 1.0)
+
+            # Сервер разорвал соединение: клиент переподключается и подписывается заново
+            await server.drop_connections()
+            await _wait_until(lambda: server.connections == 2 and _server_streams(server) == ["btcusdt@bookTicker"])
+            prices.clear()
+            await _wait_until(lambda: "BTCUSDT" in prices)
+            assert len(client.connections) == 1
+        finally:
+            await client.close()
+            await server.stop()
+
+    run(scenario())
+
+def test_streams_spread_over_connections(run):
+    async def scenario():
+        server = FakeBinanceStreamServer(tick_interval=0.02)
+        await server.start(port=0)
+        client = BinanceStreamClient(lambda symbol, price: None, server.url, streams_per_connection=2)
+        try:
+            for symbol in ("BTCUSDT", "ETHUSDT", "SOLUSDT"):
+                client.subscribe(symbol)
+            await _wait_until(lambda: len(_server_streams(server)) == 3)
+            assert len(client.connections) == 2
+            assert sorted(len(streams) for streams in server.clients.values()) == [1, 2]
+        finally:
+            await client.close()
+            await server.stop()
+
+    run(scenario())
+
+def test_only_direct_pairs_get_a_stream(monkeypatch):
+    monkeypatch.setattr(symbol_catalog, "symbols", {"BTCUSDT": ("BTC", "USDT"), "ETHBTC": ("ETH", "BTC")})
+    monkeypatch.setattr(symbol_catalog, "_routes", {})
+    assert _stream_symbol("btc", "usdt") == "BTCUSDT"
+    assert _stream_symbol("BTC", "ETH") is None    # обратная пара ETHBTC
+    assert _stream_symbol("DOGE", "SOL") is None   # синтетическая пара